@@ -0,0 +1,423 @@
+﻿using System.Numerics;
+using Neo;
+using Neo.SmartContract.Framework;
+using Neo.SmartContract.Framework.Attributes;
+using Neo.SmartContract.Framework.Native;
+using Neo.SmartContract.Framework.Services;
+
+namespace RelationalDB
+{
+    /// <summary>
+    /// A node of the B+ tree, serialized into a single storage value
+    /// </summary>
+    public class BTreeNode
+    {
+        public bool IsLeaf;
+        /// <summary>
+        /// Sorted. Distinct values of the column in a leaf; separators in an internal node
+        /// </summary>
+        public BigInteger[] Keys;
+        /// <summary>
+        /// Leaf: the count of each key.
+        /// Internal node: Keys.Length + 1 child node ids. Keys in child i are in [Keys[i-1], Keys[i])
+        /// </summary>
+        public BigInteger[] Values;
+    }
+
+    /// <summary>
+    /// Here we implement a B+ tree as an alternative engine of ordered index to the splay tree.
+    /// Each node holds up to BTREE_MAX_KEYS sorted keys and their counts (or child node ids) in one storage value,
+    /// so Find/Min/Max/Predecessor/Successor read O(log_B n) storage entries and never write.
+    /// Values and their counts live in the leaves. Internal nodes only route.
+    /// Deletion never merges underfull nodes, but a leaf left without keys is removed from its parent,
+    /// internal nodes left without children are removed up the path, and a root with a single child is collapsed.
+    /// </summary>
+    public partial class RelationalDB
+    {
+        // columnKey == UInt160 user + ByteString tableName + SEPARATOR + 1-byte columnId
+        const byte BTREE_SIZE_PREFIX = 0xd0;     // columnKey -> size of B+ tree
+        const byte BTREE_ROOT_PREFIX = 0xd1;     // columnKey -> id of root node
+        const byte BTREE_NODE_ID_PREFIX = 0xd2;  // columnKey -> id of the last allocated node
+        const byte BTREE_NODE_PREFIX = 0xd3;     // columnKey + node id -> StdLib.Serialize(BTreeNode)
+        const int BTREE_MAX_KEYS = 16;
+
+        [Safe]
+        public BigInteger BTreeGetSize(UInt160 user, ByteString tableName, byte columnId) => (BigInteger)new StorageMap(BTREE_SIZE_PREFIX)[user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }];
+        [Safe]
+        public BigInteger BTreeGetRoot(UInt160 user, ByteString tableName, byte columnId) => (BigInteger)new StorageMap(BTREE_ROOT_PREFIX)[user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }];
+        [Safe]
+        public BTreeNode BTreeGetNode(UInt160 user, ByteString tableName, byte columnId, BigInteger nodeId) => BTreeLoad(user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }, nodeId);
+
+        protected BTreeNode BTreeLoad(ByteString columnKey, BigInteger nodeId) =>
+            (BTreeNode)StdLib.Deserialize(new StorageMap(Storage.CurrentContext, (ByteString)new byte[] { BTREE_NODE_PREFIX } + columnKey)[(ByteString)nodeId]);
+        protected void BTreeStore(ByteString columnKey, BigInteger nodeId, BTreeNode node) =>
+            new StorageMap(Storage.CurrentContext, (ByteString)new byte[] { BTREE_NODE_PREFIX } + columnKey)[(ByteString)nodeId] = StdLib.Serialize(node);
+        protected BigInteger BTreeAllocate(ByteString columnKey)
+        {
+            StorageMap nodeIdMap = new(Storage.CurrentContext, BTREE_NODE_ID_PREFIX);
+            BigInteger nodeId = (BigInteger)nodeIdMap[columnKey] + 1;
+            nodeIdMap.Put(columnKey, nodeId);
+            return nodeId;
+        }
+
+        /// <returns>count of keys less than x</returns>
+        protected int BTreeLowerBound(BigInteger[] keys, BigInteger x)
+        {
+            int low = 0, high = keys.Length;
+            while (low < high)
+            {
+                int middle = (low + high) / 2;
+                if (keys[middle] < x)
+                    low = middle + 1;
+                else
+                    high = middle;
+            }
+            return low;
+        }
+        /// <returns>count of keys less than or equal to x</returns>
+        protected int BTreeUpperBound(BigInteger[] keys, BigInteger x)
+        {
+            int low = 0, high = keys.Length;
+            while (low < high)
+            {
+                int middle = (low + high) / 2;
+                if (keys[middle] <= x)
+                    low = middle + 1;
+                else
+                    high = middle;
+            }
+            return low;
+        }
+
+        // NC2010: arrays do not support range access
+        protected BigInteger[] BTreeSlice(BigInteger[] array, int begin, int end)
+        {
+            BigInteger[] result = new BigInteger[end - begin];
+            for (int i = begin; i < end; ++i)
+                result[i - begin] = array[i];
+            return result;
+        }
+        protected BigInteger[] BTreeInsertAt(BigInteger[] array, int index, BigInteger value)
+        {
+            int length = array.Length;
+            BigInteger[] result = new BigInteger[length + 1];
+            for (int i = 0; i < index; ++i)
+                result[i] = array[i];
+            result[index] = value;
+            for (int i = index; i < length; ++i)
+                result[i + 1] = array[i];
+            return result;
+        }
+        protected BigInteger[] BTreeRemoveAt(BigInteger[] array, int index)
+        {
+            int length = array.Length;
+            BigInteger[] result = new BigInteger[length - 1];
+            for (int i = 0; i < index; ++i)
+                result[i] = array[i];
+            for (int i = index + 1; i < length; ++i)
+                result[i - 1] = array[i];
+            return result;
+        }
+
+        /// <summary>
+        /// Descend from the root to the leaf where x is (or should be)
+        /// </summary>
+        /// <returns>(id of leaf, leaf, ids of the internal nodes on the path, internal nodes on the path),
+        /// the path starting from the root; (0, null, [], []) if the tree has no node</returns>
+        protected (BigInteger, BTreeNode, List<BigInteger>, List<BTreeNode>) BTreeFindLeaf(ByteString columnKey, BigInteger x)
+        {
+            List<BigInteger> pathIds = new();
+            List<BTreeNode> path = new();
+            ByteString root = new StorageMap(Storage.CurrentContext, BTREE_ROOT_PREFIX)[columnKey];
+            if (root == null)
+                return (0, null, pathIds, path);
+            BigInteger nodeId = (BigInteger)root;
+            BTreeNode node = BTreeLoad(columnKey, nodeId);
+            while (!node.IsLeaf)
+            {
+                pathIds.Add(nodeId);
+                path.Add(node);
+                nodeId = node.Values[BTreeUpperBound(node.Keys, x)];
+                node = BTreeLoad(columnKey, nodeId);
+            }
+            return (nodeId, node, pathIds, path);
+        }
+
+        /// <summary>
+        /// Insert count * x
+        /// </summary>
+        /// <param name="columnKey">user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }</param>
+        /// <param name="x"></param>
+        /// <param name="count"></param>
+        protected void BTreeInsert(ByteString columnKey, BigInteger x, BigInteger count)
+        {
+            StorageContext context = Storage.CurrentContext;
+            StorageMap treeSizeMap = new(context, BTREE_SIZE_PREFIX);
+            treeSizeMap.Put(columnKey, (BigInteger)treeSizeMap[columnKey] + count);
+            StorageMap rootMap = new(context, BTREE_ROOT_PREFIX);
+            ByteString root = rootMap[columnKey];
+            if (root == null)  // nothing inserted before
+            {
+                BigInteger leafId = BTreeAllocate(columnKey);
+                BTreeStore(columnKey, leafId, new BTreeNode { IsLeaf = true, Keys = new BigInteger[] { x }, Values = new BigInteger[] { count } });
+                rootMap.Put(columnKey, leafId);
+                return;
+            }
+            (BigInteger separator, BigInteger rightId) = BTreeInsertInto(columnKey, (BigInteger)root, x, count);
+            if (rightId == 0)
+                return;
+            // root was split
+            BigInteger newRootId = BTreeAllocate(columnKey);
+            BTreeStore(columnKey, newRootId, new BTreeNode { IsLeaf = false, Keys = new BigInteger[] { separator }, Values = new BigInteger[] { (BigInteger)root, rightId } });
+            rootMap.Put(columnKey, newRootId);
+        }
+
+        /// <returns>(separator, id of the new right sibling) if the node was split; (0, 0) otherwise</returns>
+        protected (BigInteger, BigInteger) BTreeInsertInto(ByteString columnKey, BigInteger nodeId, BigInteger x, BigInteger count)
+        {
+            BTreeNode node = BTreeLoad(columnKey, nodeId);
+            if (node.IsLeaf)
+            {
+                int i = BTreeLowerBound(node.Keys, x);
+                if (i < node.Keys.Length && node.Keys[i] == x)  // x already in tree
+                {
+                    node.Values[i] = node.Values[i] + count;
+                    BTreeStore(columnKey, nodeId, node);
+                    return (0, 0);
+                }
+                node.Keys = BTreeInsertAt(node.Keys, i, x);
+                node.Values = BTreeInsertAt(node.Values, i, count);
+            }
+            else
+            {
+                int i = BTreeUpperBound(node.Keys, x);
+                (BigInteger childSeparator, BigInteger childRightId) = BTreeInsertInto(columnKey, node.Values[i], x, count);
+                if (childRightId == 0)
+                    return (0, 0);
+                node.Keys = BTreeInsertAt(node.Keys, i, childSeparator);
+                node.Values = BTreeInsertAt(node.Values, i + 1, childRightId);
+            }
+            if (node.Keys.Length <= BTREE_MAX_KEYS)
+            {
+                BTreeStore(columnKey, nodeId, node);
+                return (0, 0);
+            }
+            return BTreeSplit(columnKey, nodeId, node);
+        }
+
+        /// <returns>(separator, id of the new right sibling)</returns>
+        protected (BigInteger, BigInteger) BTreeSplit(ByteString columnKey, BigInteger nodeId, BTreeNode node)
+        {
+            int keysLength = node.Keys.Length;
+            int middle = keysLength / 2;
+            BigInteger separator = node.Keys[middle];
+            BTreeNode right;
+            if (node.IsLeaf)
+            {
+                // the separator is copied to the parent, and stays in the right leaf
+                right = new BTreeNode { IsLeaf = true, Keys = BTreeSlice(node.Keys, middle, keysLength), Values = BTreeSlice(node.Values, middle, keysLength) };
+                node.Values = BTreeSlice(node.Values, 0, middle);
+            }
+            else
+            {
+                // the separator is moved to the parent
+                right = new BTreeNode { IsLeaf = false, Keys = BTreeSlice(node.Keys, middle + 1, keysLength), Values = BTreeSlice(node.Values, middle + 1, keysLength + 1) };
+                node.Values = BTreeSlice(node.Values, 0, middle + 1);
+            }
+            node.Keys = BTreeSlice(node.Keys, 0, middle);
+            BigInteger rightId = BTreeAllocate(columnKey);
+            BTreeStore(columnKey, nodeId, node);
+            BTreeStore(columnKey, rightId, right);
+            return (separator, rightId);
+        }
+
+        protected void BTreeDelete(UInt160 user, ByteString tableName, byte columnId, ByteString x) => BTreeDelete(user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }, x);
+        protected void BTreeDelete(ByteString columnKey, ByteString x)
+        {
+            BigInteger xValue = (BigInteger)x;
+            (BigInteger leafId, BTreeNode leaf, List<BigInteger> pathIds, List<BTreeNode> path) = BTreeFindLeaf(columnKey, xValue);
+            ExecutionEngine.Assert(leaf != null, "No value");
+            int i = BTreeLowerBound(leaf.Keys, xValue);
+            ExecutionEngine.Assert(i < leaf.Keys.Length && leaf.Keys[i] == xValue, "No value");
+            StorageMap treeSizeMap = new(Storage.CurrentContext, BTREE_SIZE_PREFIX);
+            treeSizeMap.Put(columnKey, (BigInteger)treeSizeMap[columnKey] - 1);
+            if (leaf.Values[i] > 1)
+            {
+                leaf.Values[i] = leaf.Values[i] - 1;
+                BTreeStore(columnKey, leafId, leaf);
+                return;
+            }
+            leaf.Keys = BTreeRemoveAt(leaf.Keys, i);
+            leaf.Values = BTreeRemoveAt(leaf.Values, i);
+            if (leaf.Keys.Length > 0)
+            {
+                BTreeStore(columnKey, leafId, leaf);
+                return;
+            }
+            BTreeRemoveEmptyNode(columnKey, leafId, xValue, pathIds, path);
+        }
+
+        /// <summary>
+        /// Delete a node left without keys (leaf) or without children (internal node),
+        /// remove it from its parent, and go on with the parent if it is left without children.
+        /// Then collapse the root while it is an internal node with a single child.
+        /// </summary>
+        /// <param name="x">a key that routes from the root to the node</param>
+        /// <param name="pathIds">ids of the ancestors of the node, starting from the root</param>
+        /// <param name="path">ancestors of the node, starting from the root</param>
+        protected void BTreeRemoveEmptyNode(ByteString columnKey, BigInteger nodeId, BigInteger x, List<BigInteger> pathIds, List<BTreeNode> path)
+        {
+            StorageMap nodeMap = new(Storage.CurrentContext, (ByteString)new byte[] { BTREE_NODE_PREFIX } + columnKey);
+            StorageMap rootMap = new(Storage.CurrentContext, BTREE_ROOT_PREFIX);
+            int depth = path.Count;
+            while (true)
+            {
+                nodeMap.Delete((ByteString)nodeId);
+                if (depth == 0)  // the tree is empty
+                {
+                    rootMap.Delete(columnKey);
+                    return;
+                }
+                --depth;
+                BigInteger parentId = pathIds[depth];
+                BTreeNode parent = path[depth];
+                int child = BTreeUpperBound(parent.Keys, x);
+                parent.Values = BTreeRemoveAt(parent.Values, child);
+                // the range of the removed child joins its left sibling, or its right sibling for the first child
+                if (parent.Keys.Length > 0)
+                    parent.Keys = BTreeRemoveAt(parent.Keys, child > 0 ? child - 1 : 0);
+                if (parent.Values.Length > 0)
+                {
+                    BTreeStore(columnKey, parentId, parent);
+                    break;
+                }
+                nodeId = parentId;
+            }
+            BigInteger rootId = (BigInteger)rootMap[columnKey];
+            BTreeNode root = BTreeLoad(columnKey, rootId);
+            while (!root.IsLeaf && root.Values.Length == 1)
+            {
+                nodeMap.Delete((ByteString)rootId);
+                rootId = root.Values[0];
+                root = BTreeLoad(columnKey, rootId);
+            }
+            rootMap.Put(columnKey, rootId);
+        }
+
+        /// <summary>
+        /// Find without writing anything
+        /// </summary>
+        /// <returns>count of x in the tree</returns>
+        [Safe]
+        public BigInteger BTreeFind(UInt160 user, ByteString tableName, byte columnId, ByteString x) => BTreeFind(user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }, x);
+        [Safe]
+        public BigInteger BTreeFind(ByteString columnKey, ByteString x)
+        {
+            BigInteger xValue = (BigInteger)x;
+            (_, BTreeNode leaf, _, _) = BTreeFindLeaf(columnKey, xValue);
+            ExecutionEngine.Assert(leaf != null, "No value");
+            int i = BTreeLowerBound(leaf.Keys, xValue);
+            ExecutionEngine.Assert(i < leaf.Keys.Length && leaf.Keys[i] == xValue, "No value");
+            return leaf.Values[i];
+        }
+
+        /// <returns>null if the tree is empty</returns>
+        [Safe]
+        public ByteString BTreeMax(UInt160 user, ByteString tableName, byte columnId) => BTreeMax(user + tableName + SEPARATOR + (ByteString)new byte[] { columnId });
+        [Safe]
+        public ByteString BTreeMax(ByteString columnKey)
+        {
+            ByteString root = new StorageMap(Storage.CurrentContext, BTREE_ROOT_PREFIX)[columnKey];
+            return root == null ? null : BTreePredecessorInSubtree(columnKey, (BigInteger)root, 0, false);
+        }
+
+        /// <returns>null if the tree is empty</returns>
+        [Safe]
+        public ByteString BTreeMin(UInt160 user, ByteString tableName, byte columnId) => BTreeMin(user + tableName + SEPARATOR + (ByteString)new byte[] { columnId });
+        [Safe]
+        public ByteString BTreeMin(ByteString columnKey)
+        {
+            ByteString root = new StorageMap(Storage.CurrentContext, BTREE_ROOT_PREFIX)[columnKey];
+            return root == null ? null : BTreeSuccessorInSubtree(columnKey, (BigInteger)root, 0, false);
+        }
+
+        /// <summary>
+        ///
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="columnId"></param>
+        /// <param name="x">The greatest num in the tree less than x. We allow x to be a number not inserted into the tree</param>
+        /// <returns>null if no predecessor</returns>
+        [Safe]
+        public ByteString BTreePredecessor(UInt160 user, ByteString tableName, byte columnId, ByteString x) => BTreePredecessor(user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }, x);
+        [Safe]
+        public ByteString BTreePredecessor(ByteString columnKey, ByteString x)
+        {
+            ByteString root = new StorageMap(Storage.CurrentContext, BTREE_ROOT_PREFIX)[columnKey];
+            return root == null ? null : BTreePredecessorInSubtree(columnKey, (BigInteger)root, (BigInteger)x, true);
+        }
+
+        /// <summary>
+        ///
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="columnId"></param>
+        /// <param name="x">The smallest num in the tree greater than x. We allow x to be a number not inserted into the tree</param>
+        /// <returns>null if no successor</returns>
+        [Safe]
+        public ByteString BTreeSuccessor(UInt160 user, ByteString tableName, byte columnId, ByteString x) => BTreeSuccessor(user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }, x);
+        [Safe]
+        public ByteString BTreeSuccessor(ByteString columnKey, ByteString x)
+        {
+            ByteString root = new StorageMap(Storage.CurrentContext, BTREE_ROOT_PREFIX)[columnKey];
+            return root == null ? null : BTreeSuccessorInSubtree(columnKey, (BigInteger)root, (BigInteger)x, true);
+        }
+
+        /// <summary>
+        /// The greatest key less than x in the subtree.
+        /// </summary>
+        /// <param name="bounded">if false, x is ignored and the greatest key of the subtree is returned</param>
+        /// <returns>null if not found</returns>
+        protected ByteString BTreePredecessorInSubtree(ByteString columnKey, BigInteger nodeId, BigInteger x, bool bounded)
+        {
+            BTreeNode node = BTreeLoad(columnKey, nodeId);
+            int i = bounded ? BTreeLowerBound(node.Keys, x) : node.Keys.Length;
+            if (node.IsLeaf)
+                return i > 0 ? (ByteString)node.Keys[i - 1] : null;
+            // child i may contain keys >= x. All keys in children before i are less than x
+            for (; i >= 0; --i)
+            {
+                ByteString result = BTreePredecessorInSubtree(columnKey, node.Values[i], x, bounded);
+                if (result != null)
+                    return result;
+                bounded = false;
+            }
+            return null;
+        }
+
+        /// <summary>
+        /// The smallest key greater than x in the subtree.
+        /// </summary>
+        /// <param name="bounded">if false, x is ignored and the smallest key of the subtree is returned</param>
+        /// <returns>null if not found</returns>
+        protected ByteString BTreeSuccessorInSubtree(ByteString columnKey, BigInteger nodeId, BigInteger x, bool bounded)
+        {
+            BTreeNode node = BTreeLoad(columnKey, nodeId);
+            int keysLength = node.Keys.Length;
+            int i = bounded ? BTreeUpperBound(node.Keys, x) : 0;
+            if (node.IsLeaf)
+                return i < keysLength ? (ByteString)node.Keys[i] : null;
+            // child i may contain keys <= x. All keys in children after i are greater than x
+            for (; i <= keysLength; ++i)
+            {
+                ByteString result = BTreeSuccessorInSubtree(columnKey, node.Values[i], x, bounded);
+                if (result != null)
+                    return result;
+                bounded = false;
+            }
+            return null;
+        }
+    }
+}
@@ -15,8 +15,6 @@ namespace RelationalDB
     [ManifestExtra("Description", "This is a RelationalDB")]
     public partial class RelationalDB : SmartContract
     {
-        const bool USE_INDEX_FOR_INTEGER = true;
-
         //const int LengthOfLength = 2;  // Neo3 allows only value <= 65535 == 2**16-1 bytes
 
         const byte UINT160 = 0x10;
@@ -40,7 +38,18 @@ namespace RelationalDB
         const string SEPARATOR = "\x00";
         const byte ROWS_PREFIX = (byte)'r';  // 0x72  user + tableName + SEPARATOR + rowId -> data[]
         const byte TABLE_ROW_ID_PREFIX = (byte)'i';  // 0x69  user + tableName -> rowId: int
-        const byte VALUE_TO_PRIMARY_KEY_PREFIX = (byte)'v';  // 0x76  user + tableName + SEPARATOR + columnId + value(var_length) + primaryKey -> 1
+        const byte VALUE_TO_PRIMARY_KEY_PREFIX = (byte)'v';  // 0x76  user + tableName + SEPARATOR + columnId + EncodeIndexInteger(value) + primaryKey -> 1
+        const byte INDEX_SPEC_PREFIX = (byte)'x';  // 0x78  user + tableName -> index kind of each column, 1 byte per column; absent for INDEX_ORDERED on every integer column
+        const byte INDEX_BUILD_CURSOR_PREFIX = (byte)'b';  // 0x62  user + tableName + SEPARATOR + columnId -> primary key of the last row backfilled by CreateIndex
+        const byte INDEX_DROP_STAGE_PREFIX = (byte)'e';  // 0x65  user + tableName + SEPARATOR + columnId -> stage of DropIndex
+        const byte TABLE_PURGE_STAGE_PREFIX = (byte)'p';  // 0x70  user + tableName -> stage of PurgeDroppedTable
+        const byte INDEX_NONE = 0x00;
+        const byte INDEX_EQUALITY = 0x01;  // VALUE_TO_PRIMARY_KEY_PREFIX only
+        const byte INDEX_ORDERED = 0x02;   // VALUE_TO_PRIMARY_KEY_PREFIX and splay tree (or B+ tree)
+        const byte INDEX_BUILDING = 0x80;  // flag of an index being backfilled by CreateIndex
+        const byte INDEX_ENGINE_PREFIX = 0xdf;  // user + tableName + SEPARATOR + columnId -> engine of ordered index; absent for splay tree
+        const byte INDEX_ENGINE_SPLAY = 0x00;  // SplayTreeIndex.cs
+        const byte INDEX_ENGINE_BTREE = 0x01;  // BPlusTreeIndex.cs
 
         [Safe]
         public ByteString GetColumnTypes(UInt160 user, ByteString tableName) => new StorageMap(USER_TABLE_NAME_TO_COLUMNS_PREFIX).Get(user + tableName);
@@ -71,7 +80,447 @@ namespace RelationalDB
         public Iterator ListAllDroppedTables() => new StorageMap(DROPPED_TABLE_NAME_TO_COLUMNS_PREFIX).Find();
 
         [Safe]
-        public Iterator FindPrimaryKeyFromValue(UInt160 user, ByteString tableName, byte columnId, BigInteger value) => new StorageMap(VALUE_TO_PRIMARY_KEY_PREFIX).Find(user + tableName + SEPARATOR + (ByteString)new byte[] { columnId } + EncodeInteger(value), FindOptions.RemovePrefix | FindOptions.KeysOnly);
+        public Iterator FindPrimaryKeyFromValue(UInt160 user, ByteString tableName, byte columnId, BigInteger value) => new StorageMap(VALUE_TO_PRIMARY_KEY_PREFIX).Find(user + tableName + SEPARATOR + (ByteString)new byte[] { columnId } + EncodeIndexInteger(value), FindOptions.RemovePrefix | FindOptions.KeysOnly);
+
+        /// <summary>
+        /// SELECT primaryKey FROM table WHERE column BETWEEN lo AND hi ORDER BY column LIMIT limit
+        /// Index keys sort bytewise in the same order as the values (see <see cref="EncodeIndexInteger"/>),
+        /// so the range is served by Find over byte-aligned key prefixes, without walking the splay tree.
+        /// Values of different lengths have different marker bytes. Every marker strictly between those of lo and hi,
+        /// or whose values are all in [lo, hi], is read by a single Find.
+        /// Find cannot seek, so the bound where the scan enters the range (lo forwards, hi backwards) is reached
+        /// by a Find for each prefix of keys above (below) it: up to 255 per byte of the bound,
+        /// unless the bound is the smallest (largest) value of its marker.
+        /// The other bound costs nothing: the scan stops at the first value beyond it.
+        /// Prefixes are read in order, and the scan stops as soon as limit primary keys are found.
+        /// For an open range, use lo = -2**255 or hi = 2**255 - 1, which cover their whole marker.
+        /// Index entries written before EncodeIndexInteger (with EncodeInteger) are not found;
+        /// rebuild such indexes with DropIndex and then CreateIndex.
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="columnId"></param>
+        /// <param name="lo">inclusive lower bound</param>
+        /// <param name="hi">inclusive upper bound</param>
+        /// <param name="backwards">if true, the largest values are returned first</param>
+        /// <param name="limit">max count of primary keys to return; 0 for no limit</param>
+        /// <returns>primary keys, ordered by the value of the column</returns>
+        [Safe]
+        public ByteString[] SelectRange(UInt160 user, ByteString tableName, byte columnId, BigInteger lo, BigInteger hi, bool backwards, BigInteger limit)
+        {
+            List<ByteString> primaryKeys = new();
+            if (lo > hi)
+                return primaryKeys;
+            ByteString columnKey = user + tableName + SEPARATOR + (ByteString)new byte[] { columnId };
+            byte[] loKey = (byte[])EncodeIndexInteger(lo);
+            byte[] hiKey = (byte[])EncodeIndexInteger(hi);
+            int loMarker = loKey[0], hiMarker = hiKey[0];
+            for (int step = 0; step <= hiMarker - loMarker; ++step)
+            {
+                int marker = backwards ? hiMarker - step : loMarker + step;
+                bool wholeBelow = marker > loMarker || lo == IndexMarkerMin(marker);
+                bool wholeAbove = marker < hiMarker || hi == IndexMarkerMax(marker);
+                bool done;
+                // the scan enters the marker from its first (last) key, or from the bound
+                if (backwards ? wholeAbove : wholeBelow)
+                    done = SelectIndexPrefix(columnKey, (ByteString)new byte[] { (byte)marker }, lo, hi, backwards, limit, primaryKeys);
+                else if (backwards)
+                    done = SelectIndexBackwards(columnKey, wholeBelow ? IndexMarkerLowKey(marker) : loKey, hiKey, lo, hi, limit, primaryKeys);
+                else
+                    done = SelectIndexForwards(columnKey, loKey, wholeAbove ? IndexMarkerHighKey(marker) : hiKey, lo, hi, limit, primaryKeys);
+                if (done)
+                    break;
+            }
+            return primaryKeys;
+        }
+
+        /// <summary>
+        /// Add the primary keys of the index entries starting with prefix, until a value beyond hi (below lo backwards)
+        /// </summary>
+        /// <returns>true if the scan is finished: a value out of range, or limit primary keys</returns>
+        protected bool SelectIndexPrefix(ByteString columnKey, ByteString prefix, BigInteger lo, BigInteger hi, bool backwards, BigInteger limit, List<ByteString> primaryKeys)
+        {
+            FindOptions options = backwards ?
+                FindOptions.RemovePrefix | FindOptions.KeysOnly | FindOptions.Backwards :
+                FindOptions.RemovePrefix | FindOptions.KeysOnly;
+            Iterator iterator = new StorageMap(VALUE_TO_PRIMARY_KEY_PREFIX).Find(columnKey + prefix, options);
+            while (iterator.Next())
+            {
+                (BigInteger value, byte[] primaryKey) = DecodeIndexInteger((byte[])(prefix + (ByteString)iterator.Value));
+                if (backwards ? value < lo : value > hi)
+                    return true;
+                primaryKeys.Add((ByteString)primaryKey);
+                if (limit > 0 && primaryKeys.Count >= limit)
+                    return true;
+            }
+            return false;
+        }
+
+        /// <summary>
+        /// Ascending scan of the keys from a to b (same length), entering exactly at a and stopping after hi
+        /// </summary>
+        protected bool SelectIndexForwards(ByteString columnKey, byte[] a, byte[] b, BigInteger lo, BigInteger hi, BigInteger limit, List<ByteString> primaryKeys)
+        {
+            int length = a.Length;
+            int depth = 0;
+            while (depth < length && a[depth] == b[depth])
+                ++depth;
+            if (depth == length)
+                return SelectIndexPrefix(columnKey, (ByteString)a, lo, hi, false, limit, primaryKeys);
+            if (SelectIndexAtLeast(columnKey, a, depth + 1, lo, hi, limit, primaryKeys))
+                return true;
+            ByteString prefix = (ByteString)a[..depth];
+            for (int c = a[depth] + 1; c < b[depth]; ++c)
+                if (SelectIndexPrefix(columnKey, prefix + (ByteString)new byte[] { (byte)c }, lo, hi, false, limit, primaryKeys))
+                    return true;
+            return SelectIndexPrefix(columnKey, prefix + (ByteString)new byte[] { b[depth] }, lo, hi, false, limit, primaryKeys);
+        }
+
+        /// <summary>
+        /// Descending scan of the keys from b to a (same length), entering exactly at b and stopping before lo
+        /// </summary>
+        protected bool SelectIndexBackwards(ByteString columnKey, byte[] a, byte[] b, BigInteger lo, BigInteger hi, BigInteger limit, List<ByteString> primaryKeys)
+        {
+            int length = b.Length;
+            int depth = 0;
+            while (depth < length && a[depth] == b[depth])
+                ++depth;
+            if (depth == length)
+                return SelectIndexPrefix(columnKey, (ByteString)b, lo, hi, true, limit, primaryKeys);
+            if (SelectIndexAtMost(columnKey, b, depth + 1, lo, hi, limit, primaryKeys))
+                return true;
+            ByteString prefix = (ByteString)b[..depth];
+            for (int c = b[depth] - 1; c > a[depth]; --c)
+                if (SelectIndexPrefix(columnKey, prefix + (ByteString)new byte[] { (byte)c }, lo, hi, true, limit, primaryKeys))
+                    return true;
+            return SelectIndexPrefix(columnKey, prefix + (ByteString)new byte[] { a[depth] }, lo, hi, true, limit, primaryKeys);
+        }
+
+        /// <summary>
+        /// Ascending scan of the keys starting with a[..depth] and not less than a
+        /// </summary>
+        protected bool SelectIndexAtLeast(ByteString columnKey, byte[] a, int depth, BigInteger lo, BigInteger hi, BigInteger limit, List<ByteString> primaryKeys)
+        {
+            ByteString prefix = (ByteString)a[..depth];
+            if (SuffixIs(a, depth, 0x00))
+                return SelectIndexPrefix(columnKey, prefix, lo, hi, false, limit, primaryKeys);
+            if (SelectIndexAtLeast(columnKey, a, depth + 1, lo, hi, limit, primaryKeys))
+                return true;
+            for (int c = a[depth] + 1; c <= 0xff; ++c)
+                if (SelectIndexPrefix(columnKey, prefix + (ByteString)new byte[] { (byte)c }, lo, hi, false, limit, primaryKeys))
+                    return true;
+            return false;
+        }
+
+        /// <summary>
+        /// Descending scan of the keys starting with b[..depth] and not greater than b
+        /// </summary>
+        protected bool SelectIndexAtMost(ByteString columnKey, byte[] b, int depth, BigInteger lo, BigInteger hi, BigInteger limit, List<ByteString> primaryKeys)
+        {
+            ByteString prefix = (ByteString)b[..depth];
+            if (SuffixIs(b, depth, 0xff))
+                return SelectIndexPrefix(columnKey, prefix, lo, hi, true, limit, primaryKeys);
+            if (SelectIndexAtMost(columnKey, b, depth + 1, lo, hi, limit, primaryKeys))
+                return true;
+            for (int c = b[depth] - 1; c >= 0; --c)
+                if (SelectIndexPrefix(columnKey, prefix + (ByteString)new byte[] { (byte)c }, lo, hi, true, limit, primaryKeys))
+                    return true;
+            return false;
+        }
+
+        /// <summary>
+        /// Smallest integer encoded with the marker byte by <see cref="EncodeIndexInteger"/>
+        /// </summary>
+        protected BigInteger IndexMarkerMin(int marker)
+        {
+            if (marker == 0x80)
+                return 0;
+            if (marker > 0x80)
+                return marker == 0x81 ? 1 : BigInteger.Pow(2, 8 * (marker - 0x80 - 1) - 1);
+            // -2**(8 * length - 1), without the intermediate 2**(8 * length - 1) which may exceed 32 bytes
+            return -BigInteger.Pow(2, 8 * (0x80 - marker) - 2) * 2;
+        }
+
+        /// <summary>
+        /// Largest integer encoded with the marker byte by <see cref="EncodeIndexInteger"/>
+        /// </summary>
+        protected BigInteger IndexMarkerMax(int marker)
+        {
+            if (marker == 0x80)
+                return 0;
+            if (marker > 0x80)
+                // 2**(8 * length - 1) - 1, without the intermediate 2**(8 * length - 1) which may exceed 32 bytes
+                return (BigInteger.Pow(2, 8 * (marker - 0x80) - 2) - 1) * 2 + 1;
+            return marker == 0x7f ? -1 : -BigInteger.Pow(2, 8 * (0x80 - marker - 1) - 1) - 1;
+        }
+
+        /// <summary>
+        /// A key, not always the encoding of an integer, not greater than any key with the marker byte:
+        /// the marker, then 0x00.. for non-negative values, or 0x80 0x00.. for negative values
+        /// </summary>
+        protected byte[] IndexMarkerLowKey(int marker)
+        {
+            int length = marker >= 0x80 ? marker - 0x80 : 0x80 - marker;
+            byte[] key = new byte[length + 1];
+            key[0] = (byte)marker;
+            if (marker < 0x80)
+                key[1] = 0x80;
+            return key;
+        }
+
+        /// <summary>
+        /// A key, not always the encoding of an integer, not less than any key with the marker byte:
+        /// the marker, then 0x7f 0xff.. for non-negative values, or 0xff.. for negative values
+        /// </summary>
+        protected byte[] IndexMarkerHighKey(int marker)
+        {
+            int length = marker >= 0x80 ? marker - 0x80 : 0x80 - marker;
+            byte[] key = new byte[length + 1];
+            key[0] = (byte)marker;
+            for (int i = 1; i <= length; ++i)
+                key[i] = 0xff;
+            if (marker >= 0x80)
+                key[1] = 0x7f;
+            return key;
+        }
+
+        /// <summary>
+        /// Whether every byte of data from depth on is b; true for an empty suffix
+        /// </summary>
+        protected bool SuffixIs(byte[] data, int depth, byte b)
+        {
+            int length = data.Length;
+            for (; depth < length; ++depth)
+                if (data[depth] != b)
+                    return false;
+            return true;
+        }
+
+        [Safe]
+        public ByteString GetIndexSpec(UInt160 user, ByteString tableName)
+        {
+            ByteString tableKey = user + tableName;
+            byte[] descriptor = LoadDescriptor(tableKey);
+            if (descriptor == null)
+                return null;
+            return (ByteString)LoadIndexSpec(tableKey, descriptor);
+        }
+
+        /// <summary>
+        /// 
+        /// </summary>
+        /// <param name="tableKey"></param>
+        /// <param name="descriptor"></param>
+        /// <returns>index kind of each column</returns>
+        protected byte[] LoadIndexSpec(ByteString tableKey, byte[] descriptor)
+        {
+            ByteString indexSpec = new StorageMap(INDEX_SPEC_PREFIX)[tableKey];
+            if (indexSpec != null)
+                return (byte[])indexSpec;
+            // tables created without index spec: ordered index on every integer column
+            int columnsCount = DescriptorColumnsCount(descriptor);
+            byte[] kinds = new byte[columnsCount];
+            for (int column = 0; column < columnsCount; ++column)
+            {
+                byte type = DescriptorType(descriptor, column);
+                if (type == INT_FIXED_LEN || type == INT_VAR_LEN)
+                    kinds[column] = INDEX_ORDERED;
+            }
+            return kinds;
+        }
+
+        protected bool HasIndex(byte[] indexSpec)
+        {
+            foreach (byte kind in indexSpec)
+                if (kind != INDEX_NONE)
+                    return true;
+            return false;
+        }
+
+        protected void AssertIndexKind(byte type, byte kind)
+        {
+            ExecutionEngine.Assert(kind == INDEX_NONE || kind == INDEX_EQUALITY || kind == INDEX_ORDERED, "Invalid index kind");
+            ExecutionEngine.Assert(kind == INDEX_NONE || type == INT_FIXED_LEN || type == INT_VAR_LEN, "Index on non-integer column");
+        }
+
+        /// <summary>
+        /// Whether the index of a column should be maintained for a row.
+        /// While CreateIndex is backfilling, only the rows up to the backfill cursor are indexed by writes;
+        /// the other rows are left to the backfill.
+        /// Rows of auto-increment tables are backfilled in the order of rowIds, rows of other tables in the order of keys.
+        /// </summary>
+        /// <param name="columnKey"></param>
+        /// <param name="kind">index kind of the column</param>
+        /// <param name="primaryKey"></param>
+        /// <returns></returns>
+        protected bool IndexCovers(ByteString columnKey, byte kind, ByteString primaryKey)
+        {
+            if ((kind & INDEX_BUILDING) == 0)
+                return true;
+            ByteString cursor = new StorageMap(INDEX_BUILD_CURSOR_PREFIX)[columnKey];
+            if (cursor == null)
+                return false;
+            // columnKey == tableKey + SEPARATOR + columnId
+            ByteString tableKey = (ByteString)((byte[])columnKey)[..(columnKey.Length - 2)];
+            if (DescriptorUsesAutoIncPriKey(LoadDescriptor(tableKey)))
+                return (BigInteger)primaryKey <= (BigInteger)cursor;
+            return StdLib.MemoryCompare(primaryKey, cursor) <= 0;
+        }
+
+        [Safe]
+        public BigInteger GetIndexEngine(UInt160 user, ByteString tableName, byte columnId) => (BigInteger)new StorageMap(INDEX_ENGINE_PREFIX)[user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }];
+
+        /// <summary>
+        /// Choose the engine of the ordered index of a column.
+        /// The index of the column must be empty.
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="columnId"></param>
+        /// <param name="engine">INDEX_ENGINE_SPLAY or INDEX_ENGINE_BTREE</param>
+        public void SetIndexEngine(UInt160 user, ByteString tableName, byte columnId, byte engine)
+        {
+            ExecutionEngine.Assert(Runtime.CheckWitness(user), "witness SetIndexEngine");
+            ExecutionEngine.Assert(engine == INDEX_ENGINE_SPLAY || engine == INDEX_ENGINE_BTREE, "Invalid engine");
+            ExecutionEngine.Assert(SplayGetSize(user, tableName, columnId) == 0 && BTreeGetSize(user, tableName, columnId) == 0, "Index not empty");
+            StorageMap engineMap = new(INDEX_ENGINE_PREFIX);
+            ByteString columnKey = user + tableName + SEPARATOR + (ByteString)new byte[] { columnId };
+            if (engine == INDEX_ENGINE_SPLAY)
+                engineMap.Delete(columnKey);
+            else
+                engineMap.Put(columnKey, engine);
+        }
+
+        protected bool UseBTree(ByteString columnKey) => (BigInteger)new StorageMap(INDEX_ENGINE_PREFIX)[columnKey] == INDEX_ENGINE_BTREE;
+
+        protected void OrderedIndexInsert(ByteString columnKey, ByteString value)
+        {
+            if (UseBTree(columnKey))
+                BTreeInsert(columnKey, (BigInteger)value, 1);
+            else
+                SplayInsert(columnKey, value);
+        }
+
+        protected void OrderedIndexDelete(ByteString columnKey, ByteString value)
+        {
+            if (UseBTree(columnKey))
+                BTreeDelete(columnKey, value);
+            else
+                SplayDelete(columnKey, value);
+        }
+
+        /// <param name="values">sorted in place</param>
+        protected void OrderedIndexBulkInsert(ByteString columnKey, BigInteger[] values)
+        {
+            if (!UseBTree(columnKey))
+            {
+                SplayBulkInsert(columnKey, values);
+                return;
+            }
+            SortIntegers(values);
+            int valuesLength = values.Length;
+            int i = 0;
+            while (i < valuesLength)
+            {
+                int j = i + 1;
+                while (j < valuesLength && values[j] == values[i])
+                    ++j;
+                BTreeInsert(columnKey, values[i], j - i);
+                i = j;
+            }
+        }
+
+        // Find/Min/Max/Predecessor/Successor of the ordered index of a column, whatever its engine
+
+        public BigInteger IndexFind(UInt160 user, ByteString tableName, byte columnId, ByteString x)
+        {
+            ByteString columnKey = user + tableName + SEPARATOR + (ByteString)new byte[] { columnId };
+            return UseBTree(columnKey) ? BTreeFind(columnKey, x) : SplayFind(columnKey, x);
+        }
+        public ByteString IndexMax(UInt160 user, ByteString tableName, byte columnId)
+        {
+            ByteString columnKey = user + tableName + SEPARATOR + (ByteString)new byte[] { columnId };
+            return UseBTree(columnKey) ? BTreeMax(columnKey) : SplayMax(columnKey, null);
+        }
+        public ByteString IndexMin(UInt160 user, ByteString tableName, byte columnId)
+        {
+            ByteString columnKey = user + tableName + SEPARATOR + (ByteString)new byte[] { columnId };
+            return UseBTree(columnKey) ? BTreeMin(columnKey) : SplayMin(columnKey, null);
+        }
+        public ByteString IndexPredecessor(UInt160 user, ByteString tableName, byte columnId, ByteString x)
+        {
+            ByteString columnKey = user + tableName + SEPARATOR + (ByteString)new byte[] { columnId };
+            return UseBTree(columnKey) ? BTreePredecessor(columnKey, x) : SplayPredecessor(columnKey, x);
+        }
+        public ByteString IndexSuccessor(UInt160 user, ByteString tableName, byte columnId, ByteString x)
+        {
+            ByteString columnKey = user + tableName + SEPARATOR + (ByteString)new byte[] { columnId };
+            return UseBTree(columnKey) ? BTreeSuccessor(columnKey, x) : SplaySuccessor(columnKey, x);
+        }
+
+        // Order statistics of the ordered index of a column, from the subtree aggregates of the splay tree.
+        // Each query walks down the tree once: O(depth) storage reads, without splaying.
+
+        /// <summary>
+        /// SELECT COUNT(*) FROM table WHERE column BETWEEN lo AND hi
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="columnId"></param>
+        /// <param name="lo">inclusive lower bound</param>
+        /// <param name="hi">inclusive upper bound</param>
+        /// <returns></returns>
+        [Safe]
+        public BigInteger CountRange(UInt160 user, ByteString tableName, byte columnId, BigInteger lo, BigInteger hi)
+        {
+            ByteString columnKey = OrderStatisticsColumnKey(user, tableName, columnId);
+            if (lo > hi)
+                return 0;
+            (BigInteger countToHi, _) = SplayCountSumLess(columnKey, hi + 1);
+            (BigInteger countBelowLo, _) = SplayCountSumLess(columnKey, lo);
+            return countToHi - countBelowLo;
+        }
+
+        /// <summary>
+        /// SELECT SUM(column) FROM table WHERE column BETWEEN lo AND hi
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="columnId"></param>
+        /// <param name="lo">inclusive lower bound</param>
+        /// <param name="hi">inclusive upper bound</param>
+        /// <returns></returns>
+        [Safe]
+        public BigInteger SumRange(UInt160 user, ByteString tableName, byte columnId, BigInteger lo, BigInteger hi)
+        {
+            ByteString columnKey = OrderStatisticsColumnKey(user, tableName, columnId);
+            if (lo > hi)
+                return 0;
+            (_, BigInteger sumToHi) = SplayCountSumLess(columnKey, hi + 1);
+            (_, BigInteger sumBelowLo) = SplayCountSumLess(columnKey, lo);
+            return sumToHi - sumBelowLo;
+        }
+
+        /// <summary>
+        /// SELECT COUNT(*) FROM table WHERE column &lt; x
+        /// </summary>
+        [Safe]
+        public BigInteger Rank(UInt160 user, ByteString tableName, byte columnId, BigInteger x) => SplayRank(OrderStatisticsColumnKey(user, tableName, columnId), x);
+
+        /// <summary>
+        /// SELECT column FROM table ORDER BY column LIMIT 1 OFFSET k
+        /// Use k = size / 2 for the median, or size - n for the n-th largest value.
+        /// </summary>
+        /// <returns>null if k is out of range</returns>
+        [Safe]
+        public ByteString SelectKth(UInt160 user, ByteString tableName, byte columnId, BigInteger k) => SplaySelectKth(OrderStatisticsColumnKey(user, tableName, columnId), k);
+
+        protected ByteString OrderStatisticsColumnKey(UInt160 user, ByteString tableName, byte columnId)
+        {
+            ByteString columnKey = user + tableName + SEPARATOR + (ByteString)new byte[] { columnId };
+            ExecutionEngine.Assert(!UseBTree(columnKey), "Order statistics need splay tree");
+            return columnKey;
+        }
 
         /// <summary>
         /// Be aware that Neo3 allows only storage key no more than 64 bytes
@@ -90,12 +539,40 @@ namespace RelationalDB
         /// <returns>count of columns</returns>
         /// <exception cref="ArgumentOutOfRangeException"></exception>
         /// <exception cref="ArgumentException"></exception>
-        public BigInteger CreateTable(UInt160 user, ByteString tableName, ByteString columnTypes, bool useAutoIncPriKey)
+        public BigInteger CreateTable(UInt160 user, ByteString tableName, ByteString columnTypes, bool useAutoIncPriKey) => CreateTable(user, tableName, columnTypes, useAutoIncPriKey, null);
+
+        /// <summary>
+        /// <see cref="CreateTable(UInt160, ByteString, ByteString, bool)"/> with the indexes of each column specified
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="columnTypes"></param>
+        /// <param name="useAutoIncPriKey"></param>
+        /// <param name="indexSpec">
+        /// 1 byte for each column: INDEX_NONE, INDEX_EQUALITY or INDEX_ORDERED.
+        /// Only integer columns can be indexed.
+        /// if null, INDEX_ORDERED for every integer column
+        /// </param>
+        /// <returns>count of columns</returns>
+        public BigInteger CreateTable(UInt160 user, ByteString tableName, ByteString columnTypes, bool useAutoIncPriKey, ByteString indexSpec) => CreateTable(user, tableName, columnTypes, useAutoIncPriKey, indexSpec, ROW_FORMAT_V1);
+
+        /// <summary>
+        /// <see cref="CreateTable(UInt160, ByteString, ByteString, bool, ByteString)"/> with the format of stored rows specified
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="columnTypes"></param>
+        /// <param name="useAutoIncPriKey"></param>
+        /// <param name="indexSpec"></param>
+        /// <param name="rowFormat">ROW_FORMAT_V1, or the compact ROW_FORMAT_V2 which allows NULL values (see RowFormatV2.cs)</param>
+        /// <returns>count of columns</returns>
+        public BigInteger CreateTable(UInt160 user, ByteString tableName, ByteString columnTypes, bool useAutoIncPriKey, ByteString indexSpec, byte rowFormat)
         {
             ExecutionEngine.Assert(Runtime.CheckWitness(user), "witness CreateTable");
             ExecutionEngine.Assert(StdLib.MemorySearch(tableName, SEPARATOR) == -1, "SEPARATOR in tableName");
             if (columnTypes.Length >= 256) throw new ArgumentOutOfRangeException("Too many columns");
             if (columnTypes.Length == 0) throw new ArgumentException("No column specified");
+            ExecutionEngine.Assert(rowFormat == ROW_FORMAT_V1 || rowFormat == ROW_FORMAT_V2, "Invalid row format");
 
             StorageContext context = Storage.CurrentContext;
             ByteString tableKey = user + tableName;
@@ -114,21 +591,29 @@ namespace RelationalDB
                 byte type = columnTypes[i];
                 if (type == BOOLEAN || type == INT_VAR_LEN || type == BYTESTRING_VAR_LEN || 
                     type == UINT160 || type == UINT256)
-                {
                     columnTypeMap.Put(tableKey + SEPARATOR + (ByteString)new byte[] { ++columnId }, type);
-                    continue;
-                }
-                if (type == INT_FIXED_LEN || type == BYTESTRING_FIXED_LEN)
+                else if (type == INT_FIXED_LEN || type == BYTESTRING_FIXED_LEN)
                 {
                     columnTypeMap.Put(tableKey + SEPARATOR + (ByteString)new byte[] { ++columnId }, (ByteString)new byte[] { type, columnTypes[++i] });
                     // now columnTypes[i] refers to the (fixed) length of the value, in count of bytes
                     ExecutionEngine.Assert(columnTypes[i] != 0x00, "Invalid length 0x00");
-                    continue;
                 }
-                ExecutionEngine.Assert(false, "Invalid type");
+                else
+                    ExecutionEngine.Assert(false, "Invalid type");
+                if (indexSpec != null)
+                {
+                    ExecutionEngine.Assert(columnId <= indexSpec.Length, "Wrong index spec length");
+                    AssertIndexKind(type, indexSpec[columnId - 1]);
+                }
             }
 
             createdTable.Put(tableKey, columnTypes);
+            new StorageMap(context, TABLE_DESCRIPTOR_PREFIX).Put(tableKey, CompileDescriptor(columnTypes, useAutoIncPriKey, rowFormat));
+            if (indexSpec != null)
+            {
+                ExecutionEngine.Assert(columnId == indexSpec.Length, "Wrong index spec length");
+                new StorageMap(context, INDEX_SPEC_PREFIX).Put(tableKey, indexSpec);
+            }
             if (useAutoIncPriKey)
                 new StorageMap(context, TABLE_ROW_ID_PREFIX).Put(tableKey, 1);
             //else
@@ -169,9 +654,304 @@ namespace RelationalDB
             if (columnTypes == null || columnTypes.Length == 0)
                 throw new ArgumentException("No table at id " + tableName);
             tableToColumns.Delete(tableKey);
+            new StorageMap(context, TABLE_DESCRIPTOR_PREFIX).Delete(tableKey);
             new StorageMap(context, DROPPED_TABLE_NAME_TO_COLUMNS_PREFIX).Put(tableKey, columnTypes);
         }
 
+        /// <summary>
+        /// Delete all the storage left by a dropped table: rows, columns, indexes and their trees.
+        /// At most maxEntries storage entries are deleted in each call.
+        /// Call again with the same arguments until it returns true.
+        /// After that, the table name can be used by CreateTable again.
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="maxEntries"></param>
+        /// <returns>true if all the storage of the table is deleted</returns>
+        /// <exception cref="ArgumentException"></exception>
+        public bool PurgeDroppedTable(UInt160 user, ByteString tableName, BigInteger maxEntries)
+        {
+            ExecutionEngine.Assert(Runtime.CheckWitness(user), "witness PurgeDroppedTable");
+            ExecutionEngine.Assert(maxEntries > 0, "No entries");
+            StorageContext context = Storage.CurrentContext;
+            ByteString tableKey = user + tableName;
+            StorageMap droppedTables = new(context, DROPPED_TABLE_NAME_TO_COLUMNS_PREFIX);
+            if (droppedTables.Get(tableKey) == null)
+                throw new ArgumentException("No dropped table");
+            StorageMap stageMap = new(context, TABLE_PURGE_STAGE_PREFIX);
+            ByteString stage = stageMap[tableKey];
+
+            ByteString[] prefixes = TableStoragePrefixes(tableKey);
+            int prefixesLength = prefixes.Length;
+            int currentStage = stage == null ? 0 : stage[0];
+            BigInteger deleted = 0;
+            while (currentStage < prefixesLength)
+            {
+                deleted += DeleteByPrefix(prefixes[currentStage], maxEntries - deleted);
+                if (deleted >= maxEntries)
+                {
+                    stageMap.Put(tableKey, (ByteString)new byte[] { (byte)currentStage });
+                    return false;
+                }
+                ++currentStage;
+            }
+            new StorageMap(context, TABLE_ROW_ID_PREFIX).Delete(tableKey);
+            new StorageMap(context, INDEX_SPEC_PREFIX).Delete(tableKey);
+            new StorageMap(context, TABLE_DESCRIPTOR_PREFIX).Delete(tableKey);
+            stageMap.Delete(tableKey);
+            droppedTables.Delete(tableKey);
+            return true;
+        }
+
+        /// <summary>
+        /// Storage prefixes of all the entries of a table keyed by its columns or rows,
+        /// except the single entries keyed by tableKey
+        /// </summary>
+        /// <param name="tableKey">user + tableName</param>
+        /// <returns></returns>
+        protected ByteString[] TableStoragePrefixes(ByteString tableKey)
+        {
+            // SEPARATOR is not in tableName, so this prefix does not cover other tables
+            ByteString key = tableKey + SEPARATOR;
+            byte[] prefixBytes = new byte[] {
+                ROWS_PREFIX, VALUE_TO_PRIMARY_KEY_PREFIX, COLUMN_ID_PREFIX, COLUMN_NAME_PREFIX,
+                INDEX_BUILD_CURSOR_PREFIX, INDEX_DROP_STAGE_PREFIX, INDEX_ENGINE_PREFIX,
+                SPLAY_SIZE_PREFIX, SPLAY_ROOT_PREFIX,
+                SPLAY_NODE_PARENT_PREFIX, SPLAY_NODE_LEFT_PREFIX, SPLAY_NODE_RIGHT_PREFIX, SPLAY_NODE_COUNT_PREFIX,
+                SPLAY_NODE_SUBTREE_COUNT_PREFIX, SPLAY_NODE_SUBTREE_SUM_PREFIX,
+                BTREE_SIZE_PREFIX, BTREE_ROOT_PREFIX, BTREE_NODE_ID_PREFIX, BTREE_NODE_PREFIX,
+            };
+            int prefixesLength = prefixBytes.Length;
+            ByteString[] prefixes = new ByteString[prefixesLength];
+            for (int i = 0; i < prefixesLength; ++i)
+                prefixes[i] = (ByteString)new byte[] { prefixBytes[i] } + key;
+            return prefixes;
+        }
+
+        /// <summary>
+        /// Add an index to a column of an existing table. At most maxRows existing rows are backfilled in each call.
+        /// Call again with the same arguments until it returns true.
+        /// Rows written during the backfill are indexed either by the write or by the backfill.
+        /// Each call resumes after the cursor without stepping over the rows already backfilled:
+        /// rows of auto-increment tables are read by rowId with Get, and rows of other tables by Find over the
+        /// byte-aligned key prefixes after the cursor, up to 255 per byte of the cursor.
+        /// So each call costs O(maxRows) GAS plus those Finds, whatever the rows already backfilled.
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="columnId"></param>
+        /// <param name="kind">INDEX_EQUALITY or INDEX_ORDERED</param>
+        /// <param name="maxRows">
+        /// at most this many rows are backfilled by this call;
+        /// for auto-increment tables, at most this many rowIds are read, including those of deleted rows
+        /// </param>
+        /// <returns>true if the index is completely built</returns>
+        /// <exception cref="ArgumentException"></exception>
+        public bool CreateIndex(UInt160 user, ByteString tableName, byte columnId, byte kind, BigInteger maxRows)
+        {
+            ExecutionEngine.Assert(Runtime.CheckWitness(user), "witness CreateIndex");
+            ExecutionEngine.Assert(kind == INDEX_EQUALITY || kind == INDEX_ORDERED, "Invalid index kind");
+            ExecutionEngine.Assert(maxRows > 0, "No rows");
+            StorageContext context = Storage.CurrentContext;
+            ByteString tableKey = user + tableName;
+            byte[] descriptor = LoadDescriptor(tableKey);
+            if (descriptor == null)
+                throw new ArgumentException("No table");
+            byte[] indexSpec = LoadIndexSpec(tableKey, descriptor);
+            ExecutionEngine.Assert(columnId >= 1 && columnId <= indexSpec.Length, "No column");
+            ByteString columnKey = tableKey + SEPARATOR + (ByteString)new byte[] { columnId };
+            StorageMap indexSpecMap = new(context, INDEX_SPEC_PREFIX);
+            StorageMap cursorMap = new(context, INDEX_BUILD_CURSOR_PREFIX);
+            if (indexSpec[columnId - 1] == INDEX_NONE)
+            {
+                ExecutionEngine.Assert(new StorageMap(context, INDEX_DROP_STAGE_PREFIX)[columnKey] == null, "Index being dropped");
+                AssertIndexKind(DescriptorType(descriptor, columnId - 1), kind);
+                indexSpec[columnId - 1] = (byte)(kind | INDEX_BUILDING);
+                indexSpecMap.Put(tableKey, (ByteString)indexSpec);
+            }
+            else
+                ExecutionEngine.Assert(indexSpec[columnId - 1] == (kind | INDEX_BUILDING), "Index already created");
+
+            ByteString cursor = cursorMap[columnKey];
+            if (DescriptorUsesAutoIncPriKey(descriptor))
+            {
+                BigInteger nextRowId = (BigInteger)new StorageMap(context, TABLE_ROW_ID_PREFIX)[tableKey];
+                StorageMap rowsMap = new(context, ROWS_PREFIX);
+                BigInteger rowId = (BigInteger)cursor + 1;
+                BigInteger endRowId = rowId + maxRows < nextRowId ? rowId + maxRows : nextRowId;
+                for (; rowId < endRowId; ++rowId)
+                {
+                    ByteString data = rowsMap[tableKey + SEPARATOR + (ByteString)rowId];
+                    if (data != null)
+                        BackfillIndexRow(columnKey, kind, descriptor, (ByteString)rowId, (byte[])data);
+                }
+                if (rowId < nextRowId)
+                {
+                    cursorMap.Put(columnKey, (ByteString)(rowId - 1));
+                    return false;
+                }
+            }
+            else if (cursor == null)
+            {
+                if (BackfillIndexPrefix(columnKey, kind, descriptor, tableKey, "", null, maxRows) >= maxRows)
+                    return false;
+            }
+            else
+            {
+                // the keys extending the cursor, then the keys greater than the cursor at each byte, from the last byte
+                byte[] cursorBytes = (byte[])cursor;
+                BigInteger backfilled = BackfillIndexPrefix(columnKey, kind, descriptor, tableKey, cursor, cursor, maxRows);
+                for (int depth = cursorBytes.Length - 1; depth >= 0 && backfilled < maxRows; --depth)
+                {
+                    ByteString prefix = (ByteString)cursorBytes[..depth];
+                    for (int c = cursorBytes[depth] + 1; c <= 0xff && backfilled < maxRows; ++c)
+                        backfilled += BackfillIndexPrefix(columnKey, kind, descriptor, tableKey,
+                            prefix + (ByteString)new byte[] { (byte)c }, null, maxRows - backfilled);
+                }
+                if (backfilled >= maxRows)
+                    return false;
+            }
+            indexSpec[columnId - 1] = kind;
+            indexSpecMap.Put(tableKey, (ByteString)indexSpec);
+            cursorMap.Delete(columnKey);
+            return true;
+        }
+
+        /// <summary>
+        /// Index one existing row for CreateIndex
+        /// </summary>
+        protected void BackfillIndexRow(ByteString columnKey, byte kind, byte[] descriptor, ByteString primaryKey, byte[] data)
+        {
+            // columnKey == tableKey + SEPARATOR + columnId
+            byte columnId = ((byte[])columnKey)[columnKey.Length - 1];
+            ByteString value = (ByteString)DecodeDescribedRow(data, descriptor, primaryKey)[columnId - 1];
+            if (value == null)  // NULL values are not indexed
+                return;
+            WriteRowIndex(columnKey, primaryKey, (BigInteger)value);
+            if (kind == INDEX_ORDERED)
+                OrderedIndexInsert(columnKey, value);
+        }
+
+        /// <summary>
+        /// Index the existing rows whose primary keys start with prefix, in the order of keys, for CreateIndex.
+        /// After maxRows rows, the primary key of the last one is saved as the backfill cursor.
+        /// </summary>
+        /// <param name="skip">primary key of a row already backfilled, or null</param>
+        /// <returns>count of rows backfilled; maxRows if the backfill must stop here</returns>
+        protected BigInteger BackfillIndexPrefix(ByteString columnKey, byte kind, byte[] descriptor, ByteString tableKey, ByteString prefix, ByteString skip, BigInteger maxRows)
+        {
+            Iterator rows = new StorageMap(ROWS_PREFIX).Find(tableKey + SEPARATOR + prefix, FindOptions.RemovePrefix);
+            BigInteger backfilled = 0;
+            while (rows.Next())
+            {
+                object[] entry = (object[])rows.Value;
+                ByteString primaryKey = prefix + (ByteString)entry[0];
+                if (primaryKey == skip)
+                    continue;
+                BackfillIndexRow(columnKey, kind, descriptor, primaryKey, (byte[])entry[1]);
+                if (++backfilled >= maxRows)
+                {
+                    new StorageMap(INDEX_BUILD_CURSOR_PREFIX).Put(columnKey, primaryKey);
+                    return backfilled;
+                }
+            }
+            return backfilled;
+        }
+
+        /// <summary>
+        /// Remove the index of a column. The index is no longer used or maintained after the first call,
+        /// and at most maxEntries of its storage entries are deleted in each call.
+        /// Call again with the same arguments until it returns true.
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="columnId"></param>
+        /// <param name="maxEntries"></param>
+        /// <returns>true if all the storage of the index is deleted</returns>
+        /// <exception cref="ArgumentException"></exception>
+        public bool DropIndex(UInt160 user, ByteString tableName, byte columnId, BigInteger maxEntries)
+        {
+            ExecutionEngine.Assert(Runtime.CheckWitness(user), "witness DropIndex");
+            ExecutionEngine.Assert(maxEntries > 0, "No entries");
+            StorageContext context = Storage.CurrentContext;
+            ByteString tableKey = user + tableName;
+            byte[] descriptor = LoadDescriptor(tableKey);
+            if (descriptor == null)
+                throw new ArgumentException("No table");
+            byte[] indexSpec = LoadIndexSpec(tableKey, descriptor);
+            ExecutionEngine.Assert(columnId >= 1 && columnId <= indexSpec.Length, "No column");
+            ByteString columnKey = tableKey + SEPARATOR + (ByteString)new byte[] { columnId };
+            StorageMap stageMap = new(context, INDEX_DROP_STAGE_PREFIX);
+            ByteString stage = stageMap[columnKey];
+            if (indexSpec[columnId - 1] != INDEX_NONE)
+            {
+                indexSpec[columnId - 1] = INDEX_NONE;
+                new StorageMap(context, INDEX_SPEC_PREFIX).Put(tableKey, (ByteString)indexSpec);
+                new StorageMap(context, INDEX_BUILD_CURSOR_PREFIX).Delete(columnKey);
+                stage = (ByteString)new byte[] { 0 };
+            }
+            else
+                ExecutionEngine.Assert(stage != null, "No index");
+
+            ByteString[] prefixes = IndexStoragePrefixes(columnKey);
+            int prefixesLength = prefixes.Length;
+            int currentStage = stage[0];
+            BigInteger deleted = 0;
+            while (currentStage < prefixesLength)
+            {
+                deleted += DeleteByPrefix(prefixes[currentStage], maxEntries - deleted);
+                if (deleted >= maxEntries)
+                {
+                    stageMap.Put(columnKey, (ByteString)new byte[] { (byte)currentStage });
+                    return false;
+                }
+                ++currentStage;
+            }
+            new StorageMap(context, SPLAY_SIZE_PREFIX).Delete(columnKey);
+            new StorageMap(context, SPLAY_ROOT_PREFIX).Delete(columnKey);
+            new StorageMap(context, BTREE_SIZE_PREFIX).Delete(columnKey);
+            new StorageMap(context, BTREE_ROOT_PREFIX).Delete(columnKey);
+            new StorageMap(context, BTREE_NODE_ID_PREFIX).Delete(columnKey);
+            stageMap.Delete(columnKey);
+            return true;
+        }
+
+        /// <summary>
+        /// Storage prefixes of all the entries of the index of a column,
+        /// except the single entries keyed by columnKey
+        /// </summary>
+        /// <param name="columnKey">user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }</param>
+        /// <returns></returns>
+        protected ByteString[] IndexStoragePrefixes(ByteString columnKey) => new ByteString[] {
+            (ByteString)new byte[] { VALUE_TO_PRIMARY_KEY_PREFIX } + columnKey,
+            (ByteString)new byte[] { SPLAY_NODE_PARENT_PREFIX } + columnKey,
+            (ByteString)new byte[] { SPLAY_NODE_LEFT_PREFIX } + columnKey,
+            (ByteString)new byte[] { SPLAY_NODE_RIGHT_PREFIX } + columnKey,
+            (ByteString)new byte[] { SPLAY_NODE_COUNT_PREFIX } + columnKey,
+            (ByteString)new byte[] { SPLAY_NODE_SUBTREE_COUNT_PREFIX } + columnKey,
+            (ByteString)new byte[] { SPLAY_NODE_SUBTREE_SUM_PREFIX } + columnKey,
+            (ByteString)new byte[] { BTREE_NODE_PREFIX } + columnKey,
+        };
+
+        /// <summary>
+        /// Delete at most maxEntries storage entries whose keys start with prefix
+        /// </summary>
+        /// <param name="prefix">including the prefix byte of the StorageMap</param>
+        /// <param name="maxEntries"></param>
+        /// <returns>count of entries deleted</returns>
+        protected BigInteger DeleteByPrefix(ByteString prefix, BigInteger maxEntries)
+        {
+            StorageContext context = Storage.CurrentContext;
+            Iterator keys = Storage.Find(context, prefix, FindOptions.KeysOnly);
+            BigInteger deleted = 0;
+            while (deleted < maxEntries && keys.Next())
+            {
+                Storage.Delete(context, (ByteString)keys.Value);
+                ++deleted;
+            }
+            return deleted;
+        }
+
         [Safe]
         public ByteString EncodeSingle(object data, byte type, BigInteger length)
         {
@@ -213,6 +993,25 @@ namespace RelationalDB
             return writeContent;
         }
 
+        /// <summary>
+        /// Encode the stored columns of a row in the row format of the table
+        /// </summary>
+        /// <param name="row">without the primary key if it is not an auto-increment rowId</param>
+        /// <param name="descriptor"></param>
+        /// <returns></returns>
+        protected ByteString EncodeStoredRow(object[] row, byte[] descriptor)
+        {
+            if (DescriptorRowFormat(descriptor) == ROW_FORMAT_V2)
+                return EncodeRowV2(row, descriptor);
+            int firstStoredColumn = DescriptorUsesAutoIncPriKey(descriptor) ? 0 : 1;
+            int columnsCount = DescriptorColumnsCount(descriptor);
+            ExecutionEngine.Assert(row.Length >= columnsCount - firstStoredColumn, "Wrong column count");
+            ByteString writeContent = "";
+            for (int column = firstStoredColumn; column < columnsCount; ++column)
+                writeContent += EncodeSingle(row[column - firstStoredColumn], DescriptorType(descriptor, column), DescriptorLength(descriptor, column));
+            return writeContent;
+        }
+
         /// <summary>
         /// The total key length should not exceed 64 bytes!
         /// </summary>
@@ -221,27 +1020,27 @@ namespace RelationalDB
         /// <param name="value"></param>
         protected void WriteRowIndex(ByteString columnKey, ByteString primaryKey, BigInteger value)
         {
-            new StorageMap(VALUE_TO_PRIMARY_KEY_PREFIX)[columnKey+EncodeInteger(value)+primaryKey] = "\x01";
+            new StorageMap(VALUE_TO_PRIMARY_KEY_PREFIX)[columnKey+EncodeIndexInteger(value)+primaryKey] = "\x01";
         }
 
-        protected void WriteIndex(ByteString tableKey, object[] row, byte[] columnTypes, ByteString primaryKey)
+        protected void WriteIndex(ByteString tableKey, object[] row, byte[] indexSpec, ByteString primaryKey)
         {
             int rowLength = row.Length;
-            byte rowIndexer = 0, columnTypesIndexer = 0;
+            byte rowIndexer = 0;
             tableKey += SEPARATOR;
             while (rowIndexer < rowLength)
             {
-                byte type = columnTypes[columnTypesIndexer++];
+                byte kind = indexSpec[rowIndexer];
                 ByteString value = (ByteString)row[rowIndexer];
                 ++rowIndexer;
+                if (kind == INDEX_NONE || value == null)  // NULL values are not indexed
+                    continue;
                 ByteString columnKey = tableKey + (ByteString)new byte[] { rowIndexer };
-                if (type == INT_FIXED_LEN || type == INT_VAR_LEN)
-                {
-                    WriteRowIndex(columnKey, primaryKey, (BigInteger)value);
-                    SplayInsert(columnKey, value);
-                }
-                if (type == INT_FIXED_LEN || type == BYTESTRING_FIXED_LEN)
-                    columnTypesIndexer++;
+                if (!IndexCovers(columnKey, kind, primaryKey))
+                    continue;
+                WriteRowIndex(columnKey, primaryKey, (BigInteger)value);
+                if ((kind & ~INDEX_BUILDING) == INDEX_ORDERED)
+                    OrderedIndexInsert(columnKey, value);
             }
         }
 
@@ -260,28 +1059,23 @@ namespace RelationalDB
             StorageContext context = Storage.CurrentContext;
             ByteString tableKey = user + tableName;
 
-            byte[] columnTypes = (byte[])new StorageMap(context, USER_TABLE_NAME_TO_COLUMNS_PREFIX)[tableKey];
-            int columnTypesIndexer = 0;
+            byte[] descriptor = LoadDescriptor(tableKey);
+            ExecutionEngine.Assert(descriptor != null, "No table");
             int rowIndexer = 0;
 
             // whether this table use auto-increment primary key
             StorageMap tableRowId = new StorageMap(context, TABLE_ROW_ID_PREFIX);
-            ByteString rowId = tableRowId[tableKey];
+            ByteString rowId = null;
             ByteString primaryKey;
-            if (rowId == null)  // use 1st column of your data as primary key
-            {
-                byte type = columnTypes[columnTypesIndexer++];
-                if (type == INT_FIXED_LEN || type == BYTESTRING_FIXED_LEN)
-                    primaryKey = EncodeSingle(row[rowIndexer++], type, columnTypes[columnTypesIndexer++]);
-                else
-                    primaryKey = EncodeSingle(row[rowIndexer++], type, 0);
-            }
+            if (!DescriptorUsesAutoIncPriKey(descriptor))  // use 1st column of your data as primary key
+                primaryKey = EncodeSingle(row[rowIndexer++], DescriptorType(descriptor, 0), DescriptorLength(descriptor, 0));
             else
-                primaryKey = rowId;
-            if (USE_INDEX_FOR_INTEGER)
+                primaryKey = rowId = tableRowId[tableKey];
+            byte[] indexSpec = LoadIndexSpec(tableKey, descriptor);
+            if (HasIndex(indexSpec))
             {
-                DeleteRow(user, tableName, primaryKey);
-                WriteIndex(tableKey, row, columnTypes, primaryKey);
+                DeleteStoredRow(tableKey, descriptor, indexSpec, primaryKey);
+                WriteIndex(tableKey, row, indexSpec, primaryKey);
             }
 
             // NC2010: The type object[] does not support range access.
@@ -290,7 +1084,7 @@ namespace RelationalDB
             while(rowIndexer < rowLength)
                 rowWithoutPrimaryKey.Add(row[rowIndexer++]);
             new StorageMap(context, ROWS_PREFIX).Put(tableKey + SEPARATOR + primaryKey,
-                EncodeRow(rowWithoutPrimaryKey, columnTypes[columnTypesIndexer..]));
+                EncodeStoredRow(rowWithoutPrimaryKey, descriptor));
             if (rowId != null)
                 tableRowId.Put(tableKey, (BigInteger)rowId + 1);
         }
@@ -307,34 +1101,32 @@ namespace RelationalDB
             ExecutionEngine.Assert(rows.Length > 0, "No rows");
             StorageContext context = Storage.CurrentContext;
             ByteString tableKey = user + tableName;
-            byte[] columnTypes = (byte[])new StorageMap(context, USER_TABLE_NAME_TO_COLUMNS_PREFIX)[tableKey];
+            byte[] descriptor = LoadDescriptor(tableKey);
+            ExecutionEngine.Assert(descriptor != null, "No table");
             BigInteger rowLength = rows[0].Length;
             ExecutionEngine.Assert(rowLength > 0 && rowLength < 256, "No row");
             // whether this table use auto-increment primary key
             StorageMap tableRowId = new StorageMap(context, TABLE_ROW_ID_PREFIX);
-            ByteString rowId = tableRowId[tableKey];
+            ByteString rowId = DescriptorUsesAutoIncPriKey(descriptor) ? tableRowId[tableKey] : null;
+            byte primaryKeyType = DescriptorType(descriptor, 0);
+            byte primaryKeyLength = DescriptorLength(descriptor, 0);
+            byte[] indexSpec = LoadIndexSpec(tableKey, descriptor);
+            bool indexed = HasIndex(indexSpec);
 
             foreach (object[] row in rows)
             {
                 ExecutionEngine.Assert(row.Length == rowLength, "Inconsistent row length");
-                int columnTypesIndexer = 0;
                 int rowIndexer = 0;
 
                 ByteString primaryKey;
                 if (rowId == null)
-                {
-                    byte type = columnTypes[columnTypesIndexer++];
-                    if (type == INT_FIXED_LEN || type == BYTESTRING_FIXED_LEN)
-                        primaryKey = EncodeSingle(row[rowIndexer++], type, columnTypes[columnTypesIndexer++]);
-                    else
-                        primaryKey = EncodeSingle(row[rowIndexer++], type, 0);
-                }
+                    primaryKey = EncodeSingle(row[rowIndexer++], primaryKeyType, primaryKeyLength);
                 else
                     primaryKey = rowId;
-                if (USE_INDEX_FOR_INTEGER)
+                if (indexed)
                 {
-                    DeleteRow(user, tableName, primaryKey);
-                    WriteIndex(tableKey, row, columnTypes, primaryKey);
+                    DeleteStoredRow(tableKey, descriptor, indexSpec, primaryKey);
+                    WriteIndex(tableKey, row, indexSpec, primaryKey);
                 }
 
                 // NC2010: The type object[] does not support range access.
@@ -343,51 +1135,314 @@ namespace RelationalDB
                 while (rowIndexer < rowLength)
                     rowWithoutPrimaryKey.Add(row[rowIndexer++]);
                 new StorageMap(context, ROWS_PREFIX).Put(tableKey + SEPARATOR + primaryKey,
-                    EncodeRow(rowWithoutPrimaryKey, columnTypes[columnTypesIndexer..]));
+                    EncodeStoredRow(rowWithoutPrimaryKey, descriptor));
                 if (rowId != null)
                     tableRowId.Put(tableKey, (BigInteger)rowId + 1);
             }
         }
 
+        /// <summary>
+        /// Bulk-load rows. Re-entrancy risk!
+        /// Compared with <see cref="WriteRows"/>, the witness, the schema and the auto-increment rowId
+        /// are handled only once for the whole batch, and the values of each integer column
+        /// are inserted into the ordered index at once (<see cref="OrderedIndexBulkInsert"/>), without splaying for each row.
+        /// The new values of the batch are hung into the splay tree as balanced subtrees, one per gap between the values
+        /// already in the tree, and nothing is splayed; see <see cref="SplayBulkInsert"/>.
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="rows"></param>
+        /// <param name="rowsAreNew">
+        /// if true, the caller guarantees that no row in the batch has been written before,
+        /// and old rows are not looked up for deletion.
+        /// Always true for tables using auto-increment primary key.
+        /// if false, existing rows are overwritten. No duplicating primary key allowed in the batch
+        /// </param>
+        public void BulkWriteRows(UInt160 user, ByteString tableName, object[][] rows, bool rowsAreNew)
+        {
+            ExecutionEngine.Assert(Runtime.CheckWitness(user), "witness BulkWriteRows");
+            int rowsCount = rows.Length;
+            ExecutionEngine.Assert(rowsCount > 0, "No rows");
+            StorageContext context = Storage.CurrentContext;
+            ByteString tableKey = user + tableName;
+            byte[] descriptor = LoadDescriptor(tableKey);
+            ExecutionEngine.Assert(descriptor != null, "No table");
+            BigInteger rowLength = rows[0].Length;
+            ExecutionEngine.Assert(rowLength > 0 && rowLength < 256, "No row");
+
+            // reserve all the auto-increment rowIds of this batch with a single write
+            StorageMap tableRowId = new StorageMap(context, TABLE_ROW_ID_PREFIX);
+            ByteString rowId = null;
+            if (DescriptorUsesAutoIncPriKey(descriptor))
+            {
+                rowId = tableRowId[tableKey];
+                tableRowId.Put(tableKey, (BigInteger)rowId + rowsCount);
+                rowsAreNew = true;
+            }
+            byte primaryKeyType = DescriptorType(descriptor, 0);
+            byte primaryKeyLength = DescriptorLength(descriptor, 0);
+
+            byte[] indexSpec = LoadIndexSpec(tableKey, descriptor);
+            bool indexed = HasIndex(indexSpec);
+            StorageMap rowsMap = new(context, ROWS_PREFIX);
+            ByteString[] primaryKeys = new ByteString[rowsCount];
+            for (int i = 0; i < rowsCount; ++i)
+            {
+                object[] row = rows[i];
+                ExecutionEngine.Assert(row.Length == rowLength, "Inconsistent row length");
+                if (rowId == null)
+                    primaryKeys[i] = EncodeSingle(row[0], primaryKeyType, primaryKeyLength);
+                else
+                    primaryKeys[i] = (ByteString)((BigInteger)rowId + i);
+                if (indexed && !rowsAreNew)
+                    DeleteStoredRow(tableKey, descriptor, indexSpec, primaryKeys[i]);
+            }
+
+            for (int i = 0; i < rowsCount; ++i)
+            {
+                object[] row = rows[i];
+                ByteString rowKey = tableKey + SEPARATOR + primaryKeys[i];
+                // all the old rows have been deleted. An existing row must have been written earlier in this batch
+                if (indexed && !rowsAreNew)
+                    ExecutionEngine.Assert(rowsMap[rowKey] == null, "Duplicate primary key");
+                int rowIndexer = rowId == null ? 1 : 0;
+                // NC2010: The type object[] does not support range access.
+                // Cannot write row[rowIndexer..]
+                List<object> rowWithoutPrimaryKey = new();
+                while (rowIndexer < rowLength)
+                    rowWithoutPrimaryKey.Add(row[rowIndexer++]);
+                rowsMap.Put(rowKey, EncodeStoredRow(rowWithoutPrimaryKey, descriptor));
+            }
+
+            byte columnId = 0;
+            while (columnId < rowLength)
+            {
+                byte kind = indexSpec[columnId];
+                ++columnId;
+                if (kind == INDEX_NONE)
+                    continue;
+                ByteString columnKey = tableKey + SEPARATOR + (ByteString)new byte[] { columnId };
+                List<BigInteger> values = new();
+                for (int i = 0; i < rowsCount; ++i)
+                {
+                    object value = rows[i][columnId - 1];
+                    if (value == null || !IndexCovers(columnKey, kind, primaryKeys[i]))  // NULL values are not indexed
+                        continue;
+                    values.Add((BigInteger)value);
+                    WriteRowIndex(columnKey, primaryKeys[i], (BigInteger)value);
+                }
+                if ((kind & ~INDEX_BUILDING) == INDEX_ORDERED)
+                    OrderedIndexBulkInsert(columnKey, values);
+            }
+        }
+
+        /// <summary>
+        /// Update some columns of an existing row.
+        /// Only the given columns are re-encoded, and only the indexes of the values that actually changed are updated.
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="primaryKey"></param>
+        /// <param name="columnIds">columns to update. The primary key cannot be updated</param>
+        /// <param name="values">new value of each column in columnIds</param>
+        /// <exception cref="ArgumentException"></exception>
+        public void UpdateRow(UInt160 user, ByteString tableName, ByteString primaryKey, byte[] columnIds, object[] values)
+        {
+            ExecutionEngine.Assert(Runtime.CheckWitness(user), "witness UpdateRow");
+            ExecutionEngine.Assert(columnIds.Length == values.Length, "Wrong column count");
+            ByteString tableKey = user + tableName;
+            byte[] descriptor = LoadDescriptor(tableKey);
+            if (descriptor == null)
+                throw new ArgumentException("No table");
+            UpdateStoredRow(tableKey, descriptor, LoadIndexSpec(tableKey, descriptor), primaryKey, columnIds, values);
+        }
+
+        /// <summary>
+        /// <see cref="UpdateRow"/> for many rows, updating the same columns of each row. Re-entrancy risk!
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="primaryKeys"></param>
+        /// <param name="columnIds">columns to update. The primary key cannot be updated</param>
+        /// <param name="values">values[i] is the new values of row primaryKeys[i], for each column in columnIds</param>
+        /// <exception cref="ArgumentException"></exception>
+        public void UpdateRows(UInt160 user, ByteString tableName, ByteString[] primaryKeys, byte[] columnIds, object[][] values)
+        {
+            ExecutionEngine.Assert(Runtime.CheckWitness(user), "witness UpdateRow");
+            int rowsCount = primaryKeys.Length;
+            ExecutionEngine.Assert(rowsCount == values.Length, "Wrong row count");
+            ByteString tableKey = user + tableName;
+            byte[] descriptor = LoadDescriptor(tableKey);
+            if (descriptor == null)
+                throw new ArgumentException("No table");
+            byte[] indexSpec = LoadIndexSpec(tableKey, descriptor);
+            for (int i = 0; i < rowsCount; ++i)
+            {
+                ExecutionEngine.Assert(columnIds.Length == values[i].Length, "Wrong column count");
+                UpdateStoredRow(tableKey, descriptor, indexSpec, primaryKeys[i], columnIds, values[i]);
+            }
+        }
+
+        /// <summary>
+        /// Replace the given columns of a stored row, and update the indexes of changed values.
+        /// In v1 format, only the encoded bytes of the given columns are replaced;
+        /// in v2 format, the row is decoded and encoded again, because the bitmap and varint lengths may change.
+        /// The row is not written if no value is changed.
+        /// </summary>
+        /// <param name="tableKey"></param>
+        /// <param name="descriptor"></param>
+        /// <param name="indexSpec"></param>
+        /// <param name="primaryKey"></param>
+        /// <param name="columnIds"></param>
+        /// <param name="values"></param>
+        protected void UpdateStoredRow(ByteString tableKey, byte[] descriptor, byte[] indexSpec,
+            ByteString primaryKey, byte[] columnIds, object[] values)
+        {
+            StorageMap rowsMap = new(ROWS_PREFIX);
+            ByteString rowKey = tableKey + SEPARATOR + primaryKey;
+            byte[] data = (byte[])rowsMap[rowKey];
+            ExecutionEngine.Assert(data != null, "No data");
+            bool v2 = DescriptorRowFormat(descriptor) == ROW_FORMAT_V2;
+            // the primary key column is not stored in data
+            int firstStoredColumn = DescriptorUsesAutoIncPriKey(descriptor) ? 0 : 1;
+            int columnsCount = DescriptorColumnsCount(descriptor);
+            int[] offsets = v2 ? null : ColumnOffsets(data, descriptor);
+            object[] row = v2 ? DecodeDescribedRow(data, descriptor, primaryKey) : null;
+            object[] encodedColumns = new object[columnsCount];
+            bool changed = false;
+            int updatesCount = columnIds.Length;
+            for (int i = 0; i < updatesCount; ++i)
+            {
+                byte columnId = columnIds[i];
+                int column = columnId - 1;
+                ExecutionEngine.Assert(column >= firstStoredColumn, "Cannot update primary key");
+                ExecutionEngine.Assert(column < columnsCount, "No column");
+                ExecutionEngine.Assert(encodedColumns[column] == null, "Duplicate column");
+                byte type = DescriptorType(descriptor, column);
+                byte length = DescriptorLength(descriptor, column);
+                object oldValue, newValue = values[i];
+                if (v2)
+                {
+                    oldValue = row[column];
+                    row[column] = newValue;
+                    // NULL is encoded as empty, which no other value of a column is encoded as
+                    ByteString oldEncoded = oldValue == null ? "" : EncodeSingle(oldValue, type, length);
+                    ByteString newEncoded = newValue == null ? "" : EncodeSingle(newValue, type, length);
+                    encodedColumns[column] = newEncoded;
+                    if (oldEncoded == newEncoded)
+                        continue;
+                }
+                else
+                {
+                    ByteString oldEncoded = (ByteString)data[offsets[column]..offsets[column + 1]];
+                    ByteString newEncoded = EncodeSingle(newValue, type, length);
+                    encodedColumns[column] = newEncoded;
+                    if (oldEncoded == newEncoded)
+                        continue;
+                    (oldValue, _) = DecodeAt(data, offsets[column], type, length);
+                }
+                changed = true;
+                byte kind = indexSpec[column];
+                if (kind == INDEX_NONE)
+                    continue;
+                ByteString columnKey = tableKey + SEPARATOR + (ByteString)new byte[] { columnId };
+                if (!IndexCovers(columnKey, kind, primaryKey))
+                    continue;
+                bool ordered = (kind & ~INDEX_BUILDING) == INDEX_ORDERED;
+                // NULL values are not indexed
+                if (oldValue != null)
+                {
+                    DeleteRowIndex(columnKey, primaryKey, (BigInteger)oldValue);
+                    if (ordered)
+                        OrderedIndexDelete(columnKey, (ByteString)oldValue);
+                }
+                if (newValue != null)
+                {
+                    WriteRowIndex(columnKey, primaryKey, (BigInteger)newValue);
+                    if (ordered)
+                        OrderedIndexInsert(columnKey, (ByteString)newValue);
+                }
+            }
+            if (!changed)
+                return;
+            if (v2)
+            {
+                // NC2010: The type object[] does not support range access.
+                List<object> rowWithoutPrimaryKey = new();
+                for (int column = firstStoredColumn; column < columnsCount; ++column)
+                    rowWithoutPrimaryKey.Add(row[column]);
+                rowsMap.Put(rowKey, EncodeRowV2(rowWithoutPrimaryKey, descriptor));
+                return;
+            }
+            ByteString updated = "";
+            int copiedTo = 0;  // data[..copiedTo] has been copied to updated
+            for (int column = firstStoredColumn; column < columnsCount; ++column)
+            {
+                if (encodedColumns[column] == null)
+                    continue;
+                updated += (ByteString)data[copiedTo..offsets[column]] + (ByteString)encodedColumns[column];
+                copiedTo = offsets[column + 1];
+            }
+            rowsMap.Put(rowKey, updated + (ByteString)data[copiedTo..]);
+        }
+
         protected void DeleteRowIndex(ByteString columnKey, ByteString primaryKey, BigInteger value)
         {
-            new StorageMap(VALUE_TO_PRIMARY_KEY_PREFIX).Delete(columnKey+EncodeInteger(value)+primaryKey);
+            new StorageMap(VALUE_TO_PRIMARY_KEY_PREFIX).Delete(columnKey+EncodeIndexInteger(value)+primaryKey);
         }
 
-        protected void DeleteIndex(ByteString tableKey, object[] row, byte[] columnTypes, ByteString primaryKey)
+        protected void DeleteIndex(ByteString tableKey, object[] row, byte[] indexSpec, ByteString primaryKey)
         {
             int rowLength = row.Length;
-            byte rowIndexer = 0, columnTypesIndexer = 0;
+            byte rowIndexer = 0;
             tableKey += SEPARATOR;
             while (rowIndexer < rowLength)
             {
-                byte type = columnTypes[columnTypesIndexer++];
+                byte kind = indexSpec[rowIndexer];
                 ByteString value = (ByteString)row[rowIndexer];
                 rowIndexer++;
+                if (kind == INDEX_NONE || value == null)  // NULL values are not indexed
+                    continue;
                 ByteString columnKey = tableKey + (ByteString)new byte[] { rowIndexer };
-                if (type == INT_FIXED_LEN || type == INT_VAR_LEN)
-                {
-                    DeleteRowIndex(columnKey, primaryKey, (BigInteger)value);
-                    SplayDelete(columnKey, value);
-                }
-                if (type == INT_FIXED_LEN || type == BYTESTRING_FIXED_LEN)
-                    columnTypesIndexer++;
+                if (!IndexCovers(columnKey, kind, primaryKey))
+                    continue;
+                DeleteRowIndex(columnKey, primaryKey, (BigInteger)value);
+                if ((kind & ~INDEX_BUILDING) == INDEX_ORDERED)
+                    OrderedIndexDelete(columnKey, value);
             }
         }
 
-        public void DeleteRow(UInt160 user, ByteString tableName, ByteString primaryKey)
+        /// <summary>
+        /// Delete a row and its indexes, if the row exists. No witness checked.
+        /// </summary>
+        /// <param name="tableKey"></param>
+        /// <param name="descriptor"></param>
+        /// <param name="indexSpec"></param>
+        /// <param name="primaryKey"></param>
+        protected void DeleteStoredRow(ByteString tableKey, byte[] descriptor, byte[] indexSpec, ByteString primaryKey)
         {
-            ExecutionEngine.Assert(Runtime.CheckWitness(user), "witness DeleteRow");
-            try
-            {
-                ByteString tableKey = user + tableName;
-                object[] row = GetRow(tableKey, primaryKey);
-                DeleteIndex(tableKey, row, (byte[])new StorageMap(USER_TABLE_NAME_TO_COLUMNS_PREFIX)[tableKey], primaryKey);
-                new StorageMap(ROWS_PREFIX).Delete(tableKey + SEPARATOR + primaryKey);
-            }catch (Exception)
+            StorageMap rowsMap = new(ROWS_PREFIX);
+            ByteString rowKey = tableKey + SEPARATOR + primaryKey;
+            if (!HasIndex(indexSpec))
             {
+                rowsMap.Delete(rowKey);
                 return;
             }
+            ByteString data = rowsMap[rowKey];
+            if (data == null)
+                return;
+            DeleteIndex(tableKey, DecodeDescribedRow((byte[])data, descriptor, primaryKey), indexSpec, primaryKey);
+            rowsMap.Delete(rowKey);
+        }
+
+        public void DeleteRow(UInt160 user, ByteString tableName, ByteString primaryKey)
+        {
+            ExecutionEngine.Assert(Runtime.CheckWitness(user), "witness DeleteRow");
+            ByteString tableKey = user + tableName;
+            byte[] descriptor = LoadDescriptor(tableKey);
+            if (descriptor == null)
+                return;
+            DeleteStoredRow(tableKey, descriptor, LoadIndexSpec(tableKey, descriptor), primaryKey);
         }
         /// <summary>
         /// Re-entrancy risk!
@@ -398,18 +1453,13 @@ namespace RelationalDB
         public void DeleteRows(UInt160 user, ByteString tableName, ByteString[] primaryKeys)
         {
             ExecutionEngine.Assert(Runtime.CheckWitness(user), "witness DeleteRow");
+            ByteString tableKey = user + tableName;
+            byte[] descriptor = LoadDescriptor(tableKey);
+            if (descriptor == null)
+                return;
+            byte[] indexSpec = LoadIndexSpec(tableKey, descriptor);
             foreach (ByteString primaryKey in primaryKeys)
-                try
-                {
-                    ByteString tableKey = user + tableName;
-                    object[] row = GetRow(tableKey, primaryKey);
-                    DeleteIndex(tableKey, row, (byte[])new StorageMap(USER_TABLE_NAME_TO_COLUMNS_PREFIX)[tableKey], primaryKey);
-                    new StorageMap(ROWS_PREFIX).Delete(tableKey + SEPARATOR + primaryKey);
-                }
-                catch (Exception)
-                {
-                    continue;
-                }
+                DeleteStoredRow(tableKey, descriptor, indexSpec, primaryKey);
         }
 
         [Safe]
@@ -443,17 +1493,18 @@ namespace RelationalDB
         {
             BigInteger columnTypesLength = columnTypes.Length;
             int columnTypesIndexer = 0;
+            int offset = 0;
             while (columnTypesIndexer < columnTypesLength)
             {
                 byte type = columnTypes[columnTypesIndexer++];
                 if (type == INT_FIXED_LEN || type == BYTESTRING_FIXED_LEN)
                 {
-                    (object decoded, data) = DecodeSingle(data, type, columnTypes[columnTypesIndexer++]);
+                    (object decoded, offset) = DecodeAt(data, offset, type, columnTypes[columnTypesIndexer++]);
                     row.Add(decoded);
                 }
                 else
                 {
-                    (object decoded, data) = DecodeSingle(data, type, 0);
+                    (object decoded, offset) = DecodeAt(data, offset, type, 0);
                     row.Add(decoded);
                 }
             }
@@ -471,58 +1522,96 @@ namespace RelationalDB
         public object[] GetRow(UInt160 user, ByteString tableName, ByteString primaryKey) => GetRow(user + tableName, primaryKey);
         public object[] GetRow(ByteString tableKey, ByteString primaryKey)
         {
-            StorageContext context = Storage.CurrentContext;
-            byte[] columnTypes = (byte[])new StorageMap(context, USER_TABLE_NAME_TO_COLUMNS_PREFIX)[tableKey];
-            if (columnTypes == null)
+            byte[] descriptor = LoadDescriptor(tableKey);
+            if (descriptor == null)
                 throw new ArgumentException("No table");
-            ByteString rowId = new StorageMap(context, TABLE_ROW_ID_PREFIX)[tableKey];
-            byte[] data = (byte[])new StorageMap(context, ROWS_PREFIX)[tableKey + SEPARATOR + primaryKey];
+            byte[] data = (byte[])new StorageMap(ROWS_PREFIX)[tableKey + SEPARATOR + primaryKey];
             if (data == null)
                 throw new ArgumentException("No data");
-            List<object> row = new();
-            int columnTypesIndexer = 0;
-            if (rowId == null)
-            {
-                // skip the first column of columnTypes, because it is the primary key
-                byte primaryKeyType = columnTypes[columnTypesIndexer++];
-                object result;
-                if (primaryKeyType == INT_FIXED_LEN || primaryKeyType == BYTESTRING_FIXED_LEN)
-                    (result, _) = DecodeSingle((byte[])primaryKey, primaryKeyType, columnTypes[columnTypesIndexer++]);
-                else
-                    (result, _) = DecodeSingle((byte[])primaryKey, primaryKeyType, 0);
-                row.Add(result);
-            }
-            return DecodeRow(data, columnTypes[columnTypesIndexer..], row);
+            return DecodeDescribedRow(data, descriptor, primaryKey);
         }
 
         public object[][] GetRows(UInt160 user, ByteString tableName, ByteString[] primaryKeys) => GetRows(user + tableName, primaryKeys);
         public object[][] GetRows(ByteString tableKey, ByteString[] primaryKeys)
         {
-            StorageContext context = Storage.CurrentContext;
-            byte[] columnTypes = (byte[])new StorageMap(context, USER_TABLE_NAME_TO_COLUMNS_PREFIX)[tableKey];
-            if (columnTypes == null)
+            byte[] descriptor = LoadDescriptor(tableKey);
+            if (descriptor == null)
                 throw new ArgumentException("No table");
-            ByteString rowId = new StorageMap(context, TABLE_ROW_ID_PREFIX)[tableKey];
+            StorageMap rowsMap = new(ROWS_PREFIX);
 
             List<object[]> resultRows = new();
             foreach(ByteString primaryKey in primaryKeys)
             {
-                byte[] data = (byte[])new StorageMap(context, ROWS_PREFIX)[tableKey + SEPARATOR + primaryKey];
+                byte[] data = (byte[])rowsMap[tableKey + SEPARATOR + primaryKey];
                 ExecutionEngine.Assert(data != null, "No data");
+                resultRows.Add(DecodeDescribedRow(data, descriptor, primaryKey));
+            }
+            return resultRows;
+        }
+
+        /// <summary>
+        /// SELECT columnIds FROM table WHERE primaryKey IN primaryKeys
+        /// The schema is read once, and only the requested columns are decoded, at their offsets in each row.
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="primaryKeys"></param>
+        /// <param name="columnIds">columns to return, in this order; may include the primary key column</param>
+        /// <returns>for each primary key, the values of the requested columns</returns>
+        /// <exception cref="ArgumentException"></exception>
+        public object[][] GetColumns(UInt160 user, ByteString tableName, ByteString[] primaryKeys, byte[] columnIds)
+        {
+            ByteString tableKey = user + tableName;
+            byte[] descriptor = LoadDescriptor(tableKey);
+            if (descriptor == null)
+                throw new ArgumentException("No table");
+            int columnsCount = DescriptorColumnsCount(descriptor);
+            int anchorsCount = 0;  // only the variable-length columns before the requested columns are measured
+            foreach (byte columnId in columnIds)
+            {
+                ExecutionEngine.Assert(columnId >= 1 && columnId <= columnsCount, "No column");
+                byte anchor = DescriptorAnchor(descriptor, columnId - 1);
+                if (anchor != DESCRIPTOR_IN_PRIMARY_KEY && anchor > anchorsCount)
+                    anchorsCount = anchor;
+            }
+            StorageMap rowsMap = new(ROWS_PREFIX);
+
+            List<object[]> resultRows = new();
+            if (DescriptorRowFormat(descriptor) == ROW_FORMAT_V2)
+            {
+                // v2 values have varint lengths, so the value offsets are walked for every row
+                foreach (ByteString primaryKey in primaryKeys)
+                {
+                    byte[] data = (byte[])rowsMap[tableKey + SEPARATOR + primaryKey];
+                    ExecutionEngine.Assert(data != null, "No data");
+                    int[] offsets = ValueOffsetsV2(data, descriptor);
+                    List<object> row = new();
+                    foreach (byte columnId in columnIds)
+                        row.Add(DecodeColumnV2(data, descriptor, offsets, primaryKey, columnId - 1));
+                    resultRows.Add(row);
+                }
+                return resultRows;
+            }
+            foreach (ByteString primaryKey in primaryKeys)
+            {
+                byte[] data = (byte[])rowsMap[tableKey + SEPARATOR + primaryKey];
+                ExecutionEngine.Assert(data != null, "No data");
+                int[] ends = VariableLengthColumnEnds(data, descriptor, anchorsCount);
                 List<object> row = new();
-                int columnTypesIndexer = 0;
-                if (rowId == null)
+                foreach (byte columnId in columnIds)
                 {
-                    // skip the first column of columnTypes, because it is the primary key
-                    byte primaryKeyType = columnTypes[columnTypesIndexer++];
-                    object result;
-                    if (primaryKeyType == INT_FIXED_LEN || primaryKeyType == BYTESTRING_FIXED_LEN)
-                        (result, _) = DecodeSingle((byte[])primaryKey, primaryKeyType, columnTypes[columnTypesIndexer++]);
+                    int column = columnId - 1;
+                    byte type = DescriptorType(descriptor, column);
+                    byte length = DescriptorLength(descriptor, column);
+                    byte anchor = DescriptorAnchor(descriptor, column);
+                    object decoded;
+                    if (anchor == DESCRIPTOR_IN_PRIMARY_KEY)
+                        (decoded, _) = DecodeAt((byte[])primaryKey, 0, type, length);
                     else
-                        (result, _) = DecodeSingle((byte[])primaryKey, primaryKeyType, 0);
-                    row.Add(result);
+                        (decoded, _) = DecodeAt(data, ends[anchor] + DescriptorDelta(descriptor, column), type, length);
+                    row.Add(decoded);
                 }
-                resultRows.Add(DecodeRow(data, columnTypes[columnTypesIndexer..], row));
+                resultRows.Add(row);
             }
             return resultRows;
         }
@@ -574,6 +1663,38 @@ namespace RelationalDB
             return ((BigInteger)result.Item1, result.Item2);
         }
 
+        /// <summary>
+        /// Order-preserving encoding of integers for index keys.
+        /// Comparing the encoded bytes gives the same order as comparing the integers.
+        /// </summary>
+        /// <param name="i"></param>
+        /// <returns>
+        /// marker (0x80 + length for i >= 0; 0x80 - length for i < 0; so the sign bit is flipped)
+        /// + big-endian two's complement of i (length bytes)
+        /// </returns>
+        [Safe]
+        public ByteString EncodeIndexInteger(BigInteger i)
+        {
+            byte[] littleEndian = (byte[])(ByteString)i;
+            int length = littleEndian.Length;
+            byte[] encoded = new byte[length + 1];
+            encoded[0] = (byte)(i >= 0 ? 0x80 + length : 0x80 - length);
+            for (int j = 0; j < length; ++j)
+                encoded[j + 1] = littleEndian[length - 1 - j];
+            return (ByteString)encoded;
+        }
+
+        [Safe]
+        public (BigInteger, byte[]) DecodeIndexInteger(byte[] encoded)
+        {
+            int marker = encoded[0];
+            int length = marker >= 0x80 ? marker - 0x80 : 0x80 - marker;
+            byte[] littleEndian = new byte[length];
+            for (int j = 0; j < length; ++j)
+                littleEndian[j] = encoded[length - j];
+            return ((BigInteger)(ByteString)littleEndian, encoded[(1 + length)..]);
+        }
+
         [Safe]
         public ByteString EncodeIntegerFixedLength(BigInteger i, BigInteger fixedLength)
         {
@@ -581,14 +1702,13 @@ namespace RelationalDB
             BigInteger lengthToComplement = fixedLength - data.Length;
             if (lengthToComplement < 0)
                 throw new ArgumentException("Too long value " + data);
-            if (lengthToComplement > 0)
-            {
-                ByteString suffix = "";
-                for (; lengthToComplement > 0; --lengthToComplement)
-                    suffix += i >= 0 ? new byte[] { 0x00 } : new byte[] { 0xff };
-                data += suffix;
-            }
-            return data;
+            if (lengthToComplement == 0)
+                return data;
+            // pad in a single operation instead of one concatenation per byte
+            if (i >= 0)
+                return data + (ByteString)new byte[(int)lengthToComplement];
+            // 256**k - 1 is k bytes of 0xff followed by a sign byte 0x00
+            return data + (ByteString)((byte[])(ByteString)(BigInteger.Pow(256, (int)lengthToComplement) - 1))[..(int)lengthToComplement];
         }
 
         [Safe]
@@ -598,12 +1718,7 @@ namespace RelationalDB
             if (lengthToComplement < 0)
                 throw new ArgumentException("Too long value " + data);
             if (lengthToComplement > 0)
-            {
-                ByteString suffix = "";
-                for (; lengthToComplement > 0; --lengthToComplement)
-                    suffix += new byte[] { 0x00 };
-                data += suffix;
-            }
+                data += (ByteString)new byte[(int)lengthToComplement];
             return data;
         }
 
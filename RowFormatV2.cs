@@ -0,0 +1,173 @@
+﻿using System.Numerics;
+using Neo.SmartContract.Framework;
+using Neo.SmartContract.Framework.Attributes;
+
+namespace RelationalDB
+{
+    /// <summary>
+    /// Here we implement the compact v2 row format, chosen per table by CreateTable and recorded in the descriptor.
+    /// v2 row = ROW_FORMAT_V2 (1 byte) + bitmap + values
+    /// bitmap: 1 bit for each stored column, least significant bit first.
+    ///   For a BOOLEAN column, the value itself; for any other column, whether the value is NULL.
+    /// values: each non-NULL value of the columns other than BOOLEAN, in column order.
+    ///   INT_VAR_LEN and BYTESTRING_VAR_LEN: varint length (7 bits per byte, least significant first; high bit set if more bytes follow) + bytes
+    ///   other types: the same as v1
+    /// v1 rows have no version byte and are distinguished by the descriptor.
+    /// BOOLEAN columns and the primary key cannot be NULL.
+    /// </summary>
+    public partial class RelationalDB
+    {
+        const byte ROW_FORMAT_V1 = 0x01;
+        const byte ROW_FORMAT_V2 = 0x02;
+
+        [Safe]
+        public ByteString EncodeVarint(BigInteger i)
+        {
+            if (i < 0x80)
+                return (ByteString)new byte[] { (byte)i };
+            if (i < 0x4000)
+                return (ByteString)new byte[] { (byte)(i & 0x7f | 0x80), (byte)(i >> 7) };
+            return (ByteString)new byte[] { (byte)(i & 0x7f | 0x80), (byte)((i >> 7) & 0x7f | 0x80), (byte)(i >> 14) };
+        }
+
+        /// <summary>
+        /// 
+        /// </summary>
+        /// <param name="data"></param>
+        /// <param name="offset"></param>
+        /// <returns>(decoded integer, offset of the next byte)</returns>
+        [Safe]
+        public (int, int) DecodeVarint(byte[] data, int offset)
+        {
+            int i = 0;
+            int shift = 0;
+            while (true)
+            {
+                byte b = data[offset++];
+                i += (b & 0x7f) << shift;
+                if (b < 0x80)
+                    return (i, offset);
+                shift += 7;
+            }
+        }
+
+        /// <summary>
+        /// Encode the stored columns of a row in v2 format
+        /// </summary>
+        /// <param name="row">values of the stored columns, without the primary key if it is not an auto-increment rowId</param>
+        /// <param name="descriptor"></param>
+        /// <returns></returns>
+        protected ByteString EncodeRowV2(object[] row, byte[] descriptor)
+        {
+            int firstStoredColumn = DescriptorUsesAutoIncPriKey(descriptor) ? 0 : 1;
+            int columnsCount = DescriptorColumnsCount(descriptor);
+            ExecutionEngine.Assert(row.Length >= columnsCount - firstStoredColumn, "Wrong column count");
+            byte[] bitmap = new byte[(columnsCount - firstStoredColumn + 7) / 8];
+            ByteString values = "";
+            for (int column = firstStoredColumn; column < columnsCount; ++column)
+            {
+                int bit = column - firstStoredColumn;
+                object value = row[bit];
+                byte type = DescriptorType(descriptor, column);
+                if (type == BOOLEAN)
+                {
+                    if ((bool)value)
+                        bitmap[bit / 8] = (byte)(bitmap[bit / 8] | (1 << (bit % 8)));
+                    continue;
+                }
+                if (value == null)
+                {
+                    bitmap[bit / 8] = (byte)(bitmap[bit / 8] | (1 << (bit % 8)));
+                    continue;
+                }
+                if (type == INT_VAR_LEN || type == BYTESTRING_VAR_LEN)
+                {
+                    ByteString bytes = (ByteString)value;
+                    values += EncodeVarint(bytes.Length) + bytes;
+                }
+                else
+                    values += EncodeSingle(value, type, DescriptorLength(descriptor, column));
+            }
+            return (ByteString)new byte[] { ROW_FORMAT_V2 } + (ByteString)bitmap + values;
+        }
+
+        /// <summary>
+        /// Offsets of the values in a v2 row, without decoding or copying the values
+        /// </summary>
+        /// <param name="data">stored row in v2 format</param>
+        /// <param name="descriptor"></param>
+        /// <returns>offset of the value of each column; 0 for BOOLEAN, NULL, and the primary key</returns>
+        protected int[] ValueOffsetsV2(byte[] data, byte[] descriptor)
+        {
+            ExecutionEngine.Assert(data[0] == ROW_FORMAT_V2, "Unknown row format");
+            int firstStoredColumn = DescriptorUsesAutoIncPriKey(descriptor) ? 0 : 1;
+            int columnsCount = DescriptorColumnsCount(descriptor);
+            int[] offsets = new int[columnsCount];
+            int offset = 1 + (columnsCount - firstStoredColumn + 7) / 8;
+            for (int column = firstStoredColumn; column < columnsCount; ++column)
+            {
+                byte type = DescriptorType(descriptor, column);
+                if (type == BOOLEAN || BitmapFlag(data, column - firstStoredColumn))
+                    continue;
+                offsets[column] = offset;
+                switch (type)
+                {
+                    case UINT160:
+                        offset += 20;
+                        break;
+                    case UINT256:
+                        offset += 32;
+                        break;
+                    case INT_FIXED_LEN:
+                    case BYTESTRING_FIXED_LEN:
+                        offset += DescriptorLength(descriptor, column);
+                        break;
+                    default:  // INT_VAR_LEN, BYTESTRING_VAR_LEN
+                        (int length, int start) = DecodeVarint(data, offset);
+                        offset = start + length;
+                        break;
+                }
+            }
+            return offsets;
+        }
+
+        protected bool BitmapFlag(byte[] data, int bit) => (data[1 + bit / 8] & (1 << (bit % 8))) != 0;
+
+        /// <summary>
+        /// Decode a column of a v2 row
+        /// </summary>
+        /// <param name="data">stored row in v2 format</param>
+        /// <param name="descriptor"></param>
+        /// <param name="offsets">from <see cref="ValueOffsetsV2"/></param>
+        /// <param name="primaryKey"></param>
+        /// <param name="column">0-based</param>
+        /// <returns></returns>
+        protected object DecodeColumnV2(byte[] data, byte[] descriptor, int[] offsets, ByteString primaryKey, int column)
+        {
+            byte type = DescriptorType(descriptor, column);
+            byte length = DescriptorLength(descriptor, column);
+            object decoded;
+            if (DescriptorAnchor(descriptor, column) == DESCRIPTOR_IN_PRIMARY_KEY)
+            {
+                (decoded, _) = DecodeAt((byte[])primaryKey, 0, type, length);
+                return decoded;
+            }
+            bool flag = BitmapFlag(data, DescriptorUsesAutoIncPriKey(descriptor) ? column : column - 1);
+            if (type == BOOLEAN)
+                return flag;
+            if (flag)
+                return null;
+            int offset = offsets[column];
+            if (type == INT_VAR_LEN || type == BYTESTRING_VAR_LEN)
+            {
+                (int valueLength, int start) = DecodeVarint(data, offset);
+                ByteString bytes = (ByteString)data[start..(start + valueLength)];
+                if (type == INT_VAR_LEN)
+                    return (BigInteger)bytes;
+                return bytes;
+            }
+            (decoded, _) = DecodeAt(data, offset, type, length);
+            return decoded;
+        }
+    }
+}
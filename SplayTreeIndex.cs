@@ -26,6 +26,8 @@ namespace RelationalDB
         const byte SPLAY_NODE_LEFT_PREFIX = 0xf1;   // columnKey + current node -> left child
         const byte SPLAY_NODE_RIGHT_PREFIX = 0xf2;  // columnKey + current node -> right child
         const byte SPLAY_NODE_COUNT_PREFIX = 0xf3;  // columnKey + current node -> the count of current node
+        const byte SPLAY_NODE_SUBTREE_COUNT_PREFIX = 0xf4;  // columnKey + current node -> sum of the counts of all nodes in the subtree
+        const byte SPLAY_NODE_SUBTREE_SUM_PREFIX = 0xf5;    // columnKey + current node -> sum of value * count of all nodes in the subtree
 
         public BigInteger SplayGetSize(UInt160 user, ByteString tableName, byte columnId) => (BigInteger)new StorageMap(SPLAY_SIZE_PREFIX)[user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }];
         public BigInteger SplayGetRoot(UInt160 user, ByteString tableName, byte columnId) => (BigInteger)new StorageMap(SPLAY_ROOT_PREFIX)[user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }];
@@ -33,6 +35,8 @@ namespace RelationalDB
         public ByteString SplayGetLeft(UInt160 user, ByteString tableName, byte columnId, ByteString value) => new StorageMap(SPLAY_NODE_LEFT_PREFIX)[user + tableName + SEPARATOR +(ByteString)new byte[] { columnId } + value];
         public ByteString SplayGetRight(UInt160 user, ByteString tableName, byte columnId, ByteString value) => new StorageMap(SPLAY_NODE_RIGHT_PREFIX)[user + tableName + SEPARATOR +(ByteString)new byte[] { columnId } + value];
         public BigInteger SplayGetNodeCount(UInt160 user, ByteString tableName, byte columnId, ByteString value) => (BigInteger)new StorageMap(SPLAY_NODE_COUNT_PREFIX)[user + tableName + SEPARATOR + (ByteString)new byte[] { columnId } + value];
+        public BigInteger SplayGetSubtreeCount(UInt160 user, ByteString tableName, byte columnId, ByteString value) => (BigInteger)new StorageMap(SPLAY_NODE_SUBTREE_COUNT_PREFIX)[user + tableName + SEPARATOR + (ByteString)new byte[] { columnId } + value];
+        public BigInteger SplayGetSubtreeSum(UInt160 user, ByteString tableName, byte columnId, ByteString value) => (BigInteger)new StorageMap(SPLAY_NODE_SUBTREE_SUM_PREFIX)[user + tableName + SEPARATOR + (ByteString)new byte[] { columnId } + value];
 
         public void SplayDebugPut(UInt160 user, ByteString tableName, byte columnId,
             ByteString node, ByteString parent, ByteString leftChild, ByteString rightChild)
@@ -95,6 +99,7 @@ namespace RelationalDB
             SplayPut(leftMap, x, xParent);
             SplayPut(parentMap, xParent, x);
             SplayPut(parentMap, x, xGrandParent);
+            SplayRotatedUp(columnKey, x, xParent);
             if (xGrandParent == null)
             {
                 rootMap[columnKey] = x;
@@ -127,6 +132,7 @@ namespace RelationalDB
             SplayPut(rightMap, x, xParent);
             SplayPut(parentMap, xParent, x);
             SplayPut(parentMap, x, xGrandParent);
+            SplayRotatedUp(columnKey, x, xParent);
             if (xGrandParent == null)
             {
                 rootMap[columnKey] = x;
@@ -138,6 +144,83 @@ namespace RelationalDB
                 SplayPut(rightMap, xGrandParent, x);
         }
 
+        /// <summary>
+        /// Maintain the subtree aggregates after x is rotated above its former parent.
+        /// x now covers exactly the subtree of its former parent,
+        /// and the aggregates of the ancestors are unchanged.
+        /// </summary>
+        /// <param name="columnKey">user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }</param>
+        /// <param name="x"></param>
+        /// <param name="formerParent"></param>
+        protected void SplayRotatedUp(ByteString columnKey, ByteString x, ByteString formerParent)
+        {
+            StorageContext context = Storage.CurrentContext;
+            StorageMap subtreeCountMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_COUNT_PREFIX } + columnKey);
+            StorageMap subtreeSumMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_SUM_PREFIX } + columnKey);
+            subtreeCountMap.Put(x, (BigInteger)subtreeCountMap[formerParent]);
+            subtreeSumMap.Put(x, (BigInteger)subtreeSumMap[formerParent]);
+            SplayPushUp(columnKey, formerParent);
+        }
+
+        /// <summary>
+        /// Recompute the subtree count and subtree sum of x from its own count and its children
+        /// </summary>
+        /// <param name="columnKey">user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }</param>
+        /// <param name="x"></param>
+        protected void SplayPushUp(ByteString columnKey, ByteString x)
+        {
+            StorageContext context = Storage.CurrentContext;
+            StorageMap leftMap = new(context, (ByteString)new byte[] { SPLAY_NODE_LEFT_PREFIX } + columnKey);
+            StorageMap rightMap = new(context, (ByteString)new byte[] { SPLAY_NODE_RIGHT_PREFIX } + columnKey);
+            StorageMap nodeCountMap = new(context, (ByteString)new byte[] { SPLAY_NODE_COUNT_PREFIX } + columnKey);
+            StorageMap subtreeCountMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_COUNT_PREFIX } + columnKey);
+            StorageMap subtreeSumMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_SUM_PREFIX } + columnKey);
+            BigInteger nodeCount = (BigInteger)nodeCountMap[x];
+            BigInteger subtreeCount = nodeCount;
+            BigInteger subtreeSum = nodeCount * (BigInteger)x;
+            ByteString left = leftMap[x];
+            if (left != null)
+            {
+                subtreeCount += (BigInteger)subtreeCountMap[left];
+                subtreeSum += (BigInteger)subtreeSumMap[left];
+            }
+            ByteString right = rightMap[x];
+            if (right != null)
+            {
+                subtreeCount += (BigInteger)subtreeCountMap[right];
+                subtreeSum += (BigInteger)subtreeSumMap[right];
+            }
+            subtreeCountMap.Put(x, subtreeCount);
+            subtreeSumMap.Put(x, subtreeSum);
+        }
+
+        /// <summary>
+        /// Add delta occurrences of x to the subtree count and subtree sum of every node from the root down to x.
+        /// x must be in the tree.
+        /// </summary>
+        /// <param name="columnKey">user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }</param>
+        /// <param name="x"></param>
+        /// <param name="delta">negative for deletion</param>
+        protected void SplayAddToPath(ByteString columnKey, ByteString x, BigInteger delta)
+        {
+            StorageContext context = Storage.CurrentContext;
+            StorageMap leftMap = new(context, (ByteString)new byte[] { SPLAY_NODE_LEFT_PREFIX } + columnKey);
+            StorageMap rightMap = new(context, (ByteString)new byte[] { SPLAY_NODE_RIGHT_PREFIX } + columnKey);
+            StorageMap subtreeCountMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_COUNT_PREFIX } + columnKey);
+            StorageMap subtreeSumMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_SUM_PREFIX } + columnKey);
+            BigInteger xValue = (BigInteger)x;
+            ByteString u = new StorageMap(context, SPLAY_ROOT_PREFIX)[columnKey];
+            while (true)
+            {
+                subtreeCountMap.Put(u, (BigInteger)subtreeCountMap[u] + delta);
+                subtreeSumMap.Put(u, (BigInteger)subtreeSumMap[u] + delta * xValue);
+                BigInteger uValue = (BigInteger)u;
+                if (xValue == uValue)
+                    return;
+                u = xValue < uValue ? leftMap[u] : rightMap[u];
+            }
+        }
+
         /// <summary>
         /// Splays x to be a child of subtreeRoot. Use subtreeRoot=null to let x be the root of the whole tree
         /// </summary>
@@ -217,13 +300,33 @@ namespace RelationalDB
             if (nodeCount >= 1)  // x already in tree
             {
                 Splay(columnKey, x, null);
+                SplayAddToPath(columnKey, x, 1);  // x is the root
                 return;
             }
+            SplayLinkNewNode(columnKey, x);
+        }
+
+        /// <summary>
+        /// Link x, which is not in the tree yet, as a leaf and splay x to the root.
+        /// Size of tree and count of node are not maintained here,
+        /// but the count of x is added to the subtree aggregates on the path to x.
+        /// </summary>
+        /// <param name="columnKey">user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }</param>
+        /// <param name="x"></param>
+        protected void SplayLinkNewNode(ByteString columnKey, ByteString x)
+        {
+            StorageContext context = Storage.CurrentContext;
             StorageMap rootMap = new StorageMap(context, SPLAY_ROOT_PREFIX);
             StorageMap parentMap = new(context, (ByteString)new byte[] { SPLAY_NODE_PARENT_PREFIX } + columnKey);
             ByteString root = rootMap[columnKey];
             StorageMap leftMap = new(context, (ByteString)new byte[] { SPLAY_NODE_LEFT_PREFIX } + columnKey);
             StorageMap rightMap = new(context, (ByteString)new byte[] { SPLAY_NODE_RIGHT_PREFIX } + columnKey);
+            StorageMap subtreeCountMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_COUNT_PREFIX } + columnKey);
+            StorageMap subtreeSumMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_SUM_PREFIX } + columnKey);
+            BigInteger xValue = (BigInteger)x;
+            BigInteger nodeCount = (BigInteger)new StorageMap(context, (ByteString)new byte[] { SPLAY_NODE_COUNT_PREFIX } + columnKey)[x];
+            subtreeCountMap.Put(x, nodeCount);
+            subtreeSumMap.Put(x, nodeCount * xValue);
             if (root == null)  // nothing inserted before
             {
                 rootMap[columnKey] = x;
@@ -234,9 +337,10 @@ namespace RelationalDB
             }
 
             ByteString u = root;
-            BigInteger xValue = (BigInteger)x;
             while (true)
             {
+                subtreeCountMap.Put(u, (BigInteger)subtreeCountMap[u] + nodeCount);
+                subtreeSumMap.Put(u, (BigInteger)subtreeSumMap[u] + nodeCount * xValue);
                 if (xValue < (BigInteger)u)
                 {
                     ByteString left = leftMap[u];
@@ -265,6 +369,215 @@ namespace RelationalDB
             Splay(columnKey, x, null);
         }
 
+        /// <summary>
+        /// Insert many values without splaying for each of them.
+        /// The distinct values not yet in the tree are sorted and linked into a balanced subtree in one pass,
+        /// which becomes the whole tree if the tree was empty,
+        /// or is hung below the max (min) node if all the new values are greater (less) than the tree.
+        /// Otherwise the sorted new values are cut into runs that fall into the same empty child slot of the tree,
+        /// and each run is hung there as a balanced subtree, updating the aggregates on the path to the slot.
+        /// No node is splayed on that path, so a batch of k new values in g gaps costs O(k + g * depth).
+        /// </summary>
+        /// <param name="columnKey">user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }</param>
+        /// <param name="values">sorted in place</param>
+        protected void SplayBulkInsert(ByteString columnKey, BigInteger[] values)
+        {
+            int valuesLength = values.Length;
+            if (valuesLength == 0)
+                return;
+            SortIntegers(values);
+            StorageContext context = Storage.CurrentContext;
+            StorageMap treeSizeMap = new(context, SPLAY_SIZE_PREFIX);
+            treeSizeMap.Put(columnKey, (BigInteger)treeSizeMap[columnKey] + valuesLength);
+            StorageMap nodeCountMap = new(context, (ByteString)new byte[] { SPLAY_NODE_COUNT_PREFIX } + columnKey);
+            List<BigInteger> newValues = new();
+            int i = 0;
+            while (i < valuesLength)
+            {
+                BigInteger value = values[i];
+                int j = i + 1;
+                while (j < valuesLength && values[j] == value)
+                    ++j;
+                ByteString x = (ByteString)value;
+                BigInteger nodeCount = (BigInteger)nodeCountMap[x];
+                nodeCountMap.Put(x, nodeCount + j - i);
+                if (nodeCount == 0)
+                    newValues.Add(value);
+                else
+                    SplayAddToPath(columnKey, x, j - i);
+                i = j;
+            }
+            int newValuesLength = newValues.Count;
+            if (newValuesLength == 0)
+                return;
+
+            StorageMap rootMap = new StorageMap(context, SPLAY_ROOT_PREFIX);
+            ByteString root = rootMap[columnKey];
+            if (root == null)
+            {
+                (ByteString newRoot, _, _) = SplayBuild(columnKey, newValues, 0, newValuesLength, null);
+                rootMap[columnKey] = newRoot;
+                return;
+            }
+            ByteString max = SplayMax(columnKey, root);
+            if (newValues[0] > (BigInteger)max)
+            {
+                // max has no right child after being splayed to the root
+                Splay(columnKey, max, null);
+                (ByteString subtree, BigInteger subtreeCount, BigInteger subtreeSum) = SplayBuild(columnKey, newValues, 0, newValuesLength, max);
+                new StorageMap(context, (ByteString)new byte[] { SPLAY_NODE_RIGHT_PREFIX } + columnKey).Put(max, subtree);
+                SplayAddToNode(columnKey, max, subtreeCount, subtreeSum);
+                return;
+            }
+            ByteString min = SplayMin(columnKey, root);
+            if (newValues[newValuesLength - 1] < (BigInteger)min)
+            {
+                Splay(columnKey, min, null);
+                (ByteString subtree, BigInteger subtreeCount, BigInteger subtreeSum) = SplayBuild(columnKey, newValues, 0, newValuesLength, min);
+                new StorageMap(context, (ByteString)new byte[] { SPLAY_NODE_LEFT_PREFIX } + columnKey).Put(min, subtree);
+                SplayAddToNode(columnKey, min, subtreeCount, subtreeSum);
+                return;
+            }
+            // The new values interleave with the tree. Each run of them falling into the same empty child slot
+            // is hung there as a balanced subtree, and only the nodes on the path to that slot are updated.
+            StorageMap leftMap = new(context, (ByteString)new byte[] { SPLAY_NODE_LEFT_PREFIX } + columnKey);
+            StorageMap rightMap = new(context, (ByteString)new byte[] { SPLAY_NODE_RIGHT_PREFIX } + columnKey);
+            StorageMap subtreeCountMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_COUNT_PREFIX } + columnKey);
+            StorageMap subtreeSumMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_SUM_PREFIX } + columnKey);
+            int begin = 0;
+            while (begin < newValuesLength)
+            {
+                BigInteger value = newValues[begin];
+                List<ByteString> path = new();
+                ByteString upper = null;  // the least node greater than value, bounding the slot from above
+                ByteString u = root;
+                bool toLeft;
+                while (true)
+                {
+                    path.Add(u);
+                    if (value < (BigInteger)u)
+                    {
+                        upper = u;
+                        ByteString left = leftMap[u];
+                        if (left == null)
+                        {
+                            toLeft = true;
+                            break;
+                        }
+                        u = left;
+                    }
+                    else
+                    {
+                        ByteString right = rightMap[u];
+                        if (right == null)
+                        {
+                            toLeft = false;
+                            break;
+                        }
+                        u = right;
+                    }
+                }
+                int end = begin + 1;
+                if (upper == null)
+                    end = newValuesLength;
+                else
+                    while (end < newValuesLength && newValues[end] < (BigInteger)upper)
+                        ++end;
+                (ByteString subtree, BigInteger subtreeCount, BigInteger subtreeSum) = SplayBuild(columnKey, newValues, begin, end, u);
+                if (toLeft)
+                    leftMap.Put(u, subtree);
+                else
+                    rightMap.Put(u, subtree);
+                foreach (ByteString node in path)
+                {
+                    subtreeCountMap.Put(node, (BigInteger)subtreeCountMap[node] + subtreeCount);
+                    subtreeSumMap.Put(node, (BigInteger)subtreeSumMap[node] + subtreeSum);
+                }
+                begin = end;
+            }
+        }
+
+        /// <summary>
+        /// Add count and sum to the subtree aggregates of x only, e.g. when a subtree is hung below the root x
+        /// </summary>
+        /// <param name="columnKey">user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }</param>
+        /// <param name="x"></param>
+        /// <param name="count"></param>
+        /// <param name="sum"></param>
+        protected void SplayAddToNode(ByteString columnKey, ByteString x, BigInteger count, BigInteger sum)
+        {
+            StorageContext context = Storage.CurrentContext;
+            StorageMap subtreeCountMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_COUNT_PREFIX } + columnKey);
+            StorageMap subtreeSumMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_SUM_PREFIX } + columnKey);
+            subtreeCountMap.Put(x, (BigInteger)subtreeCountMap[x] + count);
+            subtreeSumMap.Put(x, (BigInteger)subtreeSumMap[x] + sum);
+        }
+
+        /// <summary>
+        /// Link sortedValues[begin..end], whose counts are already stored, into a balanced subtree
+        /// </summary>
+        /// <returns>(root of the subtree, null if empty; subtree count; subtree sum)</returns>
+        protected (ByteString, BigInteger, BigInteger) SplayBuild(ByteString columnKey,
+            List<BigInteger> sortedValues, int begin, int end, ByteString parent)
+        {
+            if (begin >= end)
+                return (null, 0, 0);
+            int middle = (begin + end) / 2;
+            BigInteger value = sortedValues[middle];
+            ByteString x = (ByteString)value;
+            StorageContext context = Storage.CurrentContext;
+            if (parent != null)
+                new StorageMap(context, (ByteString)new byte[] { SPLAY_NODE_PARENT_PREFIX } + columnKey).Put(x, parent);
+            BigInteger nodeCount = (BigInteger)new StorageMap(context, (ByteString)new byte[] { SPLAY_NODE_COUNT_PREFIX } + columnKey)[x];
+            (ByteString left, BigInteger leftCount, BigInteger leftSum) = SplayBuild(columnKey, sortedValues, begin, middle, x);
+            if (left != null)
+                new StorageMap(context, (ByteString)new byte[] { SPLAY_NODE_LEFT_PREFIX } + columnKey).Put(x, left);
+            (ByteString right, BigInteger rightCount, BigInteger rightSum) = SplayBuild(columnKey, sortedValues, middle + 1, end, x);
+            if (right != null)
+                new StorageMap(context, (ByteString)new byte[] { SPLAY_NODE_RIGHT_PREFIX } + columnKey).Put(x, right);
+            BigInteger subtreeCount = leftCount + nodeCount + rightCount;
+            BigInteger subtreeSum = leftSum + nodeCount * value + rightSum;
+            new StorageMap(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_COUNT_PREFIX } + columnKey).Put(x, subtreeCount);
+            new StorageMap(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_SUM_PREFIX } + columnKey).Put(x, subtreeSum);
+            return (x, subtreeCount, subtreeSum);
+        }
+
+        /// <summary>
+        /// In-place heap sort, ascending
+        /// </summary>
+        /// <param name="values"></param>
+        protected void SortIntegers(BigInteger[] values)
+        {
+            int length = values.Length;
+            for (int i = length / 2 - 1; i >= 0; --i)
+                SiftDown(values, i, length);
+            for (int end = length - 1; end > 0; --end)
+            {
+                BigInteger largest = values[0];
+                values[0] = values[end];
+                values[end] = largest;
+                SiftDown(values, 0, end);
+            }
+        }
+
+        protected void SiftDown(BigInteger[] values, int root, int end)
+        {
+            while (true)
+            {
+                int child = 2 * root + 1;
+                if (child >= end)
+                    return;
+                if (child + 1 < end && values[child] < values[child + 1])
+                    ++child;
+                if (values[root] >= values[child])
+                    return;
+                BigInteger rootValue = values[root];
+                values[root] = values[child];
+                values[child] = rootValue;
+                root = child;
+            }
+        }
+
         /// <summary>
         /// Find and splay
         /// </summary>
@@ -390,6 +703,100 @@ namespace RelationalDB
             return ans;
         }
 
+        /// <summary>
+        /// Count and sum of the values less than x, with duplicates, walking down from the root without splaying
+        /// </summary>
+        /// <param name="columnKey">user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }</param>
+        /// <param name="x">We allow x to be a number not inserted into the tree</param>
+        /// <returns>(count, sum)</returns>
+        protected (BigInteger, BigInteger) SplayCountSumLess(ByteString columnKey, BigInteger x)
+        {
+            StorageContext context = Storage.CurrentContext;
+            StorageMap leftMap = new(context, (ByteString)new byte[] { SPLAY_NODE_LEFT_PREFIX } + columnKey);
+            StorageMap rightMap = new(context, (ByteString)new byte[] { SPLAY_NODE_RIGHT_PREFIX } + columnKey);
+            StorageMap nodeCountMap = new(context, (ByteString)new byte[] { SPLAY_NODE_COUNT_PREFIX } + columnKey);
+            StorageMap subtreeCountMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_COUNT_PREFIX } + columnKey);
+            StorageMap subtreeSumMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_SUM_PREFIX } + columnKey);
+            BigInteger count = 0, sum = 0;
+            ByteString p = new StorageMap(context, SPLAY_ROOT_PREFIX)[columnKey];
+            while (p != null)
+            {
+                BigInteger pValue = (BigInteger)p;
+                if (pValue >= x)
+                {
+                    p = leftMap[p];
+                    continue;
+                }
+                // p and its left subtree are all less than x
+                BigInteger pCount = (BigInteger)nodeCountMap[p];
+                count += pCount;
+                sum += pCount * pValue;
+                ByteString left = leftMap[p];
+                if (left != null)
+                {
+                    count += (BigInteger)subtreeCountMap[left];
+                    sum += (BigInteger)subtreeSumMap[left];
+                }
+                p = rightMap[p];
+            }
+            return (count, sum);
+        }
+
+        /// <summary>
+        /// Count of values less than x, with duplicates
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="columnId"></param>
+        /// <param name="x">We allow x to be a number not inserted into the tree</param>
+        /// <returns></returns>
+        [Safe]
+        public BigInteger SplayRank(UInt160 user, ByteString tableName, byte columnId, BigInteger x) => SplayRank(user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }, x);
+        [Safe]
+        public BigInteger SplayRank(ByteString columnKey, BigInteger x)
+        {
+            (BigInteger count, _) = SplayCountSumLess(columnKey, x);
+            return count;
+        }
+
+        /// <summary>
+        /// The k-th smallest value, with duplicates, walking down from the root without splaying
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <param name="columnId"></param>
+        /// <param name="k">0-based</param>
+        /// <returns>null if k &lt; 0 or k &gt;= size of tree</returns>
+        [Safe]
+        public ByteString SplaySelectKth(UInt160 user, ByteString tableName, byte columnId, BigInteger k) => SplaySelectKth(user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }, k);
+        [Safe]
+        public ByteString SplaySelectKth(ByteString columnKey, BigInteger k)
+        {
+            StorageContext context = Storage.CurrentContext;
+            StorageMap leftMap = new(context, (ByteString)new byte[] { SPLAY_NODE_LEFT_PREFIX } + columnKey);
+            StorageMap rightMap = new(context, (ByteString)new byte[] { SPLAY_NODE_RIGHT_PREFIX } + columnKey);
+            StorageMap nodeCountMap = new(context, (ByteString)new byte[] { SPLAY_NODE_COUNT_PREFIX } + columnKey);
+            StorageMap subtreeCountMap = new(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_COUNT_PREFIX } + columnKey);
+            ByteString p = new StorageMap(context, SPLAY_ROOT_PREFIX)[columnKey];
+            while (p != null)
+            {
+                ByteString left = leftMap[p];
+                BigInteger leftCount = left == null ? 0 : (BigInteger)subtreeCountMap[left];
+                if (k < leftCount)
+                {
+                    p = left;
+                    continue;
+                }
+                k -= leftCount;
+                BigInteger pCount = (BigInteger)nodeCountMap[p];
+                if (k < pCount)
+                    return p;
+                k -= pCount;
+                p = rightMap[p];
+            }
+            return null;
+        }
+
         protected void SplayDelete(UInt160 user, ByteString tableName, byte columnId, ByteString x) => SplayDelete(user + tableName + SEPARATOR + (ByteString)new byte[] { columnId }, x);
         protected void SplayDelete(ByteString columnKey, ByteString x)
         {
@@ -402,7 +809,10 @@ namespace RelationalDB
             BigInteger treeSize = (BigInteger)treeSizeMap[columnKey];
             treeSizeMap.Put(columnKey, treeSize - 1);
             if (nodeCount > 1)
+            {
+                SplayAddToPath(columnKey, x, -1);
                 return;
+            }
 
             Splay(columnKey, x, null);
 
@@ -410,6 +820,8 @@ namespace RelationalDB
             StorageMap parentMap = new(context, (ByteString)new byte[] { SPLAY_NODE_PARENT_PREFIX } + columnKey);
             StorageMap leftMap = new(context, (ByteString)new byte[] { SPLAY_NODE_LEFT_PREFIX } + columnKey);
             StorageMap rightMap = new(context, (ByteString)new byte[] { SPLAY_NODE_RIGHT_PREFIX } + columnKey);
+            new StorageMap(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_COUNT_PREFIX } + columnKey).Delete(x);
+            new StorageMap(context, (ByteString)new byte[] { SPLAY_NODE_SUBTREE_SUM_PREFIX } + columnKey).Delete(x);
             ByteString xLeft = leftMap[x];
             ByteString xRight = rightMap[x];
             if (xLeft == null)
@@ -431,6 +843,7 @@ namespace RelationalDB
                 SplayPut(rightMap, xLeft, xRight);
                 SplayPut(parentMap, xRight, xLeft);
             }
+            SplayPushUp(columnKey, xLeft);
             SplayPut(rootMap, columnKey, xLeft);
 
             parentMap.Delete(x);
@@ -0,0 +1,240 @@
+﻿using System;
+using System.Numerics;
+using Neo;
+using Neo.SmartContract.Framework;
+using Neo.SmartContract.Framework.Attributes;
+using Neo.SmartContract.Framework.Services;
+
+namespace RelationalDB
+{
+    /// <summary>
+    /// Here we compile the column types of a table into a descriptor, stored once by CreateTable,
+    /// so that a row can be read with a single storage read of the schema,
+    /// and any column can be located in a stored row without decoding the columns before it.
+    /// descriptor = flags (1 byte: auto-increment primary key, row format) + count of columns (1 byte)
+    ///   + for each column: type, fixed length, anchor, delta (2 bytes, little-endian)
+    ///   + for each variable-length stored column, in order: its 0-based column index
+    /// A stored column starts at delta bytes after the end of the anchor-th variable-length column of the row
+    /// (anchor 0: the start of the row). So the leading fixed-width columns have fixed offsets,
+    /// and the other columns need only the lengths of the variable-length columns before them.
+    /// The primary key column of a table without auto-increment primary key is not stored in the row;
+    /// its anchor is DESCRIPTOR_IN_PRIMARY_KEY.
+    /// </summary>
+    public partial class RelationalDB
+    {
+        const byte TABLE_DESCRIPTOR_PREFIX = (byte)'s';  // 0x73  user + tableName -> descriptor
+        const byte DESCRIPTOR_AUTO_INC_PRIMARY_KEY = 0x01;  // flag
+        const byte DESCRIPTOR_ROW_FORMAT_V2 = 0x02;  // flag; rows are in ROW_FORMAT_V1 without it
+        const byte DESCRIPTOR_IN_PRIMARY_KEY = 0xff;  // anchor of the primary key column, not stored in the row
+        const int DESCRIPTOR_HEADER_LENGTH = 2;
+        const int DESCRIPTOR_COLUMN_LENGTH = 5;
+
+        /// <summary>
+        /// 
+        /// </summary>
+        /// <param name="user"></param>
+        /// <param name="tableName"></param>
+        /// <returns>null if no table</returns>
+        [Safe]
+        public ByteString GetDescriptor(UInt160 user, ByteString tableName) => (ByteString)LoadDescriptor(user + tableName);
+
+        /// <summary>
+        /// 
+        /// </summary>
+        /// <param name="columnTypes"></param>
+        /// <param name="useAutoIncPriKey"></param>
+        /// <param name="rowFormat">ROW_FORMAT_V1 or ROW_FORMAT_V2</param>
+        /// <returns></returns>
+        [Safe]
+        public ByteString CompileDescriptor(ByteString columnTypes, bool useAutoIncPriKey, byte rowFormat)
+        {
+            ByteString columns = "";
+            ByteString variableLengthColumns = "";
+            int columnTypesLength = columnTypes.Length;
+            int columnTypesIndexer = 0;
+            byte column = 0;
+            byte anchor = 0;
+            int delta = 0;
+            while (columnTypesIndexer < columnTypesLength)
+            {
+                byte type = columnTypes[columnTypesIndexer++];
+                byte length = type == INT_FIXED_LEN || type == BYTESTRING_FIXED_LEN ? columnTypes[columnTypesIndexer++] : (byte)0;
+                if (column == 0 && !useAutoIncPriKey)
+                {
+                    columns += (ByteString)new byte[] { type, length, DESCRIPTOR_IN_PRIMARY_KEY, 0, 0 };
+                    ++column;
+                    continue;
+                }
+                columns += (ByteString)new byte[] { type, length, anchor, (byte)(delta & 0xff), (byte)(delta >> 8) };
+                switch (type)
+                {
+                    case BOOLEAN:
+                        delta += 1;
+                        break;
+                    case UINT160:
+                        delta += 20;
+                        break;
+                    case UINT256:
+                        delta += 32;
+                        break;
+                    case INT_FIXED_LEN:
+                    case BYTESTRING_FIXED_LEN:
+                        delta += length;
+                        break;
+                    default:  // INT_VAR_LEN, BYTESTRING_VAR_LEN
+                        variableLengthColumns += (ByteString)new byte[] { column };
+                        ++anchor;
+                        delta = 0;
+                        break;
+                }
+                ++column;
+            }
+            byte flags = useAutoIncPriKey ? DESCRIPTOR_AUTO_INC_PRIMARY_KEY : (byte)0;
+            if (rowFormat == ROW_FORMAT_V2)
+                flags |= DESCRIPTOR_ROW_FORMAT_V2;
+            return (ByteString)new byte[] { flags, column } + columns + variableLengthColumns;
+        }
+
+        /// <summary>
+        /// Tables created before descriptors were introduced have their descriptors compiled on the fly.
+        /// </summary>
+        /// <param name="tableKey"></param>
+        /// <returns>null if no table</returns>
+        protected byte[] LoadDescriptor(ByteString tableKey)
+        {
+            StorageContext context = Storage.CurrentContext;
+            ByteString descriptor = new StorageMap(context, TABLE_DESCRIPTOR_PREFIX)[tableKey];
+            if (descriptor != null)
+                return (byte[])descriptor;
+            ByteString columnTypes = new StorageMap(context, USER_TABLE_NAME_TO_COLUMNS_PREFIX)[tableKey];
+            if (columnTypes == null)
+                return null;
+            return (byte[])CompileDescriptor(columnTypes, new StorageMap(context, TABLE_ROW_ID_PREFIX)[tableKey] != null, ROW_FORMAT_V1);
+        }
+
+        protected bool DescriptorUsesAutoIncPriKey(byte[] descriptor) => (descriptor[0] & DESCRIPTOR_AUTO_INC_PRIMARY_KEY) != 0;
+        protected byte DescriptorRowFormat(byte[] descriptor) => (descriptor[0] & DESCRIPTOR_ROW_FORMAT_V2) != 0 ? ROW_FORMAT_V2 : ROW_FORMAT_V1;
+        protected int DescriptorColumnsCount(byte[] descriptor) => descriptor[1];
+        protected byte DescriptorType(byte[] descriptor, int column) => descriptor[DESCRIPTOR_HEADER_LENGTH + column * DESCRIPTOR_COLUMN_LENGTH];
+        protected byte DescriptorLength(byte[] descriptor, int column) => descriptor[DESCRIPTOR_HEADER_LENGTH + column * DESCRIPTOR_COLUMN_LENGTH + 1];
+        protected byte DescriptorAnchor(byte[] descriptor, int column) => descriptor[DESCRIPTOR_HEADER_LENGTH + column * DESCRIPTOR_COLUMN_LENGTH + 2];
+        protected int DescriptorDelta(byte[] descriptor, int column)
+        {
+            int position = DESCRIPTOR_HEADER_LENGTH + column * DESCRIPTOR_COLUMN_LENGTH + 3;
+            return descriptor[position] + (descriptor[position + 1] << 8);
+        }
+
+        /// <summary>
+        /// Ends of the first anchorsCount variable-length columns of a stored row
+        /// </summary>
+        /// <param name="data">stored row in v1 format</param>
+        /// <param name="descriptor"></param>
+        /// <param name="anchorsCount"></param>
+        /// <returns>ends[anchor] for anchor in 0..anchorsCount; ends[0] == 0</returns>
+        protected int[] VariableLengthColumnEnds(byte[] data, byte[] descriptor, int anchorsCount)
+        {
+            int[] ends = new int[anchorsCount + 1];
+            int listStart = DESCRIPTOR_HEADER_LENGTH + DescriptorColumnsCount(descriptor) * DESCRIPTOR_COLUMN_LENGTH;
+            for (int anchor = 1; anchor <= anchorsCount; ++anchor)
+            {
+                int start = ends[anchor - 1] + DescriptorDelta(descriptor, descriptor[listStart + anchor - 1]);
+                ends[anchor] = start + 2 + data[start] + (data[start + 1] << 8);
+            }
+            return ends;
+        }
+
+        /// <summary>
+        /// Offsets of all the columns in a stored row, without decoding or copying the values
+        /// </summary>
+        /// <param name="data">stored row in v1 format</param>
+        /// <param name="descriptor"></param>
+        /// <returns>offsets[column]..offsets[column + 1] is the encoded value of a stored column</returns>
+        protected int[] ColumnOffsets(byte[] data, byte[] descriptor)
+        {
+            int columnsCount = DescriptorColumnsCount(descriptor);
+            int[] offsets = new int[columnsCount + 1];
+            int variableLengthColumnEnd = 0;
+            for (int column = 0; column < columnsCount; ++column)
+            {
+                if (DescriptorAnchor(descriptor, column) == DESCRIPTOR_IN_PRIMARY_KEY)
+                    continue;
+                int offset = variableLengthColumnEnd + DescriptorDelta(descriptor, column);
+                offsets[column] = offset;
+                byte type = DescriptorType(descriptor, column);
+                if (type == INT_VAR_LEN || type == BYTESTRING_VAR_LEN)
+                    variableLengthColumnEnd = offset + 2 + data[offset] + (data[offset + 1] << 8);
+            }
+            offsets[columnsCount] = data.Length;
+            return offsets;
+        }
+
+        /// <summary>
+        /// Decode a single value at offset, copying only the bytes of the value
+        /// </summary>
+        /// <param name="data"></param>
+        /// <param name="offset"></param>
+        /// <param name="type"></param>
+        /// <param name="length">fixed length of INT_FIXED_LEN or BYTESTRING_FIXED_LEN</param>
+        /// <returns>(decoded value, offset of the next value)</returns>
+        /// <exception cref="ArgumentException"></exception>
+        [Safe]
+        public (object, int) DecodeAt(byte[] data, int offset, byte type, byte length)
+        {
+            switch (type)
+            {
+                case BOOLEAN:
+                    return (data[offset] > 0 ? true : false, offset + 1);
+                case UINT160:
+                    return (data[offset..(offset + 20)], offset + 20);
+                case UINT256:
+                    return (data[offset..(offset + 32)], offset + 32);
+                case INT_VAR_LEN:
+                case BYTESTRING_VAR_LEN:
+                    int start = offset + 2;
+                    int end = start + data[offset] + (data[offset + 1] << 8);
+                    if (type == INT_VAR_LEN)
+                        return ((BigInteger)(ByteString)data[start..end], end);
+                    return ((ByteString)data[start..end], end);
+                case INT_FIXED_LEN:
+                    return ((BigInteger)(ByteString)data[offset..(offset + length)], offset + length);
+                case BYTESTRING_FIXED_LEN:
+                    return ((ByteString)data[offset..(offset + length)], offset + length);
+                default:
+                    throw new ArgumentException("Unsupported type " + type);
+            }
+        }
+
+        /// <summary>
+        /// Decode a row stored at ROWS_PREFIX in v1 or v2 format, with its primary key if it is not an auto-increment rowId
+        /// </summary>
+        /// <param name="data">value stored at ROWS_PREFIX</param>
+        /// <param name="descriptor"></param>
+        /// <param name="primaryKey"></param>
+        /// <returns></returns>
+        protected object[] DecodeDescribedRow(byte[] data, byte[] descriptor, ByteString primaryKey)
+        {
+            List<object> row = new();
+            int columnsCount = DescriptorColumnsCount(descriptor);
+            if (DescriptorRowFormat(descriptor) == ROW_FORMAT_V2)
+            {
+                int[] offsets = ValueOffsetsV2(data, descriptor);
+                for (int column = 0; column < columnsCount; ++column)
+                    row.Add(DecodeColumnV2(data, descriptor, offsets, primaryKey, column));
+                return row;
+            }
+            int offset = 0;
+            for (int column = 0; column < columnsCount; ++column)
+            {
+                byte type = DescriptorType(descriptor, column);
+                byte length = DescriptorLength(descriptor, column);
+                object decoded;
+                if (DescriptorAnchor(descriptor, column) == DESCRIPTOR_IN_PRIMARY_KEY)
+                    (decoded, _) = DecodeAt((byte[])primaryKey, 0, type, length);
+                else
+                    (decoded, offset) = DecodeAt(data, offset, type, length);
+                row.Add(decoded);
+            }
+            return row;
+        }
+    }
+}
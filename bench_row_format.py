@@ -0,0 +1,40 @@
+from neo_fairy_client import FairyClient, Hash160Str
+from relational_db_client.client import gas_consumed
+import random
+
+# stored bytes per row, and GAS per row of writeRows and getRows, in row format v1 versus v2.
+# Encoded offline by relational_db_client.codec, these rows take 51.93 bytes/row in v1 and 29.87 bytes/row in v2;
+# the GAS figures exist only from running this script against a built contract.
+user = Hash160Str('0xb1983fa2479a0c8e2beae032d2df564b5451b7a5')
+main_session = 'benchRowFormat'
+c = FairyClient(fairy_session=main_session, wallet_address_or_scripthash=user, with_print=False)
+c.virutal_deploy_from_path('./bin/sc/RelationalDB.nef')
+# int32 primary key, int, int, str, bool, bool, bytes32
+column_types = b'\x31\x04\x21\x21\x28\x20\x20\x38\x20'
+no_index = b'\x00' * 7
+
+random.seed(0)
+batch_size = 100
+rows = [[i, random.randint(-2**40, 2**40), random.choice([None, random.randint(0, 100)]), 'row %d' % i,
+         random.random() < 0.5, random.random() < 0.5, random.choice([None, 'x' * 32])]
+        for i in range(batch_size)]
+for row_format in [1, 2]:
+    c.copy_snapshot(main_session, session := f'{main_session}_v{row_format}')
+    c.fairy_session = session
+    table_name = f'v{row_format}'
+    c.invokefunction('createTable', [user, table_name, column_types, False, no_index, row_format])
+    # v1 cannot store NULL
+    batch = rows if row_format == 2 else [[0 if v is None else v for v in row[:6]] + [row[6] or 'y' * 32] for row in rows]
+    c.invokefunction('writeRows', [user, table_name, batch])
+    write_gas = gas_consumed(c)
+    stored = c.invokefunction('listRows', [user, table_name])
+    stored_bytes = sum(len(r[1].encode() if type(r[1]) is str else r[1]) for r in stored)
+    c.invokefunction('getRows', [user, table_name, [row[0] for row in rows]])
+    read_gas = gas_consumed(c)
+    c.invokefunction('getColumns', [user, table_name, [row[0] for row in rows], b'\x04'])
+    column_gas = gas_consumed(c)
+    print(f'v{row_format}\t{stored_bytes / batch_size:.2f} bytes/row'
+          f'\twriteRows {write_gas / batch_size / 1e8:.8f} GAS/row'
+          f'\tgetRows {read_gas / batch_size / 1e8:.8f} GAS/row'
+          f'\tgetColumns {column_gas / batch_size / 1e8:.8f} GAS/row')
+c.fairy_session = main_session
@@ -0,0 +1,204 @@
+"""
+GAS, storage changes and splay tree depth of the main operations, against table size, key distribution and column count.
+Each table is loaded in its own fairy session copied from a session with the contract deployed.
+
+python bench_suite.py --sizes 10,100,1000 --report bench_report  # writes bench_report.json and bench_report.csv
+python bench_suite.py --write-baseline bench_baseline.json         # store the current results as the baseline
+python bench_suite.py --baseline bench_baseline.json --threshold 0.1  # exit 1 if anything costs 10% more than the baseline
+"""
+import argparse
+import csv
+import json
+import random
+import statistics
+import sys
+from typing import Dict, List, Optional
+
+from neo_fairy_client import FairyClient, Hash160Str
+from relational_db_client import GasChunker, RelationalDBClient, Types, as_bytes
+from relational_db_client.client import gas_consumed
+from relational_db_client.codec import int_to_bytes
+
+user = Hash160Str('0xb1983fa2479a0c8e2beae032d2df564b5451b7a5')
+main_session = 'benchSuite'
+table_name = 'bench'
+VALUE_COLUMN = 2  # indexed by the splay tree
+METRICS = ['gas', 'storage_changes', 'depth_min', 'depth_max']
+
+
+def generate_keys(distribution: str, size: int, rng: random.Random) -> List[List[int]]:
+    """[primary key, indexed value] of each row"""
+    if distribution == 'sequential':
+        return [[i, i] for i in range(size)]
+    primary_keys = rng.sample(range(2**31 - 1), size)
+    if distribution == 'random':
+        return [[k, rng.randint(-2**40, 2**40)] for k in primary_keys]
+    if distribution == 'skewed':
+        # few values hold most of the rows
+        return [[k, int(rng.paretovariate(1.2))] for k in primary_keys]
+    raise ValueError(f'Unknown distribution {distribution}')
+
+
+def storage_snapshot(client: FairyClient) -> Dict[bytes, bytes]:
+    return {as_bytes(k): as_bytes(v) for k, v in client.find_storage_with_session('').items()}
+
+
+def storage_changes(before: Dict[bytes, bytes], after: Dict[bytes, bytes]) -> int:
+    """count of storage entries added, modified or deleted"""
+    return sum(1 for k in before.keys() | after.keys() if before.get(k) != after.get(k))
+
+
+def depth_min(client: FairyClient, max_nodes: int) -> Optional[int]:
+    """
+    depth of the smallest value: the length of the left spine, linear in the worst case of sorted inserts;
+    None if the spine is longer than max_nodes
+    """
+    if client.invokefunction('splayGetSize', [user, table_name, VALUE_COLUMN]) == 0:
+        return 0
+    node, depth = int_to_bytes(client.invokefunction('splayGetRoot', [user, table_name, VALUE_COLUMN])), 0
+    while (node := client.invokefunction('splayGetLeft', [user, table_name, VALUE_COLUMN, node])) is not None:
+        if depth == max_nodes:
+            return None
+        node, depth = as_bytes(node), depth + 1
+    return depth
+
+
+def depth_max(client: FairyClient, max_nodes: int) -> Optional[int]:
+    """depth of the deepest node, walking the whole tree; None for trees of more than max_nodes nodes"""
+    size = client.invokefunction('splayGetSize', [user, table_name, VALUE_COLUMN])
+    if size == 0:
+        return 0
+    if size > max_nodes:
+        return None
+    level, depth = [int_to_bytes(client.invokefunction('splayGetRoot', [user, table_name, VALUE_COLUMN]))], -1
+    while level:
+        depth += 1
+        children = []
+        for node in level:
+            for method in ['splayGetLeft', 'splayGetRight']:
+                if (child := client.invokefunction(method, [user, table_name, VALUE_COLUMN, node])) is not None:
+                    children.append(as_bytes(child))
+        level = children
+    return depth
+
+
+def bench_table(c: FairyClient, db: RelationalDBClient, distribution: str, size: int, columns: int,
+                args: argparse.Namespace) -> List[dict]:
+    rng = random.Random(args.seed)
+    session = f'{main_session}_{distribution}_{size}_{columns}'
+    c.copy_snapshot(main_session, session)
+    c.fairy_session = session
+    # int32 primary key, indexed int, then int columns without index
+    c.invokefunction('createTable', [user, table_name, Types.IntFixedLen + b'\x04' + Types.IntVarLen * (columns - 1), False,
+                                     b'\x00\x02' + b'\x00' * (columns - 2)])
+    table = db.table(table_name)
+    keys = generate_keys(distribution, size + args.samples, rng)
+    loaded, spare = keys[:size], keys[size:]
+    # writeRows inserts the values one by one into the splay tree, which is the worst case for sorted values;
+    # bulkWriteRows builds a balanced tree for a new table
+    db.chunked(args.loader, [k + [0] * (columns - 2) for k in loaded],
+               lambda chunk: [user, table_name, list(chunk)] + ([True] if args.loader == 'bulkWriteRows' else []))
+    table_record = {'loader': args.loader, 'distribution': distribution, 'rows': size, 'columns': columns}
+    # the depths belong to the loaded table, not to an operation
+    records = [{**table_record, 'operation': 'depth',
+                'depth_min': depth_min(c, args.depth_max_nodes), 'depth_max': depth_max(c, args.depth_max_nodes)}]
+    if args.verbose:
+        print(records[-1])
+    measure_storage = size <= args.storage_max_rows
+
+    operations = {
+        'writeRow': lambda i: ('writeRow', [user, table_name, spare[i] + [1] * (columns - 2)]),
+        'getRows': lambda i: ('getRows', [user, table_name, [table.encode_primary_key(k[0]) for k in rng.sample(loaded, min(10, size))]]),
+        'splayPredecessor': lambda i: ('splayPredecessor', [user, table_name, VALUE_COLUMN, int_to_bytes(rng.choice(loaded)[1])]),
+        'findPrimaryKeyFromValue': lambda i: ('findPrimaryKeyFromValue', [user, table_name, VALUE_COLUMN, rng.choice(loaded)[1]]),
+        'deleteRow': lambda i: ('deleteRow', [user, table_name, table.encode_primary_key(loaded[i][0])]),
+    }
+    for operation, make_call in operations.items():
+        gas, changes = [], []
+        for i in range(args.samples):
+            method, params = make_call(i)
+            before = storage_snapshot(c) if measure_storage else None
+            c.invokefunction(method, params)
+            gas.append(gas_consumed(c))
+            if measure_storage:
+                changes.append(storage_changes(before, storage_snapshot(c)))
+        records.append({
+            **table_record, 'operation': operation,
+            'gas': int(statistics.median(gas)),
+            'storage_changes': int(statistics.median(changes)) if changes else None,
+        })
+        if args.verbose:
+            print(records[-1])
+    c.fairy_session = main_session
+    c.delete_snapshots([session])
+    return records
+
+
+def record_key(record: dict) -> str:
+    return f"{record['loader']}/{record['distribution']}/{record['rows']}/{record['columns']}/{record['operation']}"
+
+
+def regressions(records: List[dict], baseline: List[dict], threshold: float) -> List[str]:
+    baseline_by_key = {record_key(r): r for r in baseline}
+    failures = []
+    for record in records:
+        if (base := baseline_by_key.get(record_key(record))) is None:
+            continue
+        for metric in METRICS:
+            if record.get(metric) is None or base.get(metric) is None:
+                continue
+            if record[metric] > base[metric] * (1 + threshold):
+                failures.append(f'{record_key(record)} {metric}: {base[metric]} -> {record[metric]}')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10,100,1000,10000,100000', help='rows loaded in each table')
+    parser.add_argument('--distributions', default='sequential,random,skewed')
+    parser.add_argument('--columns', default='3,12', help='column counts of the tables, at least 3')
+    parser.add_argument('--loader', default='writeRows', choices=['writeRows', 'bulkWriteRows'])
+    parser.add_argument('--samples', type=int, default=5, help='calls of each operation; the median is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--storage-max-rows', type=int, default=1000,
+                        help='count storage changes only for tables up to this size, by diffing the whole storage')
+    parser.add_argument('--depth-max-nodes', type=int, default=2000,
+                        help='walk the splay tree for its depths only up to this many nodes')
+    parser.add_argument('--gas-ceiling', type=float, default=10.0, help='GAS per loading call')
+    parser.add_argument('--report', default='bench_report', help='writes REPORT.json and REPORT.csv')
+    parser.add_argument('--baseline', help='JSON report to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed increase over the baseline, as a fraction')
+    parser.add_argument('--write-baseline', help='write the results to this JSON file as the new baseline')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    c = FairyClient(fairy_session=main_session, wallet_address_or_scripthash=user, with_print=False)
+    c.virutal_deploy_from_path('./bin/sc/RelationalDB.nef')
+    db = RelationalDBClient(c, user, GasChunker(gas_ceiling=int(args.gas_ceiling * 1e8), initial_chunk=50, max_chunk=2000),
+                            max_workers=1)
+    records = []
+    for columns in map(int, args.columns.split(',')):
+        for distribution in args.distributions.split(','):
+            for size in map(int, args.sizes.split(',')):
+                records += bench_table(c, db, distribution, size, columns, args)
+
+    with open(f'{args.report}.json', 'w') as f:
+        json.dump(records, f, indent=1)
+    with open(f'{args.report}.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['loader', 'distribution', 'rows', 'columns', 'operation'] + METRICS)
+        writer.writeheader()
+        writer.writerows(records)
+    if args.write_baseline:
+        with open(args.write_baseline, 'w') as f:
+            json.dump(records, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = regressions(records, json.load(f), args.threshold)
+        for failure in failures:
+            print(f'REGRESSION {failure}')
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+from neo_fairy_client import FairyClient, Hash160Str
+from relational_db_client.client import gas_consumed
+import random
+
+# GAS per row of writeRows versus bulkWriteRows, on the same batches of rows.
+# Batch 0 fills empty indexes. In later batches, the sequential column 2 is hung below the max as a balanced subtree,
+# while the random values of columns 1 and 3 interleave with the tree and are hung as small subtrees, one per gap.
+user = Hash160Str('0xb1983fa2479a0c8e2beae032d2df564b5451b7a5')
+main_session = 'benchWriteRows'
+c = FairyClient(fairy_session=main_session, wallet_address_or_scripthash=user, with_print=False)
+c.virutal_deploy_from_path('./bin/sc/RelationalDB.nef')
+table_name = 'bench'
+# int, int, int32, str
+assert c.invokefunction('createTable', [user, table_name, b'\x21\x21\x31\x04\x28', True]) == 4
+
+random.seed(0)
+batch_size, batch_count = 100, 5
+batches = [[[random.randint(-2**40, 2**40), i, random.randint(-2**31, 2**31-1), 'row %d' % i]
+            for i in range(batch * batch_size, (batch + 1) * batch_size)] for batch in range(batch_count)]
+for method, args in [('writeRows', []), ('bulkWriteRows', [True])]:
+    c.copy_snapshot(main_session, session := f'{main_session}_{method}')
+    c.fairy_session = session
+    for batch_id, batch in enumerate(batches):
+        c.invokefunction(method, [user, table_name, batch] + args)
+        print(f'{method}\tbatch {batch_id}\t{gas_consumed(c) / len(batch) / 1e8:.8f} GAS/row')
+c.fairy_session = main_session
@@ -0,0 +1,4 @@
+from .codec import Types, Column, Schema, as_bytes, as_int, decode_row, encode_primary_key, encode_row, encode_single, \
+    parse_column_types, parse_descriptor
+from .client import GasChunker, RelationalDBClient, Table
+from .replica import FairyStorageSource, LocalStorageNode, Replica, StorageSource
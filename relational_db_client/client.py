@@ -0,0 +1,213 @@
+"""
+Typed client of one table of RelationalDB, over a FairyClient session.
+Bulk calls are split into the largest chunks that should fit under a GAS ceiling,
+estimated from the GAS consumed by earlier calls of the same method.
+"""
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from neo_fairy_client import FairyClient, Hash160Str
+
+from .codec import SEPARATOR, Value, as_bytes, decode_row, encode_primary_key, encode_row, normalize, \
+    parse_descriptor
+
+Call = Tuple[str, List[Any]]
+
+
+def gas_consumed(client: FairyClient) -> int:
+    return int(client.previous_raw_result['result']['gasconsumed'])
+
+
+class GasChunker:
+    """
+    Chooses how many items (rows or primary keys) to send in a single call of a method.
+    The GAS of a call is modelled as fixed + per_item * items, fitted by least squares to the calls measured so far,
+    then shifted up by the largest underestimate among them, so that the line bounds every measurement.
+    Chunks are sized so that the estimate, plus a safety margin, stays under the GAS ceiling.
+    """
+
+    def __init__(self, gas_ceiling: int = 10_0000_0000, initial_chunk: int = 16, max_chunk: int = 1024,
+                 safety_margin: float = 0.1):
+        """
+        :param gas_ceiling: in units of 1e-8 GAS
+        :param initial_chunk: items in the first call of a method, before any measurement
+        :param max_chunk: at most this many items in a call, whatever the measurements
+        :param safety_margin: the estimated GAS of a chunk times (1 + safety_margin) is at most gas_ceiling
+        """
+        self.gas_ceiling = gas_ceiling
+        self.initial_chunk = initial_chunk
+        self.max_chunk = max_chunk
+        self.safety_margin = safety_margin
+        self.measurements: Dict[str, List[Tuple[int, int]]] = {}  # method -> [(items, GAS)]
+        self.failed_chunk: Dict[str, int] = {}  # method -> fewest items of a call that ran out of GAS
+
+    def estimate(self, method: str) -> Tuple[float, float]:
+        """:return: (fixed GAS, GAS per item) of a call of method; the method must have been measured"""
+        points = self.measurements[method]
+        count = len(points)
+        mean_items = sum(items for items, _ in points) / count
+        mean_gas = sum(gas for _, gas in points) / count
+        variance = sum((items - mean_items) ** 2 for items, _ in points)
+        per_item = sum((items - mean_items) * (gas - mean_gas) for items, gas in points) / variance if variance else 0
+        if per_item <= 0:
+            # a single chunk size measured cannot tell the fixed cost from the cost per item
+            return 0, max(gas / max(items, 1) for items, gas in points)
+        fixed = mean_gas - per_item * mean_items
+        fixed += max(gas - (fixed + per_item * items) for items, gas in points)
+        return max(fixed, 0), per_item
+
+    def chunk_size(self, method: str) -> int:
+        limit = min(self.max_chunk, self.failed_chunk[method] // 2) if method in self.failed_chunk else self.max_chunk
+        if method not in self.measurements:
+            return max(1, min(limit, self.initial_chunk))
+        fixed, per_item = self.estimate(method)
+        if per_item <= 0:
+            return max(1, limit)
+        return max(1, min(limit, int((self.gas_ceiling / (1 + self.safety_margin) - fixed) // per_item)))
+
+    def record(self, method: str, items: int, gas: int) -> None:
+        self.measurements.setdefault(method, []).append((items, gas))
+
+    def record_failure(self, method: str, items: int) -> None:
+        """the call of items did not fit; later chunks are at most half of it"""
+        self.failed_chunk[method] = min(self.failed_chunk.get(method, items), items)
+
+
+# lowercase; ApplicationEngine faults with "Insufficient GAS." when a call exceeds its GAS limit
+OUT_OF_GAS_FAULT = 'insufficient gas'
+
+
+def is_out_of_gas(e: Exception) -> bool:
+    return OUT_OF_GAS_FAULT in str(e).lower()
+
+
+class RelationalDBClient:
+    def __init__(self, client: FairyClient, user: Hash160Str, chunker: Optional[GasChunker] = None, max_workers: int = 4):
+        """
+        :param client: with the contract deployed (or virtually deployed) in its fairy session
+        :param max_workers: count of concurrent calls by pipeline and by the reads of Table
+        """
+        self.client = client
+        self.user = user
+        self.chunker = chunker or GasChunker()
+        self.max_workers = max_workers
+
+    def invoke(self, method: str, params: List[Any], client: Optional[FairyClient] = None) -> Tuple[Any, int]:
+        """:return: (result, GAS consumed)"""
+        client = client or self.client
+        result = client.invokefunction(method, params)
+        return result, gas_consumed(client)
+
+    def pipeline(self, calls: Sequence[Call]) -> List[Any]:
+        """
+        Send independent calls concurrently, each from its own copy of the FairyClient,
+        and return their results in the order of calls.
+        Writes in the same fairy session are not ordered against each other; pipeline reads only,
+        or writes that do not touch the same rows and indexes.
+        """
+        if self.max_workers <= 1 or len(calls) <= 1:
+            return [self.invoke(method, params)[0] for method, params in calls]
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            return list(executor.map(lambda call: self.invoke(*call, client=copy.copy(self.client))[0], calls))
+
+    def chunked(self, method: str, items: Sequence[Any], make_params: Callable[[Sequence[Any]], List[Any]],
+                concurrent: bool = False) -> List[Any]:
+        """
+        Call method on consecutive chunks of items, sized by the chunker,
+        and return the result of each call in order.
+        A chunk that runs out of GAS is split in halves and retried.
+        :param concurrent: after the first chunk measures the method, send the other chunks by pipeline
+        """
+        results, begin = [], 0
+        while begin < len(items):
+            if concurrent and self.max_workers > 1 and method in self.chunker.measurements:
+                size = self.chunker.chunk_size(method)
+                chunks = [items[i:i + size] for i in range(begin, len(items), size)]
+                with ThreadPoolExecutor(self.max_workers) as executor:
+                    results += list(executor.map(lambda chunk: self._call_chunk(
+                        method, chunk, make_params, copy.copy(self.client)), chunks))
+                return results
+            chunk = items[begin:begin + self.chunker.chunk_size(method)]
+            results.append(self._call_chunk(method, chunk, make_params, self.client))
+            begin += len(chunk)
+        return results
+
+    def _call_chunk(self, method: str, chunk: Sequence[Any], make_params: Callable[[Sequence[Any]], List[Any]],
+                    client: FairyClient) -> Any:
+        try:
+            result, gas = self.invoke(method, make_params(chunk), client)
+        except Exception as e:
+            if len(chunk) <= 1 or not is_out_of_gas(e):
+                raise
+            self.chunker.record_failure(method, len(chunk))
+            half = len(chunk) // 2
+            first = self._call_chunk(method, chunk[:half], make_params, client)
+            second = self._call_chunk(method, chunk[half:], make_params, client)
+            # results of bulk reads are lists of rows; writes and deletes return None
+            return first + second if isinstance(first, list) else None
+        self.chunker.record(method, len(chunk), gas)
+        return result
+
+    def table(self, table_name: str) -> 'Table':
+        return Table(self, table_name)
+
+
+class Table:
+    """
+    Rows are lists of Python values: None, bool, int, or bytes.
+    Primary keys are the values of the first column,
+    or the rowIds of a table with auto-increment primary key.
+    """
+
+    def __init__(self, db: RelationalDBClient, table_name: str):
+        self.db = db
+        self.table_name = table_name
+        # the descriptor holds the whole schema, and is compiled on the fly for tables created before descriptors
+        descriptor = db.client.invokefunction('getDescriptor', [db.user, table_name])
+        if descriptor is None:
+            raise ValueError(f'No table {table_name}')
+        self.schema = parse_descriptor(descriptor)
+
+    def encode_primary_key(self, primary_key: Value) -> bytes:
+        return encode_primary_key(primary_key, self.schema)
+
+    def encode_row(self, row: Sequence[Value]) -> bytes:
+        """the value stored for a row; the primary key column is excluded unless the primary key is auto-increment"""
+        return encode_row(row if self.schema.auto_inc_primary_key else row[1:], self.schema)
+
+    def decode_row(self, data: bytes, primary_key: bytes) -> List[Value]:
+        return decode_row(data, self.schema, primary_key)
+
+    def normalize_row(self, row: Sequence[Any]) -> List[Value]:
+        return [normalize(value, column) for value, column in zip(row, self.schema.columns)]
+
+    def write_rows(self, rows: Sequence[Sequence[Value]]) -> None:
+        """
+        Each row is encoded locally first, so that a wrong value fails before any call.
+        Chunks are written in order.
+        """
+        for row in rows:
+            self.encode_row(row)
+        self.db.chunked('writeRows', rows, lambda chunk: [self.db.user, self.table_name, list(chunk)])
+
+    def get_rows(self, primary_keys: Sequence[Value]) -> List[List[Value]]:
+        keys = [self.encode_primary_key(k) for k in primary_keys]
+        results = self.db.chunked('getRows', keys, lambda chunk: [self.db.user, self.table_name, list(chunk)],
+                                  concurrent=True)
+        return [self.normalize_row(row) for result in results for row in result]
+
+    def delete_rows(self, primary_keys: Sequence[Value]) -> None:
+        keys = [self.encode_primary_key(k) for k in primary_keys]
+        self.db.chunked('deleteRows', keys, lambda chunk: [self.db.user, self.table_name, list(chunk)])
+
+    def list_rows(self) -> List[List[Value]]:
+        """decode the raw key-value pairs of ListRows locally"""
+        rows = []
+        for key, value in self.db.client.invokefunction('listRows', [self.db.user, self.table_name]):
+            key = as_bytes(key)
+            # key = SEPARATOR + primary key; other keys belong to tables whose names start with this table name
+            if key[:1] != SEPARATOR:
+                continue
+            rows.append(self.decode_row(as_bytes(value), key[1:]))
+        return rows
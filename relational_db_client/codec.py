@@ -0,0 +1,230 @@
+"""
+Local encoding and decoding of rows, matching EncodeSingle/EncodeRow/DecodeRow of the contract,
+the v2 row format (RowFormatV2.cs) and the table descriptor (TableDescriptor.cs).
+"""
+from enum import Enum
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+
+Value = Union[None, bool, int, bytes]
+
+
+class Types(bytes, Enum):
+    UINT160 = b'\x10'
+    UINT256 = b'\x11'
+    Boolean = b'\x20'
+    IntVarLen = b'\x21'
+    ByteStringVarLen = b'\x28'
+    IntFixedLen = b'\x31'
+    ByteStringFixedLen = b'\x38'
+
+    def __add__(self, other):
+        if type(other) == type(self):
+            return self.value + other.value
+        return self.value + other
+
+
+UINT160, UINT256, BOOLEAN, INT_VAR_LEN, BYTESTRING_VAR_LEN, INT_FIXED_LEN, BYTESTRING_FIXED_LEN = \
+    0x10, 0x11, 0x20, 0x21, 0x28, 0x31, 0x38
+INTEGER_TYPES = (INT_VAR_LEN, INT_FIXED_LEN)
+VARIABLE_LENGTH_TYPES = (INT_VAR_LEN, BYTESTRING_VAR_LEN)
+FIXED_LENGTHS = {BOOLEAN: 1, UINT160: 20, UINT256: 32}
+SEPARATOR = b'\x00'  # between the tableKey and the primary key in storage keys
+
+ROW_FORMAT_V1 = 0x01
+ROW_FORMAT_V2 = 0x02
+DESCRIPTOR_AUTO_INC_PRIMARY_KEY = 0x01
+DESCRIPTOR_ROW_FORMAT_V2 = 0x02
+DESCRIPTOR_IN_PRIMARY_KEY = 0xff
+DESCRIPTOR_HEADER_LENGTH = 2
+DESCRIPTOR_COLUMN_LENGTH = 5
+
+
+class Column(NamedTuple):
+    type: int
+    length: int  # only for INT_FIXED_LEN and BYTESTRING_FIXED_LEN; 0 otherwise
+
+
+class Schema(NamedTuple):
+    columns: List[Column]
+    auto_inc_primary_key: bool
+    row_format: int
+
+    @property
+    def stored_columns(self) -> List[Column]:
+        """columns stored in the row; the primary key column of a table without auto-increment primary key is not"""
+        return self.columns if self.auto_inc_primary_key else self.columns[1:]
+
+
+def as_bytes(r: Union[None, str, bytes]) -> Optional[bytes]:
+    """fairy returns a ByteString as str if it can be decoded in UTF-8"""
+    if r is None:
+        return None
+    return r.encode() if type(r) is str else bytes(r)
+
+
+def as_int(r: Union[None, int, str, bytes]) -> Optional[int]:
+    if r is None or type(r) is int:
+        return r
+    return int.from_bytes(as_bytes(r), 'little', signed=True)
+
+
+def int_to_bytes(i: int) -> bytes:
+    """the shortest little-endian two's complement, as (ByteString)BigInteger in NeoVM"""
+    if i == 0:
+        return b''
+    return i.to_bytes(((i if i >= 0 else ~i).bit_length() + 8) // 8, 'little', signed=True)
+
+
+def parse_column_types(column_types: Union[str, bytes]) -> List[Column]:
+    column_types = as_bytes(column_types)
+    columns, i = [], 0
+    while i < len(column_types):
+        type_ = column_types[i]
+        if type_ in (INT_FIXED_LEN, BYTESTRING_FIXED_LEN):
+            columns.append(Column(type_, column_types[i + 1]))
+            i += 2
+        elif type_ in FIXED_LENGTHS or type_ in VARIABLE_LENGTH_TYPES:
+            columns.append(Column(type_, 0))
+            i += 1
+        else:
+            raise ValueError(f'Invalid type {type_:#x}')
+    return columns
+
+
+def parse_descriptor(descriptor: Union[str, bytes]) -> Schema:
+    descriptor = as_bytes(descriptor)
+    flags, count = descriptor[0], descriptor[1]
+    columns = []
+    for column in range(count):
+        offset = DESCRIPTOR_HEADER_LENGTH + column * DESCRIPTOR_COLUMN_LENGTH
+        columns.append(Column(descriptor[offset], descriptor[offset + 1]))
+    return Schema(columns, bool(flags & DESCRIPTOR_AUTO_INC_PRIMARY_KEY),
+                  ROW_FORMAT_V2 if flags & DESCRIPTOR_ROW_FORMAT_V2 else ROW_FORMAT_V1)
+
+
+def _pad(data: bytes, length: int, fill: bytes) -> bytes:
+    if len(data) > length:
+        raise ValueError(f'Too long value {data!r}')
+    return data + fill * (length - len(data))
+
+
+def encode_single(value: Value, column: Column) -> bytes:
+    """EncodeSingle of the contract (v1)"""
+    type_, length = column
+    if type_ == BOOLEAN:
+        return b'\x01' if value else b'\x00'
+    if type_ in VARIABLE_LENGTH_TYPES:
+        data = int_to_bytes(value) if type_ == INT_VAR_LEN else as_bytes(value)
+        if len(data) > 0xffff:
+            raise ValueError(f'Too long {len(data)}')
+        return len(data).to_bytes(2, 'little') + data
+    if type_ == INT_FIXED_LEN:
+        return _pad(int_to_bytes(value), length, b'\x00' if value >= 0 else b'\xff')
+    return _pad(as_bytes(value), FIXED_LENGTHS.get(type_, length), b'\x00')
+
+
+def decode_at(data: bytes, offset: int, column: Column) -> Tuple[Value, int]:
+    """DecodeAt of the contract: (decoded value, offset of the next value)"""
+    type_, length = column
+    if type_ == BOOLEAN:
+        return data[offset] > 0, offset + 1
+    if type_ in VARIABLE_LENGTH_TYPES:
+        start = offset + 2
+        end = start + int.from_bytes(data[offset:start], 'little')
+        value = data[start:end]
+        return (int.from_bytes(value, 'little', signed=True) if type_ == INT_VAR_LEN else value), end
+    end = offset + FIXED_LENGTHS.get(type_, length)
+    value = data[offset:end]
+    return (int.from_bytes(value, 'little', signed=True) if type_ == INT_FIXED_LEN else value), end
+
+
+def encode_varint(i: int) -> bytes:
+    """EncodeVarint of the contract: 7 bits per byte, least significant first"""
+    encoded = bytearray()
+    while i >= 0x80:
+        encoded.append(i & 0x7f | 0x80)
+        i >>= 7
+    encoded.append(i)
+    return bytes(encoded)
+
+
+def decode_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    i, shift = 0, 0
+    while True:
+        b = data[offset]
+        offset += 1
+        i |= (b & 0x7f) << shift
+        if b < 0x80:
+            return i, offset
+        shift += 7
+
+
+def encode_primary_key(value: Value, schema: Schema) -> bytes:
+    """storage key of a row, as the contract computes it from the first value of a row"""
+    if schema.auto_inc_primary_key:
+        return int_to_bytes(value)
+    return encode_single(value, schema.columns[0])
+
+
+def encode_row(row: Sequence[Value], schema: Schema) -> bytes:
+    """the value stored at ROWS_PREFIX for the stored columns of a row, in the row format of the table"""
+    columns = schema.stored_columns
+    if len(row) < len(columns):
+        raise ValueError('Wrong column count')
+    if schema.row_format == ROW_FORMAT_V1:
+        return b''.join(encode_single(value, column) for value, column in zip(row, columns))
+    bitmap = bytearray((len(columns) + 7) // 8)
+    values = b''
+    for bit, (value, column) in enumerate(zip(row, columns)):
+        if column.type == BOOLEAN and value or column.type != BOOLEAN and value is None:
+            bitmap[bit // 8] |= 1 << bit % 8
+        if column.type == BOOLEAN or value is None:
+            continue
+        if column.type in VARIABLE_LENGTH_TYPES:
+            data = int_to_bytes(value) if column.type == INT_VAR_LEN else as_bytes(value)
+            values += encode_varint(len(data)) + data
+        else:
+            values += encode_single(value, column)
+    return bytes([ROW_FORMAT_V2]) + bytes(bitmap) + values
+
+
+def decode_row(data: Union[str, bytes], schema: Schema, primary_key: Union[str, bytes]) -> List[Value]:
+    """the whole row, including its primary key column, from the value stored at ROWS_PREFIX"""
+    data, primary_key = as_bytes(data), as_bytes(primary_key)
+    row: List[Value] = []
+    if not schema.auto_inc_primary_key:
+        row.append(decode_at(primary_key, 0, schema.columns[0])[0])
+    columns = schema.stored_columns
+    if schema.row_format == ROW_FORMAT_V1:
+        offset = 0
+        for column in columns:
+            value, offset = decode_at(data, offset, column)
+            row.append(value)
+        return row
+    if data[0] != ROW_FORMAT_V2:
+        raise ValueError('Unknown row format')
+    offset = 1 + (len(columns) + 7) // 8
+    for bit, column in enumerate(columns):
+        flag = data[1 + bit // 8] & (1 << bit % 8) != 0
+        if column.type == BOOLEAN:
+            row.append(flag)
+        elif flag:
+            row.append(None)
+        elif column.type in VARIABLE_LENGTH_TYPES:
+            length, start = decode_varint(data, offset)
+            offset = start + length
+            value = data[start:offset]
+            row.append(int.from_bytes(value, 'little', signed=True) if column.type == INT_VAR_LEN else value)
+        else:
+            value, offset = decode_at(data, offset, column)
+            row.append(value)
+    return row
+
+
+def normalize(value, column: Column) -> Value:
+    """a value returned by the contract through fairy, as the type decode_row returns for the column"""
+    if value is None or column.type == BOOLEAN:
+        return value
+    if column.type in INTEGER_TYPES:
+        return as_int(value)
+    return as_bytes(value)
@@ -0,0 +1,376 @@
+"""
+Off-chain read replica of RelationalDB: contract storage is mirrored by prefix,
+decoded with the table schemas, and materialized into SQLite, one SQL table per contract table,
+with a column c1, c2, ... for each column of the contract table.
+Analytical queries (scans, group-bys, joins) then run locally without any RPC call.
+
+Only the entries needed to rebuild rows are mirrored:
+'t' schemas, 's' descriptors, 'i' row-id counters (auto-increment primary key), 'n' column names, and 'r' rows.
+Index entries ('v'), splay trees (0xe0-0xf5) and B+ trees (0xd0-0xd3) are derived data and are skipped.
+
+Incremental sync over RPC is not delivered: a fairy session exposes no per-block change feed,
+so FairyStorageSource downloads every mirrored prefix on each sync and diffs it with the previous read.
+Only a source with a change log, like LocalStorageNode, applies just the changes after the synced height.
+"""
+import random
+import sqlite3
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .codec import BOOLEAN, INTEGER_TYPES, ROW_FORMAT_V1, SEPARATOR, Schema, Value, as_bytes, as_int, decode_row, \
+    int_to_bytes, normalize, parse_column_types, parse_descriptor
+
+USER_TABLE_NAME_TO_COLUMNS_PREFIX = b't'
+COLUMN_NAME_PREFIX = b'n'
+ROWS_PREFIX = b'r'
+TABLE_ROW_ID_PREFIX = b'i'
+TABLE_DESCRIPTOR_PREFIX = b's'
+USER_LENGTH = 20
+# schemas are applied before the rows of the same batch of changes
+MIRRORED_PREFIXES = [USER_TABLE_NAME_TO_COLUMNS_PREFIX, TABLE_DESCRIPTOR_PREFIX, TABLE_ROW_ID_PREFIX,
+                     COLUMN_NAME_PREFIX, ROWS_PREFIX]
+
+Change = Tuple[bytes, Optional[bytes]]  # storage key, new value or None if deleted
+
+
+class StorageSource(ABC):
+    """Storage of the contract, read by prefix, with the changes after a height"""
+
+    @abstractmethod
+    def height(self) -> int:
+        pass
+
+    @abstractmethod
+    def find(self, prefix: bytes) -> Dict[bytes, bytes]:
+        pass
+
+    @abstractmethod
+    def changes(self, since_height: int) -> Optional[List[Change]]:
+        """
+        the latest value of each key changed after since_height, up to height();
+        None if the source cannot tell, and the replica must read all the mirrored prefixes again
+        """
+
+
+class LocalStorageNode(StorageSource):
+    """
+    A stand-in node holding the storage of a contract in memory.
+    Writes are committed in blocks, and the change of each key is logged with the height of its block.
+    """
+
+    def __init__(self):
+        self.storage: Dict[bytes, bytes] = {}
+        self.sorted_keys: List[bytes] = []
+        self.log: List[Tuple[int, bytes, Optional[bytes]]] = []
+        self.pending: List[Change] = []
+        self._height = 0
+
+    def put(self, key: bytes, value: bytes) -> None:
+        self.pending.append((key, value))
+
+    def delete(self, key: bytes) -> None:
+        self.pending.append((key, None))
+
+    def commit(self) -> int:
+        self._height += 1
+        for key, value in self.pending:
+            if value is None:
+                if self.storage.pop(key, None) is not None:
+                    self.sorted_keys.pop(bisect_left(self.sorted_keys, key))
+            else:
+                if key not in self.storage:
+                    insort(self.sorted_keys, key)
+                self.storage[key] = value
+            self.log.append((self._height, key, value))
+        self.pending = []
+        return self._height
+
+    def height(self) -> int:
+        return self._height
+
+    def find(self, prefix: bytes) -> Dict[bytes, bytes]:
+        found = {}
+        for key in self.sorted_keys[bisect_left(self.sorted_keys, prefix):]:
+            if not key.startswith(prefix):
+                break
+            found[key] = self.storage[key]
+        return found
+
+    def changes(self, since_height: int) -> List[Change]:
+        latest: Dict[bytes, Optional[bytes]] = {}
+        for height, key, value in self.log[bisect_left(self.log, (since_height + 1,)):]:
+            latest[key] = value
+        return list(latest.items())
+
+
+class FairyStorageSource(StorageSource):
+    """
+    Storage of the contract in a fairy session.
+    Fairy has no log of storage changes, so each call of changes() downloads all the mirrored prefixes again
+    and compares them with the previous read. This source is not the path that avoids a full download on each sync;
+    sources with a change log, like LocalStorageNode, are.
+    The previous read lives in memory only: a new FairyStorageSource, e.g. after a restart, has no base to compare with,
+    and its first changes() returns None so that the replica reconciles with a full read.
+    The height counts the reads of this object, and has no relation with the height of the chain.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._height = 0
+        self.last: Optional[Dict[bytes, bytes]] = None
+
+    def height(self) -> int:
+        return self._height
+
+    def _find(self, prefix: bytes) -> Dict[bytes, bytes]:
+        return {as_bytes(k): as_bytes(v) for k, v in self.client.find_storage_with_session(prefix).items()}
+
+    def find(self, prefix: bytes) -> Dict[bytes, bytes]:
+        """the entries found are the base of the next changes()"""
+        found = self._find(prefix)
+        if self.last is None:
+            self.last = {}
+        self.last.update(found)
+        return found
+
+    def read_mirrored(self) -> Dict[bytes, bytes]:
+        current = {}
+        for prefix in MIRRORED_PREFIXES:
+            current.update(self._find(prefix))
+        return current
+
+    def changes(self, since_height: int) -> Optional[List[Change]]:
+        if self.last is None:
+            return None
+        current = self.read_mirrored()
+        changes = [(k, v) for k, v in current.items() if self.last.get(k) != v]
+        changes += [(k, None) for k in self.last.keys() - current.keys()]
+        self.last = current
+        self._height += 1
+        return changes
+
+
+def split_table_key(key: bytes) -> Tuple[bytes, bytes]:
+    """(tableKey = user + tableName, the rest after SEPARATOR) of a storage key without its prefix byte"""
+    separator = key.index(SEPARATOR, USER_LENGTH)
+    return key[:separator], key[separator + 1:]
+
+
+def to_sql(value: Value, type_: int):
+    if type(value) is int and type_ in INTEGER_TYPES and not -2**63 <= value < 2**63:
+        return str(value)  # beyond the INTEGER of SQLite
+    return value
+
+
+def from_sql(value, type_: int) -> Value:
+    if value is None:
+        return None
+    if type_ == BOOLEAN:
+        return bool(value)
+    if type_ in INTEGER_TYPES:
+        return int(value)
+    return bytes(value)
+
+
+class Replica:
+    def __init__(self, source: StorageSource, path: str = ':memory:'):
+        self.source = source
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS _sync (height INTEGER);
+            CREATE TABLE IF NOT EXISTS _tables (table_key BLOB PRIMARY KEY, user BLOB, name BLOB, sql_name TEXT,
+                column_types BLOB, descriptor BLOB, auto_inc INTEGER);
+            CREATE TABLE IF NOT EXISTS _column_names (table_key BLOB, name BLOB, column_id INTEGER,
+                PRIMARY KEY (table_key, name));
+        ''')
+        self.schemas: Dict[bytes, Schema] = {}
+        for table_key, column_types, descriptor, auto_inc in self.db.execute(
+                'SELECT table_key, column_types, descriptor, auto_inc FROM _tables'):
+            self.schemas[table_key] = self._schema(column_types, descriptor, auto_inc)
+
+    @property
+    def height(self) -> Optional[int]:
+        row = self.db.execute('SELECT height FROM _sync').fetchone()
+        return None if row is None else row[0]
+
+    def sync(self) -> int:
+        """
+        Download the mirrored prefixes at the first call, or when the source cannot tell the changes after the synced height;
+        otherwise apply only the changes after the synced height.
+        :return: the synced height
+        """
+        height = self.height
+        changes = None if height is None else self.source.changes(height)
+        if changes is None:
+            found = {}
+            for prefix in MIRRORED_PREFIXES:
+                found.update(self.source.find(prefix))
+            changes = self._reconcile(found)
+        height = self.source.height()
+        self.apply(changes)
+        self.db.execute('DELETE FROM _sync')
+        self.db.execute('INSERT INTO _sync VALUES (?)', (height,))
+        self.db.commit()
+        return height
+
+    def apply(self, changes: Iterable[Change]) -> None:
+        changes = sorted(changes, key=lambda change: MIRRORED_PREFIXES.index(change[0][:1])
+                         if change[0][:1] in MIRRORED_PREFIXES else len(MIRRORED_PREFIXES))
+        for key, value in changes:
+            prefix, key = key[:1], key[1:]
+            if prefix == USER_TABLE_NAME_TO_COLUMNS_PREFIX:
+                if value is None:
+                    self._drop_table(key)
+                else:
+                    self._create_table(key, column_types=value)
+            elif prefix == TABLE_DESCRIPTOR_PREFIX:
+                if value is not None and key in self.schemas:
+                    self._create_table(key, descriptor=value)
+            elif prefix == TABLE_ROW_ID_PREFIX:
+                # tables created before descriptors: the row-id counter tells the auto-increment primary key
+                if value is not None and key in self.schemas:
+                    self._create_table(key, auto_inc=True)
+            elif prefix == COLUMN_NAME_PREFIX:
+                table_key, name = split_table_key(key)
+                if value is None:
+                    self.db.execute('DELETE FROM _column_names WHERE table_key = ? AND name = ?', (table_key, name))
+                else:
+                    self.db.execute('INSERT OR REPLACE INTO _column_names VALUES (?, ?, ?)', (table_key, name, as_int(value)))
+            elif prefix == ROWS_PREFIX:
+                table_key, primary_key = split_table_key(key)
+                if table_key not in self.schemas:
+                    continue  # rows of a dropped table, until PurgeDroppedTable deletes them
+                if value is None:
+                    self.db.execute(f'DELETE FROM "{self.sql_name(table_key)}" WHERE pk = ?', (primary_key,))
+                else:
+                    self._write_row(table_key, primary_key, value)
+
+    def _reconcile(self, found: Dict[bytes, bytes]) -> List[Change]:
+        """
+        Changes from the local tables to a full read of the mirrored prefixes:
+        every entry found, and a deletion of each local table, column name and row missing from it.
+        """
+        changes: List[Change] = []
+        for table_key in list(self.schemas):
+            if USER_TABLE_NAME_TO_COLUMNS_PREFIX + table_key not in found:
+                changes.append((USER_TABLE_NAME_TO_COLUMNS_PREFIX + table_key, None))
+                continue
+            for primary_key, in self.db.execute(f'SELECT pk FROM "{self.sql_name(table_key)}"'):
+                if ROWS_PREFIX + table_key + SEPARATOR + primary_key not in found:
+                    changes.append((ROWS_PREFIX + table_key + SEPARATOR + primary_key, None))
+        for table_key, name in self.db.execute('SELECT table_key, name FROM _column_names'):
+            if COLUMN_NAME_PREFIX + table_key + SEPARATOR + name not in found:
+                changes.append((COLUMN_NAME_PREFIX + table_key + SEPARATOR + name, None))
+        return changes + list(found.items())
+
+    @staticmethod
+    def _schema(column_types: bytes, descriptor: Optional[bytes], auto_inc: bool) -> Schema:
+        if descriptor is not None:
+            return parse_descriptor(descriptor)
+        return Schema(parse_column_types(column_types), bool(auto_inc), ROW_FORMAT_V1)
+
+    @staticmethod
+    def sql_name(table_key: bytes) -> str:
+        return table_key[:USER_LENGTH].hex() + '_' + table_key[USER_LENGTH:].hex()
+
+    def _create_table(self, table_key: bytes, column_types: Optional[bytes] = None,
+                      descriptor: Optional[bytes] = None, auto_inc: Optional[bool] = None) -> None:
+        """create the table, or update its schema with the given parts"""
+        row = self.db.execute('SELECT column_types, descriptor, auto_inc FROM _tables WHERE table_key = ?', (table_key,)).fetchone()
+        if row is not None and column_types is not None and column_types != row[0]:
+            # dropped, purged and created again with other columns since the last sync
+            self._drop_table(table_key)
+            row = None
+        if row is not None:
+            column_types = column_types if column_types is not None else row[0]
+            descriptor = descriptor if descriptor is not None else row[1]
+            auto_inc = auto_inc if auto_inc is not None else row[2]
+        schema = self._schema(column_types, descriptor, auto_inc)
+        sql_name = self.sql_name(table_key)
+        self.db.execute('INSERT OR REPLACE INTO _tables VALUES (?, ?, ?, ?, ?, ?, ?)', (
+            table_key, table_key[:USER_LENGTH], table_key[USER_LENGTH:], sql_name, column_types, descriptor, bool(auto_inc)))
+        columns = ', '.join(f'c{i + 1}' for i in range(len(schema.columns)))
+        self.db.execute(f'CREATE TABLE IF NOT EXISTS "{sql_name}" (pk BLOB PRIMARY KEY, {columns})')
+        self.schemas[table_key] = schema
+
+    def _drop_table(self, table_key: bytes) -> None:
+        self.db.execute(f'DROP TABLE IF EXISTS "{self.sql_name(table_key)}"')
+        self.db.execute('DELETE FROM _tables WHERE table_key = ?', (table_key,))
+        self.db.execute('DELETE FROM _column_names WHERE table_key = ?', (table_key,))
+        self.schemas.pop(table_key, None)
+
+    def _write_row(self, table_key: bytes, primary_key: bytes, data: bytes) -> None:
+        schema = self.schemas[table_key]
+        row = decode_row(data, schema, primary_key)
+        values = [to_sql(value, column.type) for value, column in zip(row, schema.columns)]
+        self.db.execute(f'INSERT OR REPLACE INTO "{self.sql_name(table_key)}" VALUES ({", ".join("?" * (len(values) + 1))})',
+                        [primary_key] + values)
+
+    def table_key(self, user, table_name: str) -> bytes:
+        """user as a Hash160Str, or as the 20 bytes stored in the keys"""
+        if type(user) is not bytes:
+            user = bytes.fromhex(str(user)[2:])[::-1]
+        return user + table_name.encode()
+
+    def query(self, sql: str, parameters: Sequence = ()) -> List[tuple]:
+        return self.db.execute(sql, parameters).fetchall()
+
+    def get_rows(self, table_key: bytes, primary_keys: Sequence[bytes]) -> List[Optional[List[Value]]]:
+        schema = self.schemas[table_key]
+        rows = []
+        for primary_key in primary_keys:
+            row = self.db.execute(f'SELECT * FROM "{self.sql_name(table_key)}" WHERE pk = ?', (primary_key,)).fetchone()
+            rows.append(None if row is None else [from_sql(v, column.type) for v, column in zip(row[1:], schema.columns)])
+        return rows
+
+    def validate(self, client, user, table_name: str, sample: int = 20, seed: int = 0) -> List[bytes]:
+        """
+        Compare a sample of rows with the contract, without iterating the table in the VM.
+        Up to sample local keys are read with one getRows call, and with getRow one by one only if some of them are
+        missing on chain. Rows missing locally are looked for among up to sample candidate keys:
+        row ids below the row-id counter of an auto-increment table, checked with getRow one by one,
+        or else the keys of storage windows, one byte after the rows prefix of the table, read in random order by RPC.
+        :return: primary keys of the rows that differ or that exist only on one side
+        """
+        table_key = self.table_key(user, table_name)
+        schema = self.schemas[table_key]
+        rng = random.Random(seed)
+        local_keys = [row[0] for row in self.db.execute(f'SELECT pk FROM "{self.sql_name(table_key)}"')]
+        local_key_set = set(local_keys)
+
+        def remote_row(primary_key: bytes) -> Optional[List[Value]]:
+            remote = client.invokefunction('getRow', [user, table_name, primary_key], do_not_raise_on_result=True)
+            if not isinstance(remote, list):  # the fault of a row missing on chain
+                return None
+            return [normalize(v, column) for v, column in zip(remote, schema.columns)]
+
+        mismatches = []
+        primary_keys = rng.sample(local_keys, min(sample, len(local_keys)))
+        if primary_keys:
+            remote_rows = client.invokefunction('getRows', [user, table_name, primary_keys], do_not_raise_on_result=True)
+            if isinstance(remote_rows, list):
+                remote_rows = [[normalize(v, column) for v, column in zip(remote, schema.columns)] for remote in remote_rows]
+            else:  # the fault of some row missing on chain
+                remote_rows = [remote_row(primary_key) for primary_key in primary_keys]
+            for primary_key, row, remote in zip(primary_keys, self.get_rows(table_key, primary_keys), remote_rows):
+                if remote != row:
+                    mismatches.append(primary_key)
+
+        if schema.auto_inc_primary_key:
+            row_ids = range(1, as_int(client.invokefunction('getRowId', [user, table_name])) or 1)
+            candidates = [k for k in map(int_to_bytes, rng.sample(row_ids, min(sample, len(row_ids))))
+                          if k not in local_key_set]
+            mismatches += [k for k in candidates if remote_row(k) is not None]
+        else:
+            prefix = ROWS_PREFIX + table_key + SEPARATOR
+            windows = list(range(256))
+            rng.shuffle(windows)
+            seen = 0
+            for window in windows:
+                if seen >= sample:
+                    break
+                keys = [as_bytes(k)[len(prefix):] for k in client.find_storage_with_session(prefix + bytes([window]))]
+                seen += len(keys)
+                mismatches += [k for k in keys if k not in local_key_set]
+        return mismatches
@@ -22,6 +22,8 @@ assert 'Too long value' in c.invokefunction('encodeIntegerFixedLength', [2**31,
 assert 'Too long value' in c.invokefunction('encodeIntegerFixedLength', [-2**31-1, 4], do_not_raise_on_result=True)
 assert c.invokefunction('decodeIntegerFixedLength', [c.invokefunction('encodeIntegerFixedLength', [2**31-1, 4]), 4]) == (2**31-1, '')
 assert c.invokefunction('decodeIntegerFixedLength', [c.invokefunction('encodeIntegerFixedLength', [-2**31, 4]), 4]) == (-2**31, '')
+for v in [0, 1, -1, 127, 128, -128, -129, 2**64, -2**64]:
+    assert c.invokefunction('decodeIndexInteger', [c.invokefunction('encodeIndexInteger', [v])]) == (v, '')
 
 
 class Types(bytes, Enum):
@@ -73,6 +75,11 @@ assert c.invokefunction('getRows', [user, table_name, [1, 2]]) == [[False, 23333
 assert c.invokefunction('getRow', [user, table_name, 1]) == [False, 23333, 'test str', 2147483647, '0123456789abcdef0123456789abcdef']
 assert c.invokefunction('getRow', [user, table_name, 2]) == [True, 233, 'test str 233', 2147483646, '12345678901234567890\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00']
 assert 'No data' in c.invokefunction('getRow', [user, table_name, 0], do_not_raise_on_result=True)
+# flags, column count, (type, length, anchor, delta) of each column, variable-length columns
+assert c.invokefunction('getDescriptor', [user, table_name]) == '\x01\x05' '\x20\x00\x00\x00\x00' '\x21\x00\x00\x01\x00' '\x28\x00\x01\x00\x00' '\x31\x04\x02\x00\x00' '\x38\x20\x02\x04\x00' '\x01\x02'
+assert c.invokefunction('getColumns', [user, table_name, [1, 2], b'\x05\x02']) == [['0123456789abcdef0123456789abcdef', 23333], ['12345678901234567890\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00', 233]]
+assert c.invokefunction('getColumns', [user, table_name, [2], b'\x01\x04']) == [[True, 2147483646]]
+assert 'No column' in c.invokefunction('getColumns', [user, table_name, [1], b'\x06'], do_not_raise_on_result=True)
 assert len(c.invokefunction('listRows', [user, table_name])) == 2
 
 assert c.invokefunction('splayGetSize', [user, table_name, 2]) == 2
@@ -133,6 +140,11 @@ assert c.invokefunction('getRow', [user, table_name, data[2][0]]) == ['\x02\x00\
 assert c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 3, 1]) == ['\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00']
 c.invokefunction('writeRow', [user, table_name, [Hash160Str('0x'+'00'*19+'03'), Hash256Str('0x'+'00'*31+'03'), -3]])
 assert set(c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 3, -3])) == {'\x02\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00', '\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'}
+pk = lambda i: chr(i) + '\x00' * 19
+assert c.invokefunction('selectRange', [user, table_name, 3, -3, 0, False, 0]) == [pk(2), pk(3), pk(1)]
+assert c.invokefunction('selectRange', [user, table_name, 3, -2, 1, False, 0]) == [pk(1), pk(0)]
+assert c.invokefunction('selectRange', [user, table_name, 3, -100, 100, True, 2]) == [pk(0), pk(1)]
+assert c.invokefunction('selectRange', [user, table_name, 3, 2, 100, False, 0]) == []
 r"""
 -3
  -2
@@ -207,6 +219,181 @@ assert c.invokefunction('getRows', [user, table_name, [d[0] for d in data]]) ==
 c.invokefunction('writeRow', [user, table_name, [0x04030204, -4]])
 assert c.invokefunction('getRow', [user, table_name, data[0][0]]) == data[0]
 assert c.invokefunction('getRow', [user, table_name, 0x04030204]) == [0x04030204, -4]
+assert c.invokefunction('getColumns', [user, table_name, [0x04030204, 0x04030201], b'\x02\x01']) == [[-4, 0x04030204], [-1, 0x04030201]]
+
+c.invokefunction('bulkWriteRows', [user, table_name, [[0x04030201, -5], [0x04030205, -6]], False])
+assert c.invokefunction('getRows', [user, table_name, [0x04030201, 0x04030205]]) == [[0x04030201, -5], [0x04030205, -6]]
+assert len(c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 2, -1])) == 0
+assert c.invokefunction('splayGetSize', [user, table_name, 2]) == 5
+assert 'Duplicate primary key' in c.invokefunction('bulkWriteRows', [user, table_name, [[0x04030206, 1], [0x04030206, 2]], False], do_not_raise_on_result=True)
+
+as_int = lambda r: int.from_bytes(r.encode() if type(r) is str else r, 'little', signed=True)
+table_name = 'bulkLoad'
+assert c.invokefunction(
+    'createTable', [
+        user, table_name,
+        Types.IntFixedLen + b'\x04' + Types.IntVarLen,
+        True
+    ]) == 2
+c.invokefunction('bulkWriteRows', [user, table_name, data := [[i, -i] for i in range(5)], True])
+assert c.invokefunction('getRowId', [user, table_name]) == 6
+assert c.invokefunction('getRows', [user, table_name, [1, 2, 3, 4, 5]]) == data
+c.invokefunction('bulkWriteRows', [user, table_name, [[i, -i] for i in range(5, 10)], True])  # hung below max and min
+assert c.invokefunction('splayGetRoot', [user, table_name, 2]) == -4
+c.invokefunction('bulkWriteRows', [user, table_name, [[2, 100], [2, -100]], True])  # hung in two gaps, no splaying
+assert c.invokefunction('splayGetRoot', [user, table_name, 2]) == -4
+assert c.invokefunction('splayGetSubtreeCount', [user, table_name, 2, -4]) == 12
+assert c.invokefunction('splayGetSubtreeSum', [user, table_name, 2, -4]) == -45
+assert c.invokefunction('splayGetSize', [user, table_name, 1]) == 12
+assert c.invokefunction('splayGetNodeCount', [user, table_name, 1, 2]) == 3
+assert as_int(c.invokefunction('splayMax', [user, table_name, 1, None])) == 9
+assert as_int(c.invokefunction('splayMin', [user, table_name, 2, None])) == -100
+assert as_int(c.invokefunction('splaySuccessor', [user, table_name, 2, 0])) == 100
+assert as_int(c.invokefunction('splayPredecessor', [user, table_name, 2, -9])) == -100
+for v in range(1, 9):
+    assert as_int(c.invokefunction('splaySuccessor', [user, table_name, 1, v])) == v + 1
+    assert as_int(c.invokefunction('splayPredecessor', [user, table_name, 2, -v])) == -v - 1
+assert c.invokefunction('selectRange', [user, table_name, 1, 2, 2, False, 0]) == ['\x03', '\x0b', '\x0c']
+# bounds of different encoded lengths and signs
+assert c.invokefunction('selectRange', [user, table_name, 2, -100, 100, False, 0]) == [chr(i) for i in [12, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1, 11]]
+assert c.invokefunction('selectRange', [user, table_name, 2, -5, 1000, True, 3]) == [chr(i) for i in [11, 1, 2]]
+assert c.invokefunction('selectRange', [user, table_name, 2, -99, -10, False, 0]) == []
+assert c.invokefunction('selectRange', [user, table_name, 2, 1000, 2000, False, 0]) == []
+# rowIds 13 to 17 spread over more markers; the extreme values make an open range, one Find per marker
+c.invokefunction('writeRows', [user, table_name, [[0, 2**40], [0, -2**40], [0, 70000], [0, 2**255 - 1], [0, -2**255]]])
+ordered = [17, 14, 12, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1, 11, 15, 13, 16]
+assert c.invokefunction('selectRange', [user, table_name, 2, -2**255, 2**255 - 1, False, 0]) == [chr(i) for i in ordered]
+assert c.invokefunction('selectRange', [user, table_name, 2, -2**255, 2**255 - 1, True, 3]) == [chr(i) for i in [16, 13, 15]]
+assert c.invokefunction('selectRange', [user, table_name, 2, -2**40, 70000, True, 0]) == [chr(i) for i in ordered[1:-2][::-1]]
+assert c.invokefunction('selectRange', [user, table_name, 2, -2**40 + 1, 2**40 - 1, False, 0]) == [chr(i) for i in ordered[2:-2]]
+
+INDEX_NONE, INDEX_EQUALITY, INDEX_ORDERED = 0, 1, 2
+table_name = 'indexSpec'
+assert 'Index on non-integer column' in c.invokefunction('createTable', [user, table_name, Types.IntVarLen + Types.ByteStringVarLen + Types.IntVarLen, True, b'\x00\x01\x00'], do_not_raise_on_result=True)
+assert 'Wrong index spec length' in c.invokefunction('createTable', [user, table_name, Types.IntVarLen + Types.ByteStringVarLen + Types.IntVarLen, True, b'\x01\x00'], do_not_raise_on_result=True)
+assert c.invokefunction('createTable', [user, table_name, Types.IntVarLen + Types.ByteStringVarLen + Types.IntVarLen, True, bytes([INDEX_EQUALITY, INDEX_NONE, INDEX_NONE])]) == 3
+assert c.invokefunction('getIndexSpec', [user, table_name]) == '\x01\x00\x00'
+assert c.invokefunction('getIndexSpec', [user, 'FixedLenPrimaryKey']) == '\x02\x02'
+c.invokefunction('bulkWriteRows', [user, table_name, [[i, 'row', i * 10] for i in range(5)], True])
+assert c.invokefunction('splayGetSize', [user, table_name, 1]) == 0
+assert c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 1, 2]) == ['\x03']
+assert c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 3, 20]) == []
+assert c.invokefunction('createIndex', [user, table_name, 3, INDEX_ORDERED, 2]) == False
+c.invokefunction('writeRow', [user, table_name, [5, 'row', 5]])  # beyond the backfill cursor
+c.invokefunction('deleteRow', [user, table_name, 1])  # within the backfill cursor
+for _ in range(5):
+    if c.invokefunction('createIndex', [user, table_name, 3, INDEX_ORDERED, 2]):
+        break
+assert c.invokefunction('getIndexSpec', [user, table_name]) == '\x01\x00\x02'
+assert c.invokefunction('selectRange', [user, table_name, 3, -100, 100, False, 0]) == ['\x06', '\x02', '\x03', '\x04', '\x05']
+assert c.invokefunction('splayGetSize', [user, table_name, 3]) == 5
+assert as_int(c.invokefunction('splayMin', [user, table_name, 3, None])) == 5
+assert 'Index already created' in c.invokefunction('createIndex', [user, table_name, 3, INDEX_ORDERED, 2], do_not_raise_on_result=True)
+for _ in range(10):
+    if c.invokefunction('dropIndex', [user, table_name, 3, 3]):
+        break
+assert c.invokefunction('getIndexSpec', [user, table_name]) == '\x01\x00\x00'
+assert c.invokefunction('selectRange', [user, table_name, 3, -100, 100, False, 0]) == []
+assert c.invokefunction('splayGetSize', [user, table_name, 3]) == 0
+assert c.invokefunction('splayGetRoot', [user, table_name, 3]) == 0
+assert 'No index' in c.invokefunction('dropIndex', [user, table_name, 3, 3], do_not_raise_on_result=True)
+c.invokefunction('writeRow', [user, table_name, [6, 'row', 6]])
+assert c.invokefunction('splayGetSize', [user, table_name, 3]) == 0
+
+# resumed from the cursor key of a table without auto-increment primary key, over keys differing in several bytes
+table_name = 'createIndexKeys'
+c.invokefunction('createTable', [user, table_name, Types.IntFixedLen + b'\x04' + Types.IntVarLen, False, bytes([INDEX_NONE, INDEX_NONE])])
+c.invokefunction('writeRows', [user, table_name, [[k, k % 7] for k in range(0, 600, 3)]])
+assert c.invokefunction('createIndex', [user, table_name, 2, INDEX_EQUALITY, 50]) == False
+c.invokefunction('writeRows', [user, table_name, [[1, 100], [599, 100]]])  # on both sides of the cursor
+for calls in range(10):
+    if c.invokefunction('createIndex', [user, table_name, 2, INDEX_EQUALITY, 50]):
+        break
+assert calls == 3  # 151 rows left after the first call
+assert len(c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 2, 100])) == 2
+for v in range(7):
+    assert len(c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 2, v])) == len([k for k in range(0, 600, 3) if k % 7 == v])
+
+table_name = 'updateRow'
+assert c.invokefunction(
+    'createTable', [
+        user, table_name,
+        Types.IntFixedLen + b'\x04' + Types.IntVarLen + Types.ByteStringVarLen + Types.IntFixedLen + b'\x04' + Types.Boolean,
+        False
+    ]) == 5
+c.invokefunction('writeRows', [user, table_name, data := [
+    [0x04030201, 10, 'a', 100, False],
+    [0x04030202, 20, 'bb', 200, True],
+]])
+c.invokefunction('updateRow', [user, table_name, 0x04030201, b'\x03\x02', ['ccc', 11]])
+assert c.invokefunction('getRows', [user, table_name, [d[0] for d in data]]) == [[0x04030201, 11, 'ccc', 100, False], data[1]]
+assert c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 2, 10]) == []
+assert c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 2, 11]) == ['\x01\x02\x03\x04']
+assert c.invokefunction('splayGetSize', [user, table_name, 2]) == 2
+assert as_int(c.invokefunction('splayPredecessor', [user, table_name, 2, 20])) == 11
+c.invokefunction('updateRow', [user, table_name, 0x04030201, b'\x02\x05', [11, False]])  # nothing changed
+assert c.invokefunction('getRow', [user, table_name, 0x04030201]) == [0x04030201, 11, 'ccc', 100, False]
+assert 'Cannot update primary key' in c.invokefunction('updateRow', [user, table_name, 0x04030201, b'\x01', [0x04030203]], do_not_raise_on_result=True)
+assert 'Duplicate column' in c.invokefunction('updateRow', [user, table_name, 0x04030201, b'\x02\x02', [1, 2]], do_not_raise_on_result=True)
+assert 'No data' in c.invokefunction('updateRow', [user, table_name, 0x04030203, b'\x02', [1]], do_not_raise_on_result=True)
+c.invokefunction('updateRows', [user, table_name, [d[0] for d in data], b'\x04\x05', [[101, True], [-201, False]]])
+assert c.invokefunction('getRows', [user, table_name, [d[0] for d in data]]) == [[0x04030201, 11, 'ccc', 101, True], [0x04030202, 20, 'bb', -201, False]]
+assert as_int(c.invokefunction('splayMin', [user, table_name, 4, None])) == -201
+assert as_int(c.invokefunction('splayMax', [user, table_name, 4, None])) == 101
+assert c.invokefunction('splayGetSize', [user, table_name, 4]) == 2
+assert c.invokefunction('getColumns', [user, table_name, [0x04030202], b'\x05\x04\x03']) == [[False, -201, 'bb']]
+
+table_name = 'rowFormatV2'
+column_types = Types.IntFixedLen + b'\x04' + Types.IntVarLen + Types.ByteStringVarLen + Types.Boolean + Types.Boolean + Types.IntFixedLen + b'\x02'
+assert 'Invalid row format' in c.invokefunction('createTable', [user, table_name, column_types, False, None, 3], do_not_raise_on_result=True)
+assert c.invokefunction('createTable', [user, table_name, column_types, False, None, 2]) == 6
+assert c.invokefunction('getDescriptor', [user, table_name])[:2] == '\x02\x06'
+c.invokefunction('writeRows', [user, table_name, data := [
+    [0x04030201, 10, 'a', True, False, -2],
+    [0x04030202, None, None, False, True, None],
+    [0x04030203, 2**40, 'c' * 200, True, True, 3],
+]])
+rows = [r[1].encode() if type(r[1]) is str else r[1] for r in c.invokefunction('listRows', [user, table_name])]
+# version, bitmap (10, 'a' not NULL; True, False; -2 not NULL), varint + 10, varint + 'a', -2 in 2 bytes
+assert rows[0] == b'\x02\x04\x01\x0a\x01a\xfe\xff'
+# version, bitmap (NULL, NULL; False, True; NULL)
+assert rows[1] == b'\x02\x1b'
+assert len(rows[2]) == 1 + 1 + 1 + 6 + 2 + 200 + 2
+assert c.invokefunction('getRows', [user, table_name, [d[0] for d in data]]) == data
+assert c.invokefunction('getColumns', [user, table_name, [d[0] for d in data], b'\x06\x03\x05']) == [[d[5], d[2], d[4]] for d in data]
+assert c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 2, 10]) == ['\x01\x02\x03\x04']
+assert c.invokefunction('splayGetSize', [user, table_name, 2]) == 2
+c.invokefunction('updateRow', [user, table_name, 0x04030202, b'\x02\x04\x03', [20, True, 'bb']])
+c.invokefunction('updateRow', [user, table_name, 0x04030201, b'\x02\x06', [None, -2]])
+assert c.invokefunction('getRows', [user, table_name, [d[0] for d in data[:2]]]) == [
+    [0x04030201, None, 'a', True, False, -2], [0x04030202, 20, 'bb', True, True, None]]
+assert c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 2, 10]) == []
+assert c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 2, 20]) == ['\x02\x02\x03\x04']
+assert c.invokefunction('splayGetSize', [user, table_name, 2]) == 2
+c.invokefunction('deleteRows', [user, table_name, [d[0] for d in data]])
+assert c.invokefunction('splayGetSize', [user, table_name, 2]) == 0
+assert c.invokefunction('splayGetSize', [user, table_name, 6]) == 0
+
+table_name = 'purge'
+column_types = Types.IntFixedLen + b'\x04' + Types.IntVarLen + Types.ByteStringVarLen
+assert c.invokefunction('createTable', [user, table_name, column_types, False]) == 3
+c.invokefunction('setColumnNames', [user, table_name, ['id', 'value', 'name']])
+c.invokefunction('writeRows', [user, table_name, data := [[i, i % 7, 'row %d' % i] for i in range(20)]])
+assert 'No dropped table' in c.invokefunction('purgeDroppedTable', [user, table_name, 10], do_not_raise_on_result=True)
+c.invokefunction('dropTable', [user, table_name])
+dropped_tables = len(c.invokefunction('listAllDroppedTables'))
+assert 'Table already dropped' in c.invokefunction('createTable', [user, table_name, column_types, False], do_not_raise_on_result=True)
+calls = 1
+while not c.invokefunction('purgeDroppedTable', [user, table_name, 10]):
+    calls += 1
+assert calls > 2
+assert len(c.invokefunction('listAllDroppedTables')) == dropped_tables - 1
+assert 'No dropped table' in c.invokefunction('purgeDroppedTable', [user, table_name, 10], do_not_raise_on_result=True)
+assert c.invokefunction('createTable', [user, table_name, column_types, False]) == 3
+assert len(c.invokefunction('listRows', [user, table_name])) == 0
+assert c.invokefunction('splayGetSize', [user, table_name, 2]) == 0
+assert c.invokefunction('findPrimaryKeyFromValue', [user, table_name, 2, 0]) == []
+assert c.invokefunction('getColumnTypeByName', [user, table_name, 'value']) == None
 
 coverage = {k: v for k, v in c.get_contract_source_code_coverage().items() if 'Undefined' not in k}
 opcode_count = sum(len(v) for v in coverage.values())
@@ -0,0 +1,90 @@
+from neo_fairy_client import FairyClient, Hash160Str
+import random
+user = Hash160Str('0xb1983fa2479a0c8e2beae032d2df564b5451b7a5')
+c = FairyClient(fairy_session='btree', wallet_address_or_scripthash=user, with_print=False)
+c.virutal_deploy_from_path('./bin/sc/RelationalDB.nef')
+as_int = lambda r: None if r is None else int.from_bytes(r.encode() if type(r) is str else r, 'little', signed=True)
+
+table_name = 'btree'
+column_id = 0x02
+INDEX_ENGINE_BTREE = 1
+assert c.invokefunction('createTable', [user, table_name, b'\x31\x04\x21', False]) == 2  # int32 primary key, int
+c.invokefunction('setIndexEngine', [user, table_name, column_id, INDEX_ENGINE_BTREE])
+assert c.invokefunction('getIndexEngine', [user, table_name, column_id]) == INDEX_ENGINE_BTREE
+
+random.seed(0)
+rows = {0x01000000 + i: random.randint(-300, 300) for i in range(200)}  # 4-byte primary keys
+# enough distinct values to split nodes
+c.invokefunction('bulkWriteRows', [user, table_name, [[k, v] for k, v in list(rows.items())[:100]], True])
+for k, v in list(rows.items())[100:]:
+    c.invokefunction('writeRow', [user, table_name, [k, v]])
+assert c.invokefunction('splayGetSize', [user, table_name, column_id]) == 0
+assert 'Index not empty' in c.invokefunction('setIndexEngine', [user, table_name, column_id, 0], do_not_raise_on_result=True)
+
+
+def check():
+    values = sorted(rows.values())
+    assert c.invokefunction('bTreeGetSize', [user, table_name, column_id]) == len(values)
+    assert as_int(c.invokefunction('indexMin', [user, table_name, column_id])) == values[0]
+    assert as_int(c.invokefunction('indexMax', [user, table_name, column_id])) == values[-1]
+    for x in random.sample(range(-310, 310), 30):
+        assert as_int(c.invokefunction('indexPredecessor', [user, table_name, column_id, x])) == max((v for v in values if v < x), default=None)
+        assert as_int(c.invokefunction('indexSuccessor', [user, table_name, column_id, x])) == min((v for v in values if v > x), default=None)
+        if x in values:
+            assert c.invokefunction('indexFind', [user, table_name, column_id, x]) == values.count(x)
+        else:
+            assert 'No value' in c.invokefunction('indexFind', [user, table_name, column_id, x], do_not_raise_on_result=True)
+
+
+check()
+root = c.invokefunction('bTreeGetRoot', [user, table_name, column_id])
+is_leaf, keys, children = c.invokefunction('bTreeGetNode', [user, table_name, column_id, root])
+assert not is_leaf and len(children) == len(keys) + 1
+
+deleted = [k for k in rows if rows[k] < 0]  # empties many leaves
+c.invokefunction('deleteRows', [user, table_name, deleted])
+for k in deleted:
+    del rows[k]
+check()
+c.invokefunction('writeRow', [user, table_name, [0x01000000, -1000]])
+rows[0x01000000] = -1000
+check()
+
+# queue pattern: insert increasing values, delete the smallest; no empty leaf is left behind
+queue_table = 'btreeQueue'
+c.invokefunction('createTable', [user, queue_table, b'\x31\x04\x21', False])
+c.invokefunction('setIndexEngine', [user, queue_table, column_id, INDEX_ENGINE_BTREE])
+
+
+def walk(node_id):
+    """:return: (height, count of nodes) of the subtree"""
+    is_leaf, keys, children = c.invokefunction('bTreeGetNode', [user, queue_table, column_id, node_id])
+    if is_leaf:
+        assert len(keys) > 0
+        return 0, 1
+    assert len(children) == len(keys) + 1
+    results = [walk(child) for child in children]
+    assert len({depth for depth, _ in results}) == 1
+    return results[0][0] + 1, 1 + sum(count for _, count in results)
+
+
+queue = list(range(100))
+c.invokefunction('writeRows', [user, queue_table, [[0x01000000 + v, v] for v in queue]])
+for step in range(100, 300):
+    c.invokefunction('writeRow', [user, queue_table, [0x01000000 + step, step]])
+    c.invokefunction('deleteRow', [user, queue_table, 0x01000000 + queue.pop(0)])
+    queue.append(step)
+    if step % 20 == 0:
+        assert as_int(c.invokefunction('indexMin', [user, queue_table, column_id])) == queue[0]
+        root = c.invokefunction('bTreeGetRoot', [user, queue_table, column_id])
+        is_leaf, _, children = c.invokefunction('bTreeGetNode', [user, queue_table, column_id, root])
+        assert is_leaf or len(children) > 1
+        _, nodes = walk(root)
+        # leaves split into halves of 8 keys; the leaves emptied by the deletes are gone
+        assert nodes <= len(queue) // 4
+c.invokefunction('deleteRows', [user, queue_table, [0x01000000 + v for v in queue]])
+assert c.invokefunction('bTreeGetSize', [user, queue_table, column_id]) == 0
+assert c.invokefunction('bTreeGetRoot', [user, queue_table, column_id]) == 0
+assert c.invokefunction('indexMin', [user, queue_table, column_id]) is None
+c.invokefunction('writeRow', [user, queue_table, [0x01000000, 7]])
+assert as_int(c.invokefunction('indexMin', [user, queue_table, column_id])) == 7
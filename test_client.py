@@ -0,0 +1,61 @@
+from neo_fairy_client import FairyClient, Hash160Str
+from relational_db_client import GasChunker, RelationalDBClient, Types, as_bytes, encode_single, Column
+from relational_db_client.codec import INT_FIXED_LEN, INT_VAR_LEN, decode_varint, encode_varint, int_to_bytes
+
+user = Hash160Str('0xb1983fa2479a0c8e2beae032d2df564b5451b7a5')
+c = FairyClient(fairy_session='relationalDBClient', wallet_address_or_scripthash=user, with_print=False)
+c.virutal_deploy_from_path('./bin/sc/RelationalDB.nef')
+
+# local encoding matches the contract
+for v in [0, 1, -1, 127, 128, -128, -129, 2**64, -2**64]:
+    assert int.from_bytes(int_to_bytes(v), 'little', signed=True) == v
+    assert as_bytes(c.invokefunction('encodeInteger', [v])) == encode_single(v, Column(INT_VAR_LEN, 0))
+for v in [0, 0x7f, 0x80, 0x3fff, 0x4000, 0xffff]:
+    assert decode_varint(encode_varint(v), 0) == (v, len(encode_varint(v)))
+    assert as_bytes(c.invokefunction('encodeVarint', [v])) == encode_varint(v)
+for v in [-1, 0x017b, -2**31, 2**31 - 1]:
+    assert as_bytes(c.invokefunction('encodeIntegerFixedLength', [v, 4])) == encode_single(v, Column(INT_FIXED_LEN, 4))
+
+db = RelationalDBClient(c, user, GasChunker(gas_ceiling=2_0000_0000, initial_chunk=4), max_workers=4)
+rows = {}
+for row_format in [1, 2]:
+    table_name = f'client{row_format}'
+    # int32 primary key, int, str, bool, str(8)
+    c.invokefunction('createTable', [user, table_name, Types.IntFixedLen + b'\x04' + Types.IntVarLen + Types.ByteStringVarLen + Types.Boolean + Types.ByteStringFixedLen + b'\x08', False, None, row_format])
+    table = db.table(table_name)
+    assert table.schema.row_format == row_format and not table.schema.auto_inc_primary_key
+    rows[row_format] = [[i, i * (-1) ** i * 1000, b'row %d' % i, i % 3 == 0, b'%08d' % i] for i in range(1, 101)]
+    if row_format == 2:
+        rows[row_format][1][1] = rows[row_format][1][2] = None
+    table.write_rows(rows[row_format])
+    assert 'writeRows' in db.chunker.measurements
+    assert table.get_rows([r[0] for r in rows[row_format]]) == rows[row_format]
+    # rows decoded locally from the raw ListRows output
+    listed = sorted(table.list_rows(), key=lambda r: r[0])
+    assert listed == rows[row_format]
+    # local encoding equals the stored bytes
+    for key, value in c.invokefunction('listRows', [user, table_name]):
+        assert as_bytes(value) == table.encode_row(table.decode_row(as_bytes(value), as_bytes(key)[1:]))
+    table.delete_rows([r[0] for r in rows[row_format][::2]])
+    assert sorted(table.list_rows(), key=lambda r: r[0]) == rows[row_format][1::2]
+
+# listRows of client1 also finds the rows of client10, which list_rows skips
+c.invokefunction('createTable', [user, 'client10', Types.IntFixedLen + b'\x04' + Types.IntVarLen, False])
+c.invokefunction('writeRow', [user, 'client10', [1, 1]])
+assert sorted(db.table('client1').list_rows(), key=lambda r: r[0]) == rows[1][1::2]
+
+# fixed + per_item * items, bounding every measurement
+chunker = GasChunker(gas_ceiling=110_000, initial_chunk=4, safety_margin=0.1)
+assert chunker.chunk_size('m') == 4
+chunker.record('m', 4, 1400)
+assert chunker.estimate('m') == (0, 350) and chunker.chunk_size('m') == 285
+for items, gas in [(10, 2000), (20, 3100), (40, 5000)]:
+    chunker.record('m', items, gas)
+fixed, per_item = chunker.estimate('m')
+assert all(fixed + per_item * items >= gas - 1e-6 for items, gas in chunker.measurements['m'])
+assert chunker.chunk_size('m') == int((110_000 / 1.1 - fixed) // per_item)
+chunker.record_failure('m', 100)
+assert chunker.chunk_size('m') == 50
+
+assert db.pipeline([('getRow', [user, f'client{row_format}', int_to_bytes(2) + b'\x00\x00\x00']) for row_format in [1, 2]]) == [
+    [2, 2000, 'row 2', False, '00000002'], [2, None, None, False, '00000002']]
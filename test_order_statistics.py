@@ -0,0 +1,49 @@
+from neo_fairy_client import FairyClient, Hash160Str
+import random
+user = Hash160Str('0xb1983fa2479a0c8e2beae032d2df564b5451b7a5')
+c = FairyClient(fairy_session='orderStatistics', wallet_address_or_scripthash=user, with_print=False)
+c.virutal_deploy_from_path('./bin/sc/RelationalDB.nef')
+as_int = lambda r: None if r is None else int.from_bytes(r.encode() if type(r) is str else r, 'little', signed=True)
+
+table_name = 'orderStatistics'
+column_id = 0x02
+INDEX_ENGINE_BTREE = 1
+assert c.invokefunction('createTable', [user, table_name, b'\x31\x04\x21\x21', False]) == 3  # int32 primary key, int, int
+c.invokefunction('setIndexEngine', [user, table_name, 3, INDEX_ENGINE_BTREE])
+assert 'Order statistics need splay tree' in c.invokefunction('rank', [user, table_name, 3, 0], do_not_raise_on_result=True)
+
+random.seed(0)
+rows = {0x01000000 + i: random.randint(-100, 100) for i in range(60)}  # 4-byte primary keys
+keys = list(rows)
+c.invokefunction('bulkWriteRows', [user, table_name, [[k, rows[k], 0] for k in keys[:30]], True])  # empty tree
+for k in keys[30:40]:
+    c.invokefunction('writeRow', [user, table_name, [k, rows[k], 0]])
+for k in keys[40:]:
+    rows[k] += 1000
+c.invokefunction('bulkWriteRows', [user, table_name, [[k, rows[k], 0] for k in keys[40:]], True])  # hung below max
+
+
+def check():
+    values = sorted(rows.values())
+    assert c.invokefunction('splayGetSubtreeCount', [user, table_name, column_id, c.invokefunction('splayGetRoot', [user, table_name, column_id])]) == len(values)
+    for k in range(-1, len(values) + 1):
+        assert as_int(c.invokefunction('selectKth', [user, table_name, column_id, k])) == (values[k] if 0 <= k < len(values) else None)
+    for _ in range(20):
+        lo, hi = sorted(random.sample(range(-120, 1120), 2))
+        assert c.invokefunction('rank', [user, table_name, column_id, lo]) == sum(1 for v in values if v < lo)
+        assert c.invokefunction('countRange', [user, table_name, column_id, lo, hi]) == sum(1 for v in values if lo <= v <= hi)
+        assert c.invokefunction('sumRange', [user, table_name, column_id, lo, hi]) == sum(v for v in values if lo <= v <= hi)
+    assert c.invokefunction('countRange', [user, table_name, column_id, 1, 0]) == 0
+
+
+check()
+updated = keys[::3]
+c.invokefunction('updateRows', [user, table_name, updated, b'\x02', [[-rows[k]] for k in updated]])
+for k in updated:
+    rows[k] = -rows[k]
+check()
+deleted = keys[1::4]
+c.invokefunction('deleteRows', [user, table_name, deleted])
+for k in deleted:
+    del rows[k]
+check()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+
+from neo_fairy_client import FairyClient, Hash160Str
+from relational_db_client import FairyStorageSource, LocalStorageNode, Replica, Types, encode_primary_key, encode_row, parse_descriptor
+from relational_db_client.codec import as_bytes
+
+user = Hash160Str('0xb1983fa2479a0c8e2beae032d2df564b5451b7a5')
+c = FairyClient(fairy_session='relationalDBReplica', wallet_address_or_scripthash=user, with_print=False)
+c.virutal_deploy_from_path('./bin/sc/RelationalDB.nef')
+
+# int32 primary key, int, str, bool
+column_types = Types.IntFixedLen + b'\x04' + Types.IntVarLen + Types.ByteStringVarLen + Types.Boolean
+c.invokefunction('createTable', [user, 'orders', column_types, False, None, 2])
+c.invokefunction('setColumnNames', [user, 'orders', ['id', 'amount', 'customer', 'paid']])
+c.invokefunction('writeRows', [user, 'orders', [[i, i * 100, 'customer %d' % (i % 5), i % 2 == 0] for i in range(50)]])
+# auto-increment primary key, v1
+c.invokefunction('createTable', [user, 'customers', Types.ByteStringVarLen + Types.IntVarLen, True])
+c.invokefunction('writeRows', [user, 'customers', [['customer %d' % i, 2**70 + i] for i in range(5)]])
+
+replica = Replica(FairyStorageSource(c))
+replica.sync()
+orders, customers = replica.table_key(user, 'orders'), replica.table_key(user, 'customers')
+assert replica.query(f'SELECT COUNT(*), SUM(c2) FROM "{replica.sql_name(orders)}"') == [(50, sum(i * 100 for i in range(50)))]
+assert replica.query(f'SELECT c3, COUNT(*) FROM "{replica.sql_name(orders)}" WHERE c4 GROUP BY c3 ORDER BY c3') == [
+    (b'customer %d' % i, 5) for i in range(5)]
+# join orders with customers
+assert replica.query(f'''SELECT COUNT(*) FROM "{replica.sql_name(orders)}" o JOIN "{replica.sql_name(customers)}" c
+                         ON o.c3 = c.c1 WHERE c.c1 = ?''', (b'customer 1',)) == [(10,)]
+assert replica.query('SELECT column_id FROM _column_names WHERE table_key = ? AND name = ?', (orders, b'amount')) == [(2,)]
+assert replica.validate(c, user, 'orders', sample=50) == []
+assert replica.validate(c, user, 'customers') == []
+
+# incremental sync
+key = lambda i: encode_primary_key(i, replica.schemas[orders])
+c.invokefunction('updateRow', [user, 'orders', key(1), b'\x02\x03', [None, 'customer 9']])
+c.invokefunction('deleteRows', [user, 'orders', [key(0), key(2), key(4)]])
+c.invokefunction('writeRow', [user, 'orders', [100, 1, 'customer 1', True]])
+c.invokefunction('dropTable', [user, 'customers'])
+replica.sync()
+assert replica.query(f'SELECT COUNT(*) FROM "{replica.sql_name(orders)}"') == [(48,)]
+assert replica.query(f'SELECT c2, c3 FROM "{replica.sql_name(orders)}" WHERE c1 = 1') == [(None, b'customer 9')]
+assert customers not in replica.schemas
+assert replica.validate(c, user, 'orders', sample=50) == []
+while not c.invokefunction('purgeDroppedTable', [user, 'customers', 100]):
+    pass
+c.invokefunction('createTable', [user, 'customers', Types.ByteStringVarLen, True])
+c.invokefunction('writeRow', [user, 'customers', ['customer 0']])
+replica.sync()
+assert replica.query(f'SELECT c1 FROM "{replica.sql_name(customers)}"') == [(b'customer 0',)]
+assert replica.validate(c, user, 'customers') == []
+
+# a row missing locally is found in the storage windows of a keyed table, or below the row-id counter
+orders_count = replica.query(f'SELECT COUNT(*) FROM "{replica.sql_name(orders)}"')[0][0]
+replica.db.execute(f'DELETE FROM "{replica.sql_name(orders)}" WHERE pk = ?', (key(5),))
+assert replica.validate(c, user, 'orders', sample=100) == [key(5)]
+replica.db.execute(f'DELETE FROM "{replica.sql_name(customers)}" WHERE pk = ?', (b'\x01',))
+assert replica.validate(c, user, 'customers') == [b'\x01']
+# a row missing on chain is found among the local keys, checked one by one after getRows faults
+c.invokefunction('deleteRows', [user, 'orders', [key(7)]])
+assert replica.validate(c, user, 'orders', sample=100) == [key(7), key(5)]
+
+# a new FairyStorageSource, e.g. after a restart, has no previous read: the replica reconciles with a full read
+path = os.path.join(tempfile.mkdtemp(), 'replica.sqlite')
+Replica(FairyStorageSource(c), path).sync()
+c.invokefunction('deleteRows', [user, 'orders', [key(3)]])
+c.invokefunction('dropTable', [user, 'customers'])
+restarted = Replica(FairyStorageSource(c), path)
+restarted.sync()
+assert restarted.query(f'SELECT COUNT(*) FROM "{restarted.sql_name(orders)}"') == [(orders_count - 2,)]
+assert customers not in restarted.schemas
+assert restarted.validate(c, user, 'orders', sample=100) == []
+
+# the stand-in node logs the changes of each block, so syncs read only the changes after the synced height
+node = LocalStorageNode()
+table_key = bytes(range(20)) + b'local'
+descriptor = as_bytes(c.invokefunction('compileDescriptor', [column_types, False, 2]))
+schema = parse_descriptor(descriptor)
+node.put(b't' + table_key, column_types)
+node.put(b's' + table_key, descriptor)
+for i in range(10):
+    node.put(b'r' + table_key + b'\x00' + encode_primary_key(i, schema), encode_row([i, b'c', True], schema))
+node.commit()
+local = Replica(node)
+assert local.sync() == 1
+node.delete(b'r' + table_key + b'\x00' + encode_primary_key(0, schema))
+node.put(b'r' + table_key + b'\x00' + encode_primary_key(1, schema), encode_row([None, b'd', False], schema))
+node.commit()
+assert node.changes(1) == [(b'r' + table_key + b'\x00' + encode_primary_key(0, schema), None),
+                           (b'r' + table_key + b'\x00' + encode_primary_key(1, schema), encode_row([None, b'd', False], schema))]
+assert local.sync() == 2
+assert local.get_rows(table_key, [encode_primary_key(i, schema) for i in range(3)]) == [None, [1, None, b'd', False], [2, 2, b'c', True]]